@@ -1,5 +1,28 @@
-from database import SessionLocal, Licao, init_db
+"""
+Carga de lições na tabela `licoes`.
+
+Sem argumentos, adiciona as 3 lições iniciais (se ainda não existirem).
+Com arquivos CSV ou JSONL, faz a importação em streaming: lê linha a linha, valida, grava em
+lotes (upsert por `id`, um executemany por transação) e guarda o ponto de retomada em
+`importacoes_licoes` na mesma transação de cada lote. Se a importação cair, rodar de novo
+continua de onde parou.
+
+Uso:
+    python adicionar_licoes.py
+    python adicionar_licoes.py licoes.csv mais_licoes.jsonl [--lote 1000] [--do-inicio]
+
+Colunas/campos: id, tema, topico, texto_pergunta, opcao_a, opcao_b, opcao_c, opcao_d, resposta_correta (a-d).
+"""
+from database import SessionLocal, Licao, ImportacaoLicoes, init_db, marcar_licoes_alteradas
+from sqlalchemy.dialects.sqlite import insert
+from datetime import datetime
+import argparse
+import csv
+import itertools
+import json
 import logging
+import os
+import time
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
@@ -50,6 +73,8 @@ def adicionar_licoes():
         for licao in licoes_iniciais:
             db.add(licao)
         
+        # O servidor em execução percebe a nova versão e recarrega o catálogo de lições.
+        marcar_licoes_alteradas(db)
         db.commit()
         log.info("✅ 3 Lições de Inglês adicionadas com sucesso.")
 
@@ -59,6 +84,172 @@ def adicionar_licoes():
     finally:
         db.close()
 
-if __name__ == "__main__":
+# ===============================================
+# IMPORTADOR EM STREAMING (CSV / JSONL)
+# ===============================================
+
+CAMPOS_OBRIGATORIOS = ("texto_pergunta", "opcao_a", "opcao_b", "opcao_c", "opcao_d", "resposta_correta")
+MAX_AVISOS_LINHAS_INVALIDAS = 20
+
+
+def ler_csv(caminho: str):
+    """
+    Gera (linha_no_arquivo, dict) para cada registro do CSV, sem carregar o arquivo inteiro.
+    A linha é a do arquivo (conta o cabeçalho; num campo entre aspas com quebras de linha, é a
+    última linha do registro).
+    """
+    with open(caminho, newline="", encoding="utf-8-sig") as arquivo:
+        leitor = csv.DictReader(arquivo)
+        for linha in leitor:
+            yield leitor.line_num, linha
+
+
+def ler_jsonl(caminho: str):
+    """Gera (linha_no_arquivo, texto) para cada linha do JSONL; o parse fica para `validar_linha`."""
+    with open(caminho, encoding="utf-8") as arquivo:
+        for numero, linha in enumerate(arquivo, start=1):
+            yield numero, linha
+
+
+def leitor_do_arquivo(caminho: str):
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao == ".csv":
+        return ler_csv(caminho)
+    if extensao in (".jsonl", ".ndjson"):
+        return ler_jsonl(caminho)
+    raise ValueError(f"Formato não suportado: {caminho} (use .csv ou .jsonl)")
+
+
+def validar_linha(dados) -> dict:
+    """Converte a linha do arquivo em valores da tabela `licoes`. Levanta ValueError se for inválida."""
+    if isinstance(dados, str):
+        # Linha de JSONL (json.JSONDecodeError também é um ValueError).
+        dados = json.loads(dados) if dados.strip() else None
+    if not isinstance(dados, dict):
+        raise ValueError("linha vazia ou não é um objeto")
+
+    try:
+        licao_id = int(dados.get("id"))
+    except (TypeError, ValueError):
+        raise ValueError(f"id inválido: {dados.get('id')!r}")
+    if licao_id <= 0:
+        raise ValueError(f"id deve ser positivo: {licao_id}")
+
+    valores = {"id": licao_id}
+    for campo in CAMPOS_OBRIGATORIOS:
+        valor = str(dados.get(campo) or "").strip()
+        if not valor:
+            raise ValueError(f"campo obrigatório ausente: {campo}")
+        valores[campo] = valor
+
+    valores["resposta_correta"] = valores["resposta_correta"].lower()
+    if valores["resposta_correta"] not in ("a", "b", "c", "d"):
+        raise ValueError(f"resposta_correta deve ser a, b, c ou d: {valores['resposta_correta']!r}")
+
+    valores["tema"] = str(dados.get("tema") or "introducao").strip()
+    valores["topico"] = str(dados.get("topico") or f"Lição {licao_id}").strip()
+    return valores
+
+
+def _assinatura(caminho: str) -> str:
+    # Tamanho + data de modificação: se o arquivo mudou, o ponto de retomada não vale mais.
+    info = os.stat(caminho)
+    return f"{info.st_size}:{int(info.st_mtime)}"
+
+
+def _gravar_lote(db, lote: list, checkpoint: ImportacaoLicoes, linhas_processadas: int, concluida: bool = False):
+    if lote:
+        stmt = insert(Licao.__table__)
+        colunas = ("tema", "topico", "texto_pergunta", "opcao_a", "opcao_b", "opcao_c", "opcao_d", "resposta_correta")
+        db.execute(
+            stmt.on_conflict_do_update(index_elements=["id"], set_={c: stmt.excluded[c] for c in colunas}),
+            lote,
+        )
+        marcar_licoes_alteradas(db)
+    checkpoint.linhas_processadas = linhas_processadas
+    checkpoint.concluida = int(concluida)
+    checkpoint.atualizado_em = datetime.now()
+    db.commit()
+
+
+def importar_arquivo(caminho: str, tamanho_lote: int = 1000, do_inicio: bool = False) -> dict:
+    """Importa um arquivo CSV/JSONL em lotes, retomando do último lote confirmado. Retorna um resumo."""
+    caminho = os.path.abspath(caminho)
+    assinatura = _assinatura(caminho)
+    resumo = {"arquivo": caminho, "gravadas": 0, "invalidas": 0, "puladas": 0}
+
+    db = SessionLocal()
+    try:
+        checkpoint = db.get(ImportacaoLicoes, caminho)
+        if checkpoint is None or checkpoint.assinatura != assinatura or do_inicio:
+            checkpoint = db.merge(ImportacaoLicoes(arquivo=caminho, assinatura=assinatura, linhas_processadas=0, concluida=0))
+        elif checkpoint.concluida:
+            log.info("📝 %s já foi importado por completo. Use --do-inicio para importar de novo.", caminho)
+            return resumo
+
+        # O checkpoint conta registros (no CSV, um registro pode ocupar várias linhas do arquivo).
+        retomar_de = checkpoint.linhas_processadas or 0
+        if retomar_de:
+            log.info("🔁 Retomando %s a partir do registro %s.", caminho, retomar_de + 1)
+
+        inicio = time.perf_counter()
+        lote = []
+        ultima_linha = retomar_de
+        registros = itertools.islice(leitor_do_arquivo(caminho), retomar_de, None)
+        for ultima_linha, (linha_no_arquivo, dados) in enumerate(registros, start=retomar_de + 1):
+            try:
+                lote.append(validar_linha(dados))
+            except ValueError as e:
+                resumo["invalidas"] += 1
+                if resumo["invalidas"] <= MAX_AVISOS_LINHAS_INVALIDAS:
+                    log.warning("⚠️ Linha %s ignorada: %s", linha_no_arquivo, e)
+
+            if len(lote) >= tamanho_lote:
+                _gravar_lote(db, lote, checkpoint, ultima_linha)
+                resumo["gravadas"] += len(lote)
+                lote = []
+                decorrido = time.perf_counter() - inicio
+                log.info("⏳ %s: %s lições gravadas (%.0f linhas/s).", os.path.basename(caminho),
+                         resumo["gravadas"], (ultima_linha - retomar_de) / decorrido if decorrido else 0)
+
+        _gravar_lote(db, lote, checkpoint, ultima_linha, concluida=True)
+        resumo["gravadas"] += len(lote)
+        resumo["puladas"] = retomar_de
+
+        decorrido = time.perf_counter() - inicio
+        resumo["segundos"] = round(decorrido, 2)
+        resumo["linhas_por_segundo"] = round((ultima_linha - retomar_de) / decorrido) if decorrido else 0
+        log.info("✅ %s: %s lições gravadas, %s linhas inválidas, em %.1fs (%s linhas/s).",
+                 os.path.basename(caminho), resumo["gravadas"], resumo["invalidas"], decorrido, resumo["linhas_por_segundo"])
+        return resumo
+
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Adiciona lições ao banco (iniciais ou de arquivos CSV/JSONL).")
+    parser.add_argument("arquivos", nargs="*", help="Arquivos .csv ou .jsonl com as lições.")
+    parser.add_argument("--lote", type=int, default=1000, help="Linhas por transação (padrão: 1000).")
+    parser.add_argument("--do-inicio", action="store_true", help="Ignora o ponto de retomada e importa tudo de novo.")
+    args = parser.parse_args()
+
     init_db()
-    adicionar_licoes()
\ No newline at end of file
+    if not args.arquivos:
+        adicionar_licoes()
+        return
+
+    for caminho in args.arquivos:
+        try:
+            importar_arquivo(caminho, tamanho_lote=args.lote, do_inicio=args.do_inicio)
+        except Exception as e:
+            log.error(f"🚨 Erro ao importar {caminho}: {e}. Rode de novo para retomar do último lote gravado.")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main()
\ No newline at end of file
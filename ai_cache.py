@@ -0,0 +1,121 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from database import SessionLocal, CacheRespostaIA
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# ===============================================
+# CONFIGURAÇÕES DO CACHE (Sobrescrevíveis pelo .env)
+# ===============================================
+
+AI_CACHE_MAX = int(os.getenv("AI_CACHE_MAX", "1000"))
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", str(7 * 24 * 3600)))
+
+
+def gerar_chave(prompt: str, system_instruction: str = "", modelo: str = "") -> str:
+    """Chave do cache: hash do modelo, da instrução de sistema e do prompt com espaços normalizados."""
+    normalizado = " ".join(str(prompt).split())
+    return hashlib.sha256("\x00".join([modelo, system_instruction or "", normalizado]).encode("utf-8")).hexdigest()
+
+
+class CacheRespostasIA:
+    """
+    Cache em dois níveis para respostas da IA: LRU em memória com TTL, apoiado na tabela
+    `cache_respostas_ia` do SQLite para sobreviver a reinícios.
+    """
+
+    def __init__(self, tamanho_maximo: int = AI_CACHE_MAX, ttl: float = AI_CACHE_TTL):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_memoria = 0
+        self.hits_sqlite = 0
+        self.misses = 0
+
+    def estatisticas(self) -> dict:
+        total = self.hits_memoria + self.hits_sqlite + self.misses
+        return {
+            "entradas_memoria": len(self._memoria),
+            "hits_memoria": self.hits_memoria,
+            "hits_sqlite": self.hits_sqlite,
+            "misses": self.misses,
+            "taxa_acerto": round((self.hits_memoria + self.hits_sqlite) / total, 3) if total else 0.0,
+        }
+
+    def obter(self, chave: str):
+        agora = time.time()
+        with self._lock:
+            item = self._memoria.get(chave)
+            if item is not None:
+                resposta, expira_em = item
+                if expira_em > agora:
+                    self._memoria.move_to_end(chave)
+                    self.hits_memoria += 1
+                    return resposta
+                del self._memoria[chave]
+
+        item = self._obter_sqlite(chave, agora)
+        with self._lock:
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits_sqlite += 1
+        resposta, expira_em = item
+        # O prazo conta da criação da entrada: voltar do SQLite (reinício, saída do LRU) não o renova.
+        self._guardar_memoria(chave, resposta, expira_em)
+        return resposta
+
+    def guardar(self, chave: str, resposta: str):
+        self._guardar_memoria(chave, resposta, time.time() + self.ttl)
+        db = SessionLocal()
+        try:
+            db.merge(CacheRespostaIA(chave=chave, resposta=resposta, criado_em=datetime.now()))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            log.error(f"🚨 Erro ao salvar resposta da IA no cache: {e}")
+        finally:
+            db.close()
+
+    def podar_expirados(self) -> int:
+        """Remove do SQLite as entradas mais velhas que o TTL. Retorna quantas foram removidas."""
+        db = SessionLocal()
+        try:
+            limite = datetime.now() - timedelta(seconds=self.ttl)
+            removidas = db.query(CacheRespostaIA).filter(CacheRespostaIA.criado_em < limite).delete()
+            db.commit()
+            return removidas
+        finally:
+            db.close()
+
+    def _guardar_memoria(self, chave: str, resposta: str, expira_em: float):
+        with self._lock:
+            self._memoria[chave] = (resposta, expira_em)
+            self._memoria.move_to_end(chave)
+            while len(self._memoria) > self.tamanho_maximo:
+                self._memoria.popitem(last=False)
+
+    def _obter_sqlite(self, chave: str, agora: float):
+        """(resposta, expira_em) da entrada no SQLite, ou None se não existir ou já tiver expirado."""
+        db = SessionLocal()
+        try:
+            registro = db.get(CacheRespostaIA, chave)
+            if registro is None:
+                return None
+            expira_em = registro.criado_em.timestamp() + self.ttl
+            if expira_em <= agora:
+                return None
+            return registro.resposta, expira_em
+        except Exception as e:
+            log.error(f"🚨 Erro ao ler o cache de respostas da IA: {e}")
+            return None
+        finally:
+            db.close()
@@ -1,8 +1,11 @@
 import os
+import json
 from dotenv import load_dotenv
 import logging
 from google import genai
 from google.genai.errors import APIError
+from ai_cache import CacheRespostasIA, gerar_chave
+import metrics as metricas
 # ... (imports de send_message e utils, se necessário)
 
 load_dotenv()
@@ -23,31 +26,138 @@ except Exception as e:
     client = None
 
 
-def get_ai_response(prompt: str) -> str:
-# ... (função sem alterações) ...
-    if not client:
-        return "🤖 Serviço de IA indisponível. Verifique a GEMINI_API_KEY no .env."
+MODELO_GEMINI = 'gemini-2.5-flash'
+
+# A instrução de sistema do modo conversa é curta demais para o cache de contexto explícito do
+# Gemini (mínimo de ~1024 tokens): vai inline, sempre como o mesmo prefixo, e aproveita só o cache
+# implícito do modelo.
+SYSTEM_INSTRUCTION_CONVERSA = (
+    "Você é um assistente de conversação amigável chamado 'English Bot'. "
+    "Seu objetivo é responder perguntas sobre a língua inglesa e auxiliar o usuário no aprendizado. "
+    "Responda de forma sucinta e didática. Não use asteriscos duplos (**) para negrito; use *asterisco único* para negrito e itálico, e aplique a formatação de forma MUITO moderada para manter o texto limpo."
+)
+
+MENSAGEM_IA_INDISPONIVEL = "🤖 Serviço de IA indisponível. Verifique a GEMINI_API_KEY no .env."
+
+# Cache das respostas de texto. Só guarda respostas bem-sucedidas; cada chamada pode desligá-lo com usar_cache=False.
+cache_respostas = CacheRespostasIA()
+
+EXERCICIO_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "string"},
+        "tipo": {"type": "string", "enum": ["choice", "open"]},
+        "pergunta": {"type": "string"},
+        "opcoes": {"type": "array", "items": {"type": "string"}},
+        "correta": {"type": "string"},
+        "aceitas": {"type": "array", "items": {"type": "string"}},
+        "explicacao": {"type": "string"}
+    },
+    "required": ["id", "tipo", "pergunta", "correta"]
+}
+
+
+EXERCICIOS_LOTE_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": EXERCICIO_RESPONSE_SCHEMA
+}
+
+CORRECAO_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "correta": {"type": "boolean"},
+        "explicacao": {"type": "string"}
+    },
+    "required": ["correta", "explicacao"]
+}
+
+TIPOS_EXERCICIO = ("choice", "open")
+
+
+def validar_exercicio(item) -> dict:
+    """
+    Valida um exercício gerado pela IA e devolve uma cópia normalizada, ou None se for inválido.
+
+    Regras: `tipo` dentro do enum, `pergunta` e `correta` preenchidas e, para 'choice', exatamente
+    4 `opcoes` com a `correta` entre elas (a comparação ignora caixa e espaços nas pontas; o valor
+    salvo passa a ser o texto exato da opção).
+    """
+    if not isinstance(item, dict):
+        return None
+
+    tipo = item.get("tipo")
+    pergunta = item.get("pergunta")
+    correta = item.get("correta")
+    if tipo not in TIPOS_EXERCICIO or not isinstance(pergunta, str) or not pergunta.strip():
+        return None
+    if not isinstance(correta, str) or not correta.strip():
+        return None
+
+    exercicio = dict(item)
+    if tipo == "choice":
+        opcoes = item.get("opcoes")
+        if not isinstance(opcoes, list) or len(opcoes) != 4 or not all(isinstance(o, str) and o.strip() for o in opcoes):
+            return None
+        opcoes_normalizadas = [o.strip().upper() for o in opcoes]
+        if len(set(opcoes_normalizadas)) != 4 or correta.strip().upper() not in opcoes_normalizadas:
+            return None
+        exercicio["correta"] = opcoes[opcoes_normalizadas.index(correta.strip().upper())]
+
+    # Variantes aceitas (usadas pela correção local): lista de strings, o resto é descartado.
+    aceitas = item.get("aceitas")
+    if aceitas is not None:
+        exercicio["aceitas"] = [a for a in aceitas if isinstance(a, str) and a.strip()] if isinstance(aceitas, list) else []
+
+    return exercicio
 
-    system_instruction = (
-        "Você é um assistente de conversação amigável chamado 'English Bot'. "
-        "Seu objetivo é responder perguntas sobre a língua inglesa e auxiliar o usuário no aprendizado. "
-        "Responda de forma sucinta e didática. Não use asteriscos duplos (**) para negrito; use *asterisco único* para negrito e itálico, e aplique a formatação de forma MUITO moderada para manter o texto limpo."
+
+def _conteudo_exercicio(user_level: str) -> list:
+    prompt_instruction = (
+        f"Crie um exercício de inglês adequado para um aluno de nível '{user_level}'. "
+        "O exercício deve ser sobre gramática ou vocabulário. "
+        "O tipo de pergunta deve ser de múltipla escolha (choice) ou resposta aberta (open). "
+        "Retorne a pergunta e a resposta CORRETA no formato JSON estrito."
+    )
+    
+    user_prompt = (
+        "Gere APENAS o JSON. O ID deve ser o ID do exercício (EX1, EX2, etc.). "
+        "Para 'choice', o valor de 'correta' DEVE ser a PALAVRA OU FASE EXATA da opção correta (ex: 'is' ou 'blue' ou 'I am'). "
+        "Para 'choice', inclua 4 'opcoes' como strings dentro da lista 'opcoes'. "
+        "Para 'open', liste em 'aceitas' as outras respostas igualmente corretas (variações, sinônimos, com e sem contração)."
     )
+    return [prompt_instruction, user_prompt]
+
+
+def get_ai_response(prompt: str, usar_cache: bool = True) -> str:
+    if not client:
+        return MENSAGEM_IA_INDISPONIVEL
+
+    chave = gerar_chave(prompt, SYSTEM_INSTRUCTION_CONVERSA, MODELO_GEMINI)
+    if usar_cache:
+        resposta_cache = cache_respostas.obter(chave)
+        if resposta_cache is not None:
+            return resposta_cache
 
     try:
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=prompt,
-            config={'system_instruction': system_instruction}
-        )
+        with metricas.GEMINI_CHAMADA.medir("get_ai_response"):
+            response = client.models.generate_content(
+                model=MODELO_GEMINI,
+                contents=prompt,
+                config={'system_instruction': SYSTEM_INSTRUCTION_CONVERSA}
+            )
 
-        return response.text.strip()
+        resposta = response.text.strip()
+        if usar_cache:
+            cache_respostas.guardar(chave, resposta)
+        return resposta
 
     except APIError as e:
         log.error(f"❌ Erro da API Gemini: {e}")
+        metricas.ERROS.incrementar("gemini")
         return "🤖 Houve um erro na comunicação com a IA. Tente novamente mais tarde."
     except Exception as e:
         log.error(f"🚨 Erro inesperado ao obter resposta da IA: {e}")
+        metricas.ERROS.incrementar("gemini")
         return "🤖 Não foi possível processar sua solicitação."
     
 def get_dynamic_exercise(user_level: str) -> str:
@@ -55,47 +165,266 @@ def get_dynamic_exercise(user_level: str) -> str:
     if not client:
         return '{"error": "Serviço de IA indisponível."}'
     
-    prompt_instruction = (
-        f"Crie um exercício de inglês adequado para um aluno de nível '{user_level}'. "
-        "O exercício deve ser sobre gramática ou vocabulário. "
-        "O tipo de pergunta deve ser de múltipla escolha (choice) ou resposta aberta (open). "
-        "Retorne a pergunta e a resposta CORRETA no formato JSON estrito."
-    )
-    
-    user_prompt = (
-        "Gere APENAS o JSON. O ID deve ser o ID do exercício (EX1, EX2, etc.). "
-        "Para 'choice', o valor de 'correta' DEVE ser a PALAVRA OU FASE EXATA da opção correta (ex: 'is' ou 'blue' ou 'I am'). "
-        "Para 'choice', inclua 4 'opcoes' como strings dentro da lista 'opcoes'."
-    )
-    
-    response_schema = {
-        "type": "object",
-        "properties": {
-            "id": {"type": "string"},
-            "tipo": {"type": "string", "enum": ["choice", "open"]},
-            "pergunta": {"type": "string"},
-            "opcoes": {"type": "array", "items": {"type": "string"}},
-            "correta": {"type": "string"},
-            "explicacao": {"type": "string"}
-        },
-        "required": ["id", "tipo", "pergunta", "correta"]
-    }
-    
     try:
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=[prompt_instruction, user_prompt],
-            config={
-                'response_mime_type': 'application/json',
-                'response_schema': response_schema
-            }
-        )
+        with metricas.GEMINI_CHAMADA.medir("get_dynamic_exercise"):
+            response = client.models.generate_content(
+                model=MODELO_GEMINI,
+                contents=_conteudo_exercicio(user_level),
+                config={
+                    'response_mime_type': 'application/json',
+                    'response_schema': EXERCICIO_RESPONSE_SCHEMA
+                }
+            )
         
         return response.text.strip()
     
     except APIError as e:
         log.error(f"❌ Erro da API Gemini ao gerar exercício: {e}")
+        metricas.ERROS.incrementar("gemini")
         return '{"error": "Falha na geração do exercício."}'
     except Exception as e:
         log.error(f"🚨 Erro inesperado ao gerar exercício: {e}")
-        return '{"error": "Erro de processamento interno."}'
\ No newline at end of file
+        metricas.ERROS.incrementar("gemini")
+        return '{"error": "Erro de processamento interno."}'
+
+
+# ===============================================
+# VARIANTES ASSÍNCRONAS (client.aio), usadas no caminho do webhook
+# ===============================================
+
+async def get_ai_response_async(prompt: str, usar_cache: bool = True) -> str:
+    if not client:
+        return MENSAGEM_IA_INDISPONIVEL
+
+    chave = gerar_chave(prompt, SYSTEM_INSTRUCTION_CONVERSA, MODELO_GEMINI)
+    if usar_cache:
+        resposta_cache = cache_respostas.obter(chave)
+        if resposta_cache is not None:
+            return resposta_cache
+
+    try:
+        with metricas.GEMINI_CHAMADA.medir("get_ai_response"):
+            response = await client.aio.models.generate_content(
+                model=MODELO_GEMINI,
+                contents=prompt,
+                config={'system_instruction': SYSTEM_INSTRUCTION_CONVERSA}
+            )
+
+        resposta = response.text.strip()
+        if usar_cache:
+            cache_respostas.guardar(chave, resposta)
+        return resposta
+
+    except APIError as e:
+        log.error(f"❌ Erro da API Gemini: {e}")
+        metricas.ERROS.incrementar("gemini")
+        return "🤖 Houve um erro na comunicação com a IA. Tente novamente mais tarde."
+    except Exception as e:
+        log.error(f"🚨 Erro inesperado ao obter resposta da IA: {e}")
+        metricas.ERROS.incrementar("gemini")
+        return "🤖 Não foi possível processar sua solicitação."
+
+
+# ===============================================
+# MODO CONVERSA (com memória)
+# ===============================================
+
+def ia_disponivel() -> bool:
+    """False quando não há cliente do Gemini (GEMINI_API_KEY ausente ou inválida)."""
+    return client is not None
+
+
+def _conteudo_conversa(mensagem: str, resumo: str, turnos: list) -> list:
+    """Histórico no formato de conversa do Gemini: o resumo vai antes da primeira fala do aluno."""
+    conteudo = []
+    for pergunta, resposta in turnos:
+        conteudo.append({'role': 'user', 'parts': [{'text': pergunta}]})
+        conteudo.append({'role': 'model', 'parts': [{'text': resposta}]})
+    conteudo.append({'role': 'user', 'parts': [{'text': mensagem}]})
+    if resumo:
+        primeira = conteudo[0]['parts'][0]['text']
+        conteudo[0]['parts'][0]['text'] = f"(Resumo da conversa até aqui: {resumo})\n\n{primeira}"
+    return conteudo
+
+
+async def responder_conversa_async(mensagem: str, resumo: str = "", turnos: list = ()) -> str:
+    """
+    Resposta do modo conversa, com o histórico do aluno (`resumo` das trocas antigas e `turnos`
+    recentes como pares (pergunta, resposta)). Retorna None se a IA estiver indisponível ou falhar,
+    para que a troca não entre no histórico; quem chama distingue os dois casos com `ia_disponivel()`.
+    """
+    if not client:
+        return None
+
+    try:
+        with metricas.GEMINI_CHAMADA.medir("responder_conversa"):
+            response = await client.aio.models.generate_content(
+                model=MODELO_GEMINI,
+                contents=_conteudo_conversa(mensagem, resumo, list(turnos)),
+                config={'system_instruction': SYSTEM_INSTRUCTION_CONVERSA}
+            )
+        return response.text.strip()
+
+    except APIError as e:
+        log.error(f"❌ Erro da API Gemini na conversa: {e}")
+        metricas.ERROS.incrementar("gemini")
+        return None
+    except Exception as e:
+        log.error(f"🚨 Erro inesperado na conversa com a IA: {e}")
+        metricas.ERROS.incrementar("gemini")
+        return None
+
+
+async def resumir_conversa_async(resumo: str, turnos: list, limite_palavras: int) -> str:
+    """Funde o resumo anterior com as trocas que saíram do histórico recente. None se falhar."""
+    if not client:
+        return None
+
+    trocas = "\n".join(f"Aluno: {pergunta}\nBot: {resposta}" for pergunta, resposta in turnos)
+    conteudo = (
+        f"Resuma a conversa abaixo entre um aluno de inglês e o English Bot em no máximo {limite_palavras} palavras, "
+        "em português, mantendo o que importa para continuar a conversa: assuntos tratados, dúvidas e dificuldades "
+        "do aluno, informações que ele deu sobre si e combinados. Responda só com o resumo.\n\n"
+        f"Resumo anterior: {resumo or '(nenhum)'}\n\nNovas trocas:\n{trocas}"
+    )
+    try:
+        with metricas.GEMINI_CHAMADA.medir("resumir_conversa"):
+            response = await client.aio.models.generate_content(model=MODELO_GEMINI, contents=conteudo)
+        return response.text.strip() or None
+
+    except APIError as e:
+        log.error(f"❌ Erro da API Gemini ao resumir conversa: {e}")
+        metricas.ERROS.incrementar("gemini")
+        return None
+    except Exception as e:
+        log.error(f"🚨 Erro inesperado ao resumir conversa: {e}")
+        metricas.ERROS.incrementar("gemini")
+        return None
+
+
+async def get_dynamic_exercise_async(user_level: str) -> str:
+    if not client:
+        return '{"error": "Serviço de IA indisponível."}'
+
+    try:
+        with metricas.GEMINI_CHAMADA.medir("get_dynamic_exercise"):
+            response = await client.aio.models.generate_content(
+                model=MODELO_GEMINI,
+                contents=_conteudo_exercicio(user_level),
+                config={
+                    'response_mime_type': 'application/json',
+                    'response_schema': EXERCICIO_RESPONSE_SCHEMA
+                }
+            )
+
+        return response.text.strip()
+
+    except APIError as e:
+        log.error(f"❌ Erro da API Gemini ao gerar exercício: {e}")
+        metricas.ERROS.incrementar("gemini")
+        return '{"error": "Falha na geração do exercício."}'
+    except Exception as e:
+        log.error(f"🚨 Erro inesperado ao gerar exercício: {e}")
+        metricas.ERROS.incrementar("gemini")
+        return '{"error": "Erro de processamento interno."}'
+
+
+async def corrigir_resposta_aberta_async(user_level: str, pergunta: str, correta: str, aceitas: list, resposta: str) -> dict:
+    """
+    Correção pela IA de uma resposta aberta que a correção local não conseguiu decidir.
+
+    Retorna {"correta": bool, "explicacao": str} (a explicação já serve de reforço quando errada),
+    ou None se a chamada falhar ou vier fora do formato.
+    """
+    if not client:
+        return None
+
+    conteudo = (
+        f"Exercício de inglês para um aluno de nível '{user_level}': '{pergunta}'. "
+        f"Resposta esperada: '{correta}'. Outras respostas aceitas: {json.dumps(aceitas, ensure_ascii=False)}. "
+        f"O aluno respondeu: '{resposta}'. "
+        "Diga se a resposta do aluno está correta (aceite paráfrases e pequenos erros de digitação que não mudem a gramática). "
+        "Em 'explicacao', se estiver errada, explique o erro de forma concisa e didática e dê uma dica de estudo; se estiver certa, elogie em uma frase."
+    )
+    try:
+        with metricas.GEMINI_CHAMADA.medir("corrigir_resposta_aberta"):
+            response = await client.aio.models.generate_content(
+                model=MODELO_GEMINI,
+                contents=conteudo,
+                config={
+                    'response_mime_type': 'application/json',
+                    'response_schema': CORRECAO_RESPONSE_SCHEMA
+                }
+            )
+        avaliacao = json.loads(response.text)
+
+    except APIError as e:
+        log.error(f"❌ Erro da API Gemini ao corrigir resposta aberta: {e}")
+        metricas.ERROS.incrementar("gemini")
+        return None
+    except Exception as e:
+        log.error(f"🚨 Erro inesperado ao corrigir resposta aberta: {e}")
+        metricas.ERROS.incrementar("gemini")
+        return None
+
+    if not isinstance(avaliacao, dict) or not isinstance(avaliacao.get("correta"), bool):
+        log.warning("⚠️ Correção da IA fora do formato esperado. Descartada.")
+        return None
+    return {"correta": avaliacao["correta"], "explicacao": str(avaliacao.get("explicacao") or "").strip()}
+
+
+def _conteudo_lote_exercicios(user_level: str, quantidade: int) -> list:
+    prompt_instruction = (
+        f"Crie {quantidade} exercícios de inglês DIFERENTES entre si, adequados para um aluno de nível '{user_level}'. "
+        "Varie os temas entre gramática e vocabulário. "
+        "Cada exercício deve ser de múltipla escolha (choice) ou resposta aberta (open). "
+        "Retorne uma lista JSON estrita com a pergunta e a resposta CORRETA de cada exercício."
+    )
+
+    user_prompt = (
+        "Gere APENAS a lista JSON. O ID de cada item deve ser o ID do exercício (EX1, EX2, etc.). "
+        "Para 'choice', o valor de 'correta' DEVE ser a PALAVRA OU FASE EXATA da opção correta (ex: 'is' ou 'blue' ou 'I am'). "
+        "Para 'choice', inclua exatamente 4 'opcoes' distintas como strings dentro da lista 'opcoes'. "
+        "Para 'open', liste em 'aceitas' as outras respostas igualmente corretas (variações, sinônimos, com e sem contração)."
+    )
+    return [prompt_instruction, user_prompt]
+
+
+async def get_dynamic_exercises_batch_async(user_level: str, quantidade: int) -> list:
+    """
+    Gera `quantidade` exercícios em uma única chamada (schema de lista) e valida item a item.
+
+    Itens malformados são descartados individualmente; em caso de falha da chamada retorna lista vazia.
+    """
+    if not client:
+        return []
+
+    try:
+        with metricas.GEMINI_CHAMADA.medir("get_dynamic_exercises_batch"):
+            response = await client.aio.models.generate_content(
+                model=MODELO_GEMINI,
+                contents=_conteudo_lote_exercicios(user_level, quantidade),
+                config={
+                    'response_mime_type': 'application/json',
+                    'response_schema': EXERCICIOS_LOTE_RESPONSE_SCHEMA
+                }
+            )
+        itens = json.loads(response.text)
+
+    except APIError as e:
+        log.error(f"❌ Erro da API Gemini ao gerar lote de exercícios: {e}")
+        metricas.ERROS.incrementar("gemini")
+        return []
+    except Exception as e:
+        log.error(f"🚨 Erro inesperado ao gerar lote de exercícios: {e}")
+        metricas.ERROS.incrementar("gemini")
+        return []
+
+    if not isinstance(itens, list):
+        log.warning("⚠️ Lote de exercícios da IA não é uma lista. Descartado.")
+        return []
+
+    exercicios = [e for e in (validar_exercicio(item) for item in itens) if e is not None]
+    if len(exercicios) < len(itens):
+        log.warning("⚠️ %s de %s exercícios do lote descartados por formato inválido.", len(itens) - len(exercicios), len(itens))
+    return exercicios
@@ -0,0 +1,209 @@
+import os
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+
+import metrics as metricas
+
+load_dotenv()
+
+# ===============================================
+# CONFIGURAÇÕES DA CORREÇÃO LOCAL (Sobrescrevíveis pelo .env)
+# ===============================================
+
+# Erros de digitação tolerados por palavra (fração do tamanho dela: palavras curtas como "is" têm
+# de bater exatamente) e no total da resposta. Palavra faltando ou sobrando nunca é erro de digitação.
+CORRECAO_TOLERANCIA = float(os.getenv("CORRECAO_TOLERANCIA", "0.2"))
+CORRECAO_DISTANCIA_MAX = int(os.getenv("CORRECAO_DISTANCIA_MAX", "3"))
+# Resposta aberta e gabarito com até N palavras, longe de tudo o que é aceito: errada sem consultar a IA.
+# Acima disso pode ser uma paráfrase válida e a decisão fica com a IA.
+CORRECAO_PALAVRAS_DECISAO = int(os.getenv("CORRECAO_PALAVRAS_DECISAO", "3"))
+
+
+# ===============================================
+# NORMALIZAÇÃO
+# ===============================================
+
+_APOSTROFOS = str.maketrans({"’": "'", "‘": "'", "`": "'", "´": "'"})
+_CONTRACOES_IRREGULARES = {
+    "won't": "will not", "can't": "cannot", "shan't": "shall not", "ain't": "is not", "let's": "let us",
+}
+_RE_IRREGULARES = re.compile(r"\b(" + "|".join(re.escape(c) for c in _CONTRACOES_IRREGULARES) + r")\b")
+# 's só é expandido depois de pronomes (em "John's" é posse, não "is").
+_RE_S_IS = re.compile(r"\b(it|he|she|that|what|there|here|who|where|how)'s\b")
+_RE_SUFIXOS = [
+    (re.compile(r"n't\b"), " not"),
+    (re.compile(r"'re\b"), " are"),
+    (re.compile(r"'m\b"), " am"),
+    (re.compile(r"'ve\b"), " have"),
+    (re.compile(r"'ll\b"), " will"),
+    (re.compile(r"'d\b"), " would"),
+]
+_RE_PONTUACAO = re.compile(r"[^\w\s]|_")
+_RE_ESPACOS = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def normalizar(texto: str) -> str:
+    """Minúsculas, sem acentos, contrações expandidas, sem pontuação e com espaços únicos."""
+    texto = texto.casefold().translate(_APOSTROFOS)
+    if not texto.isascii():
+        texto = "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+    texto = _RE_IRREGULARES.sub(lambda m: _CONTRACOES_IRREGULARES[m.group(1)], texto)
+    texto = _RE_S_IS.sub(r"\1 is", texto)
+    for padrao, expansao in _RE_SUFIXOS:
+        texto = padrao.sub(expansao, texto)
+    texto = _RE_PONTUACAO.sub(" ", texto)
+    return _RE_ESPACOS.sub(" ", texto).strip().replace("can not", "cannot")
+
+
+def distancia_edicao(a: str, b: str, limite: int) -> int:
+    """
+    Distância de edição com transposição de letras vizinhas ("studnet" -> "student" custa 1),
+    ou `limite + 1` assim que passar do limite (sai cedo).
+    """
+    if abs(len(a) - len(b)) > limite:
+        return limite + 1
+    antepenultima = None
+    anterior = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        atual = [i]
+        for j, cb in enumerate(b, 1):
+            custo = min(anterior[j] + 1, atual[j - 1] + 1, anterior[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                custo = min(custo, antepenultima[j - 2] + 1)
+            atual.append(custo)
+        # Uma transposição olha duas linhas atrás: só dá para parar quando as duas passaram do limite.
+        if min(atual) > limite and min(anterior) >= limite:
+            return limite + 1
+        antepenultima, anterior = anterior, atual
+    return min(anterior[-1], limite + 1)
+
+
+def orcamento(palavra: str) -> int:
+    return min(CORRECAO_DISTANCIA_MAX, int(len(palavra) * CORRECAO_TOLERANCIA))
+
+
+def distancia_palavras(resposta: list, alvo: list) -> int:
+    """Soma das distâncias palavra a palavra, ou None se alguma passar do orçamento (ou o total)."""
+    if len(resposta) != len(alvo):
+        return None
+    total = 0
+    for palavra, esperada in zip(resposta, alvo):
+        if palavra != esperada:
+            limite = orcamento(esperada)
+            distancia = distancia_edicao(palavra, esperada, limite)
+            if distancia > limite:
+                return None
+            total += distancia
+    return total if total <= CORRECAO_DISTANCIA_MAX else None
+
+
+# ===============================================
+# CORREÇÃO
+# ===============================================
+
+@dataclass(frozen=True)
+class Correcao:
+    """
+    Resultado da correção local.
+
+    `veredito` tem três valores: True (certa), False (errada) ou None (não dá para decidir
+    localmente; quem chama escalona para a IA). `motivo` diz qual regra decidiu.
+    """
+    veredito: Optional[bool]
+    motivo: str
+
+
+def _mais_proximo(resposta: str, candidatos: dict):
+    """
+    Entre {texto_normalizado: certo?}, se o candidato dentro do orçamento mais perto da resposta é
+    certo ou errado. Empate entre candidatos que concordam decide; entre certo e errado, None.
+    """
+    palavras = resposta.split()
+    melhores, melhor_distancia = [], None
+    for candidato, certo in candidatos.items():
+        distancia = distancia_palavras(palavras, candidato.split())
+        if distancia is None:
+            continue
+        if melhor_distancia is None or distancia < melhor_distancia:
+            melhores, melhor_distancia = [certo], distancia
+        elif distancia == melhor_distancia:
+            melhores.append(certo)
+    return melhores[0] if len(set(melhores)) == 1 else None
+
+
+def corrigir_localmente(resposta: str, exercicio: dict) -> Correcao:
+    """
+    Corrige a resposta contra `correta` e a lista `aceitas` do exercício.
+
+    Múltipla escolha sempre é decidida aqui (a resposta é uma das opções ou está perto de uma).
+    Resposta aberta é certa se bater com um gabarito normalizado ou estiver a poucos erros de
+    digitação dele; errada se for curta e longe de tudo, ou se não tiver nem metade das palavras do
+    gabarito; do contrário, fica indecidida.
+    """
+    certas = {normalizar(texto) for texto in [exercicio.get("correta") or "", *exercicio.get("aceitas", [])]}
+    certas.discard("")
+    r = normalizar(resposta or "")
+
+    if not r:
+        return Correcao(False, "vazia")
+    if r in certas:
+        return Correcao(True, "exata")
+
+    if exercicio.get("tipo") == "choice":
+        candidatos = {normalizar(opcao): False for opcao in exercicio.get("opcoes", [])}
+        candidatos.update(dict.fromkeys(certas, True))
+        if candidatos.get(r) is False:
+            return Correcao(False, "outra_opcao")
+        proximo = _mais_proximo(r, candidatos)
+        if proximo is None:
+            return Correcao(False, "fora_das_opcoes")
+        return Correcao(proximo, "aproximada" if proximo else "outra_opcao")
+
+    if _mais_proximo(r, dict.fromkeys(certas, True)):
+        return Correcao(True, "aproximada")
+    palavras = len(r.split())
+    tamanhos = [len(c.split()) for c in certas]
+    if palavras <= CORRECAO_PALAVRAS_DECISAO and max(tamanhos, default=0) <= CORRECAO_PALAVRAS_DECISAO:
+        return Correcao(False, "distante")
+    if palavras * 2 < min(tamanhos, default=0):
+        return Correcao(False, "incompleta")
+    return Correcao(None, "indecidida")
+
+
+class CorretorRespostas:
+    """Corrige localmente e conta as decisões; `escalonadas / corrigidas` é a taxa de escalonamento para a IA."""
+
+    def __init__(self):
+        self.decisoes = Counter()
+        self.escalonamentos = Counter()
+
+    def corrigir(self, resposta: str, exercicio: dict) -> Correcao:
+        correcao = corrigir_localmente(resposta, exercicio)
+        self.decisoes[correcao.motivo] += 1
+        metricas.CORRECOES.incrementar(correcao.motivo)
+        return correcao
+
+    def registrar_escalonamento(self, veredito_ia):
+        """Resultado da IA para uma correção indecidida: True, False ou None (falhou)."""
+        resultado = {True: "certa", False: "errada", None: "falhou"}[veredito_ia]
+        self.escalonamentos[resultado] += 1
+        metricas.CORRECOES.incrementar(f"ia_{resultado}")
+
+    def estatisticas(self) -> dict:
+        corrigidas = sum(self.decisoes.values())
+        escalonadas = self.decisoes["indecidida"]
+        return {
+            "corrigidas": corrigidas,
+            "decididas_localmente": corrigidas - escalonadas,
+            "escalonadas": escalonadas,
+            "taxa_escalonamento": round(escalonadas / corrigidas, 4) if corrigidas else 0.0,
+            "por_motivo": dict(self.decisoes),
+            "resultado_ia": dict(self.escalonamentos),
+        }
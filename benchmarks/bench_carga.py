@@ -0,0 +1,421 @@
+"""
+Teste de carga do bot_server com uazapi e Gemini falsos.
+
+O app FastAPI roda no próprio processo (httpx.ASGITransport) com um banco SQLite temporário;
+a uazapi falsa (fake_uazapi.py) sobe num servidor HTTP local, em outro processo (não disputa CPU
+com o bot), e o Gemini falso (fake_gemini.py) substitui o cliente do ai_service. Usuários
+sintéticos percorrem caminhos reais da máquina de estados (roteiros abaixo) e cada passo espera
+as respostas do bot antes do próximo.
+
+Mede:
+  - latência do POST /webhook (p50/p95/p99);
+  - tempo até a primeira resposta e até a resposta completa de cada passo chegar à uazapi falsa;
+  - vazão (mensagens recebidas e respostas entregues por segundo);
+  - commits do SQLite por mensagem e quantos deles fazem fsync (com synchronous=FULL/EXTRA, um por
+    commit; com WAL + NORMAL, nenhum: o fsync fica para o checkpoint).
+
+Com --limites, confere o resultado com limites relativos (benchmarks/limites_carga.json), que
+valem em qualquer máquina, e sai com código 1 se algum for ultrapassado (é o que tests/test_carga.py
+roda). As latências são medidas em múltiplos da latência simulada (--gemini-ms + --uazapi-ms) e o
+webhook em múltiplos de --uazapi-ms: ele só valida e enfileira, então deve responder antes de uma
+única ida à uazapi.
+
+Com --baseline, compara com um resultado salvo na mesma máquina (ex.: antes e depois de uma
+mudança) e sai com código 1 se alguma métrica piorar mais que --tolerancia.
+
+Uso:
+    python benchmarks/bench_carga.py [--usuarios 100] [--pensar-ms 50] [--gemini-ms 300] [--uazapi-ms 30]
+        [--gemini-erro 0.0] [--uazapi-erro 0.0] [--json resultado.json] [--limites benchmarks/limites_carga.json]
+        [--baseline benchmarks/baseline_carga.json [--tolerancia 0.5]] [--salvar-baseline]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(PASTA))
+sys.path.insert(0, PASTA)
+
+BASELINE_PADRAO = os.path.join(PASTA, "baseline_carga.json")
+LIMITES_PADRAO = os.path.join(PASTA, "limites_carga.json")
+PARAMETROS_FORA_DO_RESULTADO = ("baseline", "json", "salvar_baseline", "porta_uazapi", "tolerancia", "folga_ms", "limites")
+
+# Métricas comparadas com a baseline: (seção, campo, maior_e_pior).
+METRICAS_REGRESSAO = [
+    ("webhook_ms", "p95", True),
+    ("webhook_ms", "p99", True),
+    ("primeira_resposta_ms", "p95", True),
+    ("primeira_resposta_ms", "p99", True),
+    ("resposta_completa_ms", "p95", True),
+    ("vazao", "mensagens_por_s", False),
+]
+
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentis(valores: list) -> dict:
+    if len(valores) < 2:
+        return {"n": len(valores), "p50": None, "p95": None, "p99": None, "max": max(valores, default=None)}
+    cortes = statistics.quantiles(valores, n=100, method="inclusive")
+    return {
+        "n": len(valores),
+        "p50": round(cortes[49], 2),
+        "p95": round(cortes[94], 2),
+        "p99": round(cortes[98], 2),
+        "max": round(max(valores), 2),
+    }
+
+
+# ===============================================
+# ROTEIROS DOS USUÁRIOS SINTÉTICOS
+# ===============================================
+# Cada passo é (texto enviado, respostas esperadas do bot).
+
+def roteiro_novo_usuario(rng: random.Random) -> list:
+    """Usuário novo: escolhe o nível, recebe o plano e faz exercícios dinâmicos até errar (máx. 3)."""
+    passos = [("oi", 1), ("a", 1), ("iniciante", 2), ("2", 1)]
+    for _ in range(3):
+        if rng.random() < 0.7:
+            passos.append(("is", 1))  # acerto: vem o próximo exercício
+        else:
+            passos.append(("am", 2))  # erro: reforço da IA + menu
+            break
+    else:
+        passos.append(("menu", 1))
+    return passos
+
+
+def roteiro_conversa(rng: random.Random) -> list:
+    """Usuário com nível definido: entra na conversação com IA e faz algumas perguntas."""
+    perguntas = [f"how do I use the present perfect? ({rng.random():.6f})" for _ in range(rng.randint(2, 4))]
+    return [("3", 1), *((p, 1) for p in perguntas), ("menu", 1)]
+
+
+def roteiro_quiz(licoes: list) -> list:
+    """Usuário no quiz estático: responde certo todas as lições; a última volta ao menu."""
+    return [(licao.resposta_correta.lower(), 1 if i < len(licoes) - 1 else 2) for i, licao in enumerate(licoes)]
+
+
+# ===============================================
+# EXECUÇÃO
+# ===============================================
+
+class CaixaDeEntrada:
+    """Respostas recebidas pela uazapi falsa para um destinatário (alimentada por outra thread)."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.chegadas = []
+        self.nova = asyncio.Event()
+
+    def registrar(self, instante: float):
+        # Instantes em time.monotonic(), comparáveis entre processos.
+        self.chegadas.append(instante)
+        self.nova.set()
+
+    async def esperar(self, total: int, timeout: float) -> bool:
+        limite = time.monotonic() + timeout
+        while len(self.chegadas) < total:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                return False
+            self.nova.clear()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self.nova.wait(), timeout=restante)
+        return True
+
+
+def _rodar_uazapi_falsa(porta: int, latencia_ms: float, taxa_erro: float, chegadas):
+    import uvicorn
+    from fake_uazapi import criar_app
+
+    def ao_receber(payload):
+        chegadas.put((payload.get("number"), time.monotonic()))
+
+    uvicorn.run(criar_app(latencia_ms, taxa_erro, ao_receber), host="127.0.0.1", port=porta, log_level="warning")
+
+
+def configurar_ambiente(porta_uazapi: int, envios_por_segundo: float) -> str:
+    """
+    Aponta o bot para um banco temporário e para a uazapi falsa. A configuração é lida na
+    importação dos módulos do bot, então precisa vir antes do `import bot_server`.
+    """
+    pasta = tempfile.mkdtemp(prefix="bench_carga_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(pasta, 'carga.db')}"
+    os.environ["BASE_URL"] = f"http://127.0.0.1:{porta_uazapi}"
+    os.environ["INSTANCIA_TOKEN"] = "carga"
+    os.environ["GEMINI_API_KEY"] = ""
+    os.environ["ENVIOS_POR_SEGUNDO"] = str(envios_por_segundo)
+    os.environ["ENVIOS_RAJADA"] = str(int(envios_por_segundo))
+    return pasta
+
+
+def subir_uazapi_falsa(porta: int, latencia_ms: float, taxa_erro: float, ao_receber=None):
+    """Sobe a uazapi falsa em outro processo; cada chegada é repassada a `ao_receber(numero, instante)`."""
+    # "spawn": o processo filho não herda o loop de eventos nem os módulos do bot.
+    contexto = multiprocessing.get_context("spawn")
+    chegadas = contexto.Queue()
+    processo = contexto.Process(target=_rodar_uazapi_falsa, args=(porta, latencia_ms, taxa_erro, chegadas), daemon=True)
+    processo.start()
+
+    def repassar():
+        while True:
+            item = chegadas.get()
+            if item is None:
+                return
+            if ao_receber is not None:
+                ao_receber(*item)
+
+    threading.Thread(target=repassar, daemon=True).start()
+    while True:
+        with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", porta), timeout=0.1):
+            break
+        time.sleep(0.05)
+    return processo, chegadas
+
+
+async def executar(args) -> dict:
+    import httpx
+
+    import ai_service
+    import bot_server
+    import conversation_flow
+    import database
+    import metrics as metricas
+    from adicionar_licoes import adicionar_licoes
+    from database import SessionLocal, Licao, Usuario
+    from fake_gemini import ClienteGeminiFalso
+    from lesson_catalog import Catalogo
+
+    rng = random.Random(args.semente)
+    loop = asyncio.get_running_loop()
+    caixas = {}
+
+    def ao_receber(numero, instante):
+        caixa = caixas.get(numero)
+        if caixa is not None:
+            loop.call_soon_threadsafe(caixa.registrar, instante)
+
+    processo, chegadas = subir_uazapi_falsa(args.porta_uazapi, args.uazapi_ms, args.uazapi_erro, ao_receber)
+    ai_service.client = ClienteGeminiFalso(args.gemini_ms, args.gemini_erro)
+
+    # Lições do quiz estático e usuários que já passaram da escolha de nível.
+    adicionar_licoes()
+    db = SessionLocal()
+    catalogo = Catalogo(db.query(Licao).all(), versao=None)
+    licoes = []
+    licao = catalogo.obter(1)
+    while licao is not None:
+        licoes.append(licao)
+        licao = catalogo.proxima(licao)
+
+    usuarios = []
+    for i in range(args.usuarios):
+        jid = f"5599{i:08d}@s.whatsapp.net"
+        sorteio = rng.random()
+        if sorteio < 0.4:
+            usuarios.append((jid, roteiro_novo_usuario(rng)))
+        elif sorteio < 0.7:
+            db.add(Usuario(wa_jid=jid, nivel_ingles="INICIANTE", estado=conversation_flow.ESTADO_MENU))
+            usuarios.append((jid, roteiro_conversa(rng)))
+        else:
+            db.add(Usuario(wa_jid=jid, nivel_ingles="INICIANTE", estado=conversation_flow.ESTADO_ESTUDANDO_LICAO, pergunta_atual_id=1))
+            usuarios.append((jid, roteiro_quiz(licoes)))
+        caixas[jid] = CaixaDeEntrada(loop)
+    db.commit()
+    db.close()
+
+    webhook_ms, primeira_ms, completa_ms = [], [], []
+    contadores = {"mensagens": 0, "rejeitadas_429": 0, "sem_resposta": 0}
+    sequencia = iter(range(10 ** 9))
+
+    async def usuario_sintetico(cliente, jid: str, passos: list):
+        await asyncio.sleep(rng.uniform(0, args.rampa_s))
+        caixa = caixas[jid]
+        for texto, esperadas in passos:
+            ja_recebidas = len(caixa.chegadas)
+            evento = {"EventType": "messages", "message": {
+                "fromMe": False, "sender": jid, "senderName": "Carga", "text": texto, "messageid": f"carga-{next(sequencia)}",
+            }}
+            inicio = time.monotonic()
+            while True:
+                resposta = await cliente.post("/webhook", json=evento)
+                if resposta.status_code != 429:
+                    break
+                contadores["rejeitadas_429"] += 1
+                await asyncio.sleep(float(resposta.headers.get("Retry-After", "1")))
+            webhook_ms.append((time.monotonic() - inicio) * 1000)
+            contadores["mensagens"] += 1
+
+            if not await caixa.esperar(ja_recebidas + esperadas, args.timeout_s):
+                contadores["sem_resposta"] += 1
+            if len(caixa.chegadas) > ja_recebidas:
+                primeira_ms.append((caixa.chegadas[ja_recebidas] - inicio) * 1000)
+                completa_ms.append((caixa.chegadas[min(len(caixa.chegadas), ja_recebidas + esperadas) - 1] - inicio) * 1000)
+            await asyncio.sleep(rng.uniform(0, 2 * args.pensar_ms) / 1000)
+
+    try:
+        async with bot_server.lifespan(bot_server.app):
+            transporte = httpx.ASGITransport(app=bot_server.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://bot") as cliente:
+                commits_antes = metricas.BANCO_COMMIT.contagem()
+                inicio = time.perf_counter()
+                await asyncio.gather(*(usuario_sintetico(cliente, jid, passos) for jid, passos in usuarios))
+                duracao = time.perf_counter() - inicio
+            commits = metricas.BANCO_COMMIT.contagem() - commits_antes
+            estatisticas_servidor = bot_server.read_estatisticas()
+    finally:
+        chegadas.put(None)
+        processo.terminate()
+        processo.join(timeout=5)
+
+    entregues = sum(len(caixa.chegadas) for caixa in caixas.values())
+    commits_por_mensagem = round(commits / max(1, contadores["mensagens"]), 2)
+    fsync_por_commit = database.SQLITE_SYNCHRONOUS.upper() in ("FULL", "EXTRA", "2", "3")
+    return {
+        "parametros": {k: v for k, v in vars(args).items() if k not in PARAMETROS_FORA_DO_RESULTADO},
+        "usuarios": args.usuarios,
+        **contadores,
+        "duracao_s": round(duracao, 2),
+        "vazao": {
+            "mensagens_por_s": round(contadores["mensagens"] / duracao, 1),
+            "respostas_por_s": round(entregues / duracao, 1),
+        },
+        "webhook_ms": percentis(webhook_ms),
+        "primeira_resposta_ms": percentis(primeira_ms),
+        "resposta_completa_ms": percentis(completa_ms),
+        "banco": {
+            "commits": commits,
+            "commits_por_mensagem": commits_por_mensagem,
+            "synchronous": database.SQLITE_SYNCHRONOUS,
+            "fsyncs_de_commit_por_mensagem": commits_por_mensagem if fsync_por_commit else 0.0,
+        },
+        "gemini": {"chamadas": ai_service.client.modelos.chamadas, "erros": ai_service.client.modelos.erros},
+        "servidor": {chave: estatisticas_servidor[chave] for chave in ("fila", "envios", "prefetch_exercicios")},
+    }
+
+
+def verificar_regressao(resultado: dict, baseline: dict, tolerancia: float, folga_ms: float) -> list:
+    """Lista as métricas que pioraram mais que `tolerancia` (fração) em relação à baseline."""
+    regressoes = []
+    for secao, campo, maior_e_pior in METRICAS_REGRESSAO:
+        atual = resultado.get(secao, {}).get(campo)
+        referencia = baseline.get(secao, {}).get(campo)
+        if atual is None or referencia is None:
+            continue
+        if maior_e_pior and atual > referencia * (1 + tolerancia) + folga_ms:
+            regressoes.append(f"{secao}.{campo}: {atual} (baseline {referencia})")
+        elif not maior_e_pior and atual < referencia * (1 - tolerancia):
+            regressoes.append(f"{secao}.{campo}: {atual} (baseline {referencia})")
+    if resultado["sem_resposta"] > baseline.get("sem_resposta", 0):
+        regressoes.append(f"sem_resposta: {resultado['sem_resposta']} (baseline {baseline.get('sem_resposta', 0)})")
+    return regressoes
+
+
+def verificar_limites(resultado: dict, limites: dict) -> list:
+    """Lista os limites relativos (ver limites_carga.json) que o resultado ultrapassou."""
+    parametros = resultado["parametros"]
+    latencia_simulada = parametros["gemini_ms"] + parametros["uazapi_ms"]
+    # nome do limite: (valor medido, unidade em que o limite é expresso)
+    medidas = {
+        "sem_resposta": (resultado["sem_resposta"], 1),
+        "rejeitadas_429": (resultado["rejeitadas_429"], 1),
+        "commits_por_mensagem": (resultado["banco"]["commits_por_mensagem"], 1),
+        "webhook_p99_por_uazapi": (resultado["webhook_ms"]["p99"], parametros["uazapi_ms"]),
+        "primeira_resposta_p95_por_latencia_simulada": (resultado["primeira_resposta_ms"]["p95"], latencia_simulada),
+        "resposta_completa_p95_por_latencia_simulada": (resultado["resposta_completa_ms"]["p95"], latencia_simulada),
+    }
+    excedidos = []
+    for nome, maximo in limites.items():
+        valor, unidade = medidas[nome]
+        if valor is None or not unidade:
+            continue
+        if valor / unidade > maximo:
+            excedidos.append(f"{nome}: {valor / unidade:.2f} (máximo {maximo})")
+    return excedidos
+
+
+def imprimir(resultado: dict):
+    print(f"\n{resultado['usuarios']} usuários, {resultado['mensagens']} mensagens em {resultado['duracao_s']}s "
+          f"({resultado['vazao']['mensagens_por_s']} msg/s, {resultado['vazao']['respostas_por_s']} respostas/s)")
+    print(f"rejeitadas (429): {resultado['rejeitadas_429']}   passos sem resposta completa: {resultado['sem_resposta']}")
+    banco = resultado["banco"]
+    print(f"commits/mensagem: {banco['commits_por_mensagem']}   fsyncs de commit/mensagem: "
+          f"{banco['fsyncs_de_commit_por_mensagem']} (synchronous={banco['synchronous']})")
+    print(f"{'':<22}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for secao in ("webhook_ms", "primeira_resposta_ms", "resposta_completa_ms"):
+        p = resultado[secao]
+        print(f"{secao:<22}" + "".join(f"{p[c] if p[c] is not None else '-':>10}" for c in ("p50", "p95", "p99", "max")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--usuarios", type=int, default=100)
+    parser.add_argument("--pensar-ms", type=float, default=50, help="Tempo médio entre passos de um usuário.")
+    parser.add_argument("--rampa-s", type=float, default=1.0, help="Janela em que os usuários começam.")
+    parser.add_argument("--gemini-ms", type=float, default=300, help="Latência mediana do Gemini falso.")
+    parser.add_argument("--gemini-erro", type=float, default=0.0, help="Fração de chamadas ao Gemini que falham.")
+    parser.add_argument("--uazapi-ms", type=float, default=30, help="Latência média da uazapi falsa.")
+    parser.add_argument("--uazapi-erro", type=float, default=0.0, help="Fração de envios que recebem 503.")
+    parser.add_argument("--envios-por-segundo", type=float, default=1000, help="Limite do despachante de envios.")
+    parser.add_argument("--timeout-s", type=float, default=15, help="Espera máxima pelas respostas de um passo.")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--porta-uazapi", type=int, default=0, help="0 = porta livre qualquer.")
+    parser.add_argument("--json", help="Grava o resultado completo neste arquivo.")
+    parser.add_argument("--limites", help=f"Confere com estes limites relativos (ex.: {LIMITES_PADRAO}) e sai com código 1 se algum for ultrapassado.")
+    parser.add_argument("--baseline", help="Compara com um resultado da mesma máquina e sai com código 1 se houver regressão.")
+    parser.add_argument("--tolerancia", type=float, default=0.5, help="Piora relativa aceita (padrão: 0.5 = 50%%).")
+    parser.add_argument("--folga-ms", type=float, default=5, help="Piora absoluta aceita nas latências, além da tolerância.")
+    parser.add_argument("--salvar-baseline", action="store_true", help=f"Grava o resultado em {BASELINE_PADRAO}.")
+    args = parser.parse_args()
+    args.porta_uazapi = args.porta_uazapi or porta_livre()
+
+    configurar_ambiente(args.porta_uazapi, args.envios_por_segundo)
+
+    resultado = asyncio.run(executar(args))
+
+    imprimir(resultado)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+    if args.salvar_baseline:
+        with open(BASELINE_PADRAO, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+        print(f"\nBaseline gravada em {BASELINE_PADRAO}.")
+
+    if args.limites:
+        with open(args.limites, encoding="utf-8") as arquivo:
+            excedidos = verificar_limites(resultado, json.load(arquivo))
+        if excedidos:
+            print("\n❌ Limites ultrapassados:\n  " + "\n  ".join(excedidos))
+            raise SystemExit(1)
+        print("\n✅ Dentro dos limites.")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as arquivo:
+            baseline = json.load(arquivo)
+        if baseline.get("parametros") != resultado["parametros"]:
+            print("\n⚠️ A baseline foi gerada com outros parâmetros; a comparação pode não fazer sentido.")
+        regressoes = verificar_regressao(resultado, baseline, args.tolerancia, args.folga_ms)
+        if regressoes:
+            print("\n❌ Regressão em relação à baseline:\n  " + "\n  ".join(regressoes))
+            raise SystemExit(1)
+        print("\n✅ Sem regressão em relação à baseline.")
+
+
+if __name__ == "__main__":
+    main()
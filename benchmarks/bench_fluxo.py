@@ -0,0 +1,79 @@
+"""
+Micro-benchmark dos handlers da máquina de estados, sem HTTP, banco nem uazapi.
+
+Cada caso parte de um `Usuario` em memória num estado, despacha uma entrada e confere o estado
+final. Os envios são capturados por um despachante falso (nada sai da máquina). Ficam de fora
+os handlers que chamam a IA.
+
+Uso: python benchmarks/bench_fluxo.py [--repeticoes 20000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import conversation_flow as fluxo
+from database import Usuario
+
+
+class DespachanteFalso:
+    def __init__(self):
+        self.enviados = 0
+
+    def enviar_texto(self, destino, texto):
+        self.enviados += 1
+
+    def enviar_menu(self, destino, texto, opcoes):
+        self.enviados += 1
+
+    def enviar_menu_estatico(self, destino, menu):
+        self.enviados += 1
+
+
+# (estado inicial, nível, texto recebido, estado esperado depois)
+CASOS = [
+    (fluxo.ESTADO_MENU, "INICIANTE", "oi", fluxo.ESTADO_MENU),
+    (fluxo.ESTADO_MENU, fluxo.NIVEL_NAO_DEFINIDO, "menu", fluxo.ESTADO_ESCOLHA_NIVEL),
+    (fluxo.ESTADO_MENU, "INICIANTE", "1", fluxo.ESTADO_ESCOLHA_NIVEL),
+    (fluxo.ESTADO_MENU, "INICIANTE", "3", fluxo.ESTADO_CONVERSANDO_IA),
+    (fluxo.ESTADO_MENU, "INICIANTE", "5", fluxo.ESTADO_FINALIZADO),
+    (fluxo.ESTADO_MENU, "INICIANTE", "qualquer coisa", fluxo.ESTADO_MENU),
+    (fluxo.ESTADO_ESCOLHA_NIVEL, fluxo.NIVEL_NAO_DEFINIDO, "a", fluxo.ESTADO_AGUARDANDO_NIVEL_DIGITADO),
+    (fluxo.ESTADO_ESCOLHA_NIVEL, fluxo.NIVEL_NAO_DEFINIDO, "x", fluxo.ESTADO_ESCOLHA_NIVEL),
+    (fluxo.ESTADO_AGUARDANDO_NIVEL_DIGITADO, fluxo.NIVEL_NAO_DEFINIDO, "xyz", fluxo.ESTADO_AGUARDANDO_NIVEL_DIGITADO),
+    (fluxo.ESTADO_ESTUDANDO_LICAO, "INICIANTE", "z", fluxo.ESTADO_ESTUDANDO_LICAO),
+]
+
+
+async def medir(repeticoes: int):
+    fluxo.despachante_envios = despachante = DespachanteFalso()
+    resultados = []
+    for estado, nivel, texto, esperado in CASOS:
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            usuario = Usuario(wa_jid="5500000000000@s.whatsapp.net", nivel_ingles=nivel, estado=estado, pergunta_atual_id=0)
+            entrada = fluxo.ENTRADA_RESET if texto in fluxo.PALAVRAS_RESET else texto.upper()
+            ctx = fluxo.Contexto(usuario, usuario.wa_jid, texto, texto.upper(), fluxo.nivel_definido(usuario))
+            handler = await fluxo.maquina.despachar(estado, entrada, ctx)
+        duracao = time.perf_counter() - inicio
+        assert usuario.estado == esperado, (estado, texto, usuario.estado, esperado)
+        resultados.append((estado, texto, handler.__name__, duracao / repeticoes * 1e6))
+
+    print(f"{'estado':<28} {'entrada':<16} {'handler':<26} µs/msg")
+    for estado, texto, nome, micros in resultados:
+        print(f"{estado:<28} {texto:<16} {nome:<26} {micros:7.1f}")
+    print(f"\n{despachante.enviados} envios capturados.")
+
+    inicio = time.perf_counter()
+    for _ in range(repeticoes * 10):
+        fluxo.maquina.resolver(fluxo.ESTADO_MENU, "QUALQUER COISA")
+    print(f"Resolução na tabela (pior caso, 3 buscas): {(time.perf_counter() - inicio) / (repeticoes * 10) * 1e9:.0f} ns")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark dos handlers da máquina de estados.")
+    parser.add_argument("--repeticoes", type=int, default=20000)
+    asyncio.run(medir(parser.parse_args().repeticoes))
@@ -0,0 +1,70 @@
+"""
+Micro-benchmark do custo de CPU por envio: menu montado a cada chamada x menu pré-serializado x texto.
+
+Mede só a preparação da requisição (payload + JSON + `httpx.Request`), sem rede.
+
+Uso: python benchmarks/bench_payloads.py [--envios 50000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from send_message import ENDPOINT_SEND_MENU, ENDPOINT_SEND_TEXT, _payload_menu, _payload_texto, registrar_menu
+
+URL = "http://uazapi.local"
+
+OPCOES_MENU_PRINCIPAL = {
+    "1. Meu Nível e Plano de Estudos": "1",
+    "2. Iniciar Lição (Dinâmica)": "2",
+    "3. Prática de Conversação com IA (PLN)": "3",
+    "4. Status da Conexão": "4",
+    "5. Sair / Desligar": "5",
+}
+TEXTO_MENU_PRINCIPAL = "Olá! Bem-vindo ao English Bot! Escolha uma opção:"
+MENU_PRINCIPAL = registrar_menu("bench_menu_principal", TEXTO_MENU_PRINCIPAL, OPCOES_MENU_PRINCIPAL)
+
+
+def menu_montado(numero: str) -> httpx.Request:
+    # Caminho antigo: lista de opções, dict do payload e JSON refeitos a cada envio.
+    choices = [f"{texto_visivel}|{id_controle}" for texto_visivel, id_controle in OPCOES_MENU_PRINCIPAL.items()]
+    return httpx.Request("POST", URL + ENDPOINT_SEND_MENU, json=_payload_menu(numero, TEXTO_MENU_PRINCIPAL, choices))
+
+
+def menu_pre_serializado(numero: str) -> httpx.Request:
+    return httpx.Request("POST", URL + ENDPOINT_SEND_MENU, content=MENU_PRINCIPAL.corpo(numero))
+
+
+def texto(numero: str) -> httpx.Request:
+    return httpx.Request("POST", URL + ENDPOINT_SEND_TEXT, json=_payload_texto(numero, "✅ **Correto!** Próximo exercício:"))
+
+
+def medir(funcao, envios: int) -> float:
+    numeros = [f"55119{i:08d}@s.whatsapp.net" for i in range(1000)]
+    inicio = time.process_time()
+    for i in range(envios):
+        funcao(numeros[i % 1000])
+    return (time.process_time() - inicio) / envios * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--envios", type=int, default=50000)
+    args = parser.parse_args()
+
+    resultados = {
+        "menu montado por envio": medir(menu_montado, args.envios),
+        "menu pré-serializado": medir(menu_pre_serializado, args.envios),
+        "mensagem de texto": medir(texto, args.envios),
+    }
+    for nome, micros in resultados.items():
+        print(f"{nome:<24} {micros:8.2f} µs/envio")
+    print(f"ganho no menu: {resultados['menu montado por envio'] / resultados['menu pré-serializado']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark de commits/s do SQLite: perfil padrão (journal de rollback + synchronous=FULL) x perfil de produção.
+
+Simula o padrão do webhook: lê um `Usuario`, altera estado/ultima_interacao e faz commit. Cada
+iteração equivale a uma mensagem (um commit por mensagem): no perfil padrão cada commit faz fsync;
+no de produção (WAL + synchronous=NORMAL) o fsync fica para o checkpoint. O número de commits por
+mensagem do fluxo completo aparece no bench_carga.py.
+
+Uso: python benchmarks/bench_sqlite.py [--commits 2000] [--usuarios 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Usuario, criar_engine
+
+
+def medir(perfil_producao: bool, commits: int, usuarios: int) -> float:
+    with tempfile.TemporaryDirectory() as pasta:
+        engine = criar_engine(f"sqlite:///{os.path.join(pasta, 'bench.db')}", perfil_producao=perfil_producao)
+        Base.metadata.create_all(bind=engine)
+        Sessao = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        with Sessao() as db:
+            db.add_all(Usuario(wa_jid=f"{i}@s.whatsapp.net", estado="menu_principal") for i in range(usuarios))
+            db.commit()
+
+        inicio = time.perf_counter()
+        with Sessao() as db:
+            for i in range(commits):
+                usuario = db.get(Usuario, f"{i % usuarios}@s.whatsapp.net")
+                usuario.ultima_interacao = datetime.now()
+                usuario.estado = "menu_principal" if i % 2 else "aguardando_resposta_dinamica"
+                db.commit()
+        duracao = time.perf_counter() - inicio
+        engine.dispose()
+        return commits / duracao
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commits", type=int, default=2000)
+    parser.add_argument("--usuarios", type=int, default=200)
+    args = parser.parse_args()
+
+    antes = medir(False, args.commits, args.usuarios)
+    depois = medir(True, args.commits, args.usuarios)
+
+    print(f"Perfil padrão:   {antes:10.0f} commits/s (fsync a cada commit)")
+    print(f"Perfil produção: {depois:10.0f} commits/s (fsync só no checkpoint)")
+    print(f"Ganho:           {depois / antes:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
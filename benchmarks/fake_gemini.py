@@ -0,0 +1,61 @@
+"""
+Cliente Gemini falso para testes de carga: imita `client.aio.models.generate_content`.
+
+A latência segue uma lognormal com mediana `latencia_ms` (cauda longa, como a API real) e uma
+fração `taxa_erro` das chamadas levanta exceção. Exercícios gerados são de múltipla escolha com
+pergunta única (não colidem no pool) e gabarito sempre "is" (as opções são is/am/are/be).
+"""
+import asyncio
+import itertools
+import json
+import random
+import re
+import types
+
+
+class RespostaFalsa:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class ModelosFalsos:
+    def __init__(self, latencia_ms: float, taxa_erro: float, dispersao: float):
+        self.latencia_ms = latencia_ms
+        self.taxa_erro = taxa_erro
+        self.dispersao = dispersao
+        self._contador = itertools.count(1)
+        self.chamadas = 0
+        self.erros = 0
+
+    def _exercicio(self, sufixo: str) -> dict:
+        return {
+            "id": f"EX{sufixo}",
+            "tipo": "choice",
+            "pergunta": f"({sufixo}) Complete: 'She ____ a student.'",
+            "opcoes": ["is", "am", "are", "be"],
+            "correta": "is",
+        }
+
+    async def generate_content(self, model, contents, config=None):
+        self.chamadas += 1
+        numero = next(self._contador)
+        if self.latencia_ms:
+            await asyncio.sleep(random.lognormvariate(0, self.dispersao) * self.latencia_ms / 1000)
+        if self.taxa_erro and random.random() < self.taxa_erro:
+            self.erros += 1
+            raise RuntimeError("erro simulado do Gemini")
+
+        config = config or {}
+        if config.get("response_mime_type") == "application/json":
+            if config.get("response_schema", {}).get("type") == "array":
+                quantidade = re.search(r"Crie (\d+) exercícios", str(contents))
+                quantidade = int(quantidade.group(1)) if quantidade else 10
+                return RespostaFalsa(json.dumps([self._exercicio(f"{numero}.{i}") for i in range(quantidade)]))
+            return RespostaFalsa(json.dumps(self._exercicio(str(numero))))
+        return RespostaFalsa(f"Resposta simulada #{numero}: pratique 10 minutos por dia. 📚")
+
+
+class ClienteGeminiFalso:
+    def __init__(self, latencia_ms: float = 300, taxa_erro: float = 0.0, dispersao: float = 0.5):
+        self.modelos = ModelosFalsos(latencia_ms, taxa_erro, dispersao)
+        self.aio = types.SimpleNamespace(models=self.modelos)
@@ -0,0 +1,66 @@
+"""
+Stub local da uazapi para testes de carga e de transmissão, sem WhatsApp de verdade.
+
+Responde /send/text, /send/menu e /instance/status com latência e taxa de erro configuráveis e
+conta as mensagens recebidas por destinatário (GET /_stats).
+
+Uso:
+    python benchmarks/fake_uazapi.py [--porta 8081] [--latencia-ms 50] [--taxa-erro 0.0]
+    BASE_URL=http://127.0.0.1:8081 INSTANCIA_TOKEN=teste python broadcast.py ...
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def criar_app(latencia_ms: float = 50, taxa_erro: float = 0.0, ao_receber=None) -> FastAPI:
+    """`ao_receber(payload)`, se informado, é chamado a cada mensagem aceita (usado pelo teste de carga)."""
+    app = FastAPI(title="uazapi falsa")
+    recebidas = Counter()
+    inicio = time.monotonic()
+
+    async def responder_envio(request: Request):
+        payload = await request.json()
+        if latencia_ms:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * latencia_ms / 1000)
+        if taxa_erro and random.random() < taxa_erro:
+            return JSONResponse(status_code=503, content={"error": "indisponível (simulado)"})
+        recebidas[payload.get("number")] += 1
+        if ao_receber is not None:
+            ao_receber(payload)
+        return {"id": f"FAKE{sum(recebidas.values())}", "status": "sent"}
+
+    app.post("/send/text")(responder_envio)
+    app.post("/send/menu")(responder_envio)
+
+    @app.get("/instance/status")
+    async def status():
+        return {"instance": {"status": "connected"}}
+
+    @app.get("/_stats")
+    async def estatisticas():
+        total = sum(recebidas.values())
+        return {
+            "mensagens": total,
+            "destinatarios": len(recebidas),
+            "repetidas": sum(n - 1 for n in recebidas.values() if n > 1),
+            "mensagens_por_segundo": round(total / (time.monotonic() - inicio), 1),
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Stub local da uazapi.")
+    parser.add_argument("--porta", type=int, default=8081)
+    parser.add_argument("--latencia-ms", type=float, default=50)
+    parser.add_argument("--taxa-erro", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(criar_app(args.latencia_ms, args.taxa_erro), host="127.0.0.1", port=args.porta, log_level="warning")
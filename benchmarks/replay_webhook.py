@@ -0,0 +1,154 @@
+"""
+Reproduz uma gravação do webhook (WEBHOOK_GRAVACAO_ARQUIVO) respeitando os intervalos originais.
+
+Sem --url, sobe o bot no próprio processo com banco temporário, uazapi falsa e Gemini falso
+(nenhuma chamada sai para os serviços reais) e, no fim, espera as filas esvaziarem. Com --url,
+envia para um servidor já rodando; nesse caso aponte o BASE_URL dele para benchmarks/fake_uazapi.py.
+
+Uso:
+    python benchmarks/replay_webhook.py gravacao.jsonl.gz [--velocidade 1 | 10 | max]
+        [--url http://127.0.0.1:8000/webhook] [--novos-ids] [--concorrencia 200] [--json resultado.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(PASTA))
+sys.path.insert(0, PASTA)
+
+from bench_carga import configurar_ambiente, percentis, porta_livre, subir_uazapi_falsa
+from webhook_recorder import ler_gravacao
+
+
+def trocar_ids(corpo: str, sufixo: str) -> str:
+    """Acrescenta `sufixo` aos IDs das mensagens para a deduplicação não descartar uma nova reprodução."""
+    try:
+        dados = json.loads(corpo)
+    except ValueError:
+        return corpo
+    for evento in dados if isinstance(dados, list) else [dados]:
+        mensagem = evento.get("message") if isinstance(evento, dict) else None
+        if isinstance(mensagem, dict):
+            for campo in ("messageid", "id"):
+                if mensagem.get(campo):
+                    mensagem[campo] = f"{mensagem[campo]}{sufixo}"
+    return json.dumps(dados, ensure_ascii=False)
+
+
+async def reproduzir(cliente, url: str, caminho: str, velocidade: float, concorrencia: int, sufixo_ids: str) -> dict:
+    limite = asyncio.Semaphore(concorrencia)
+    latencias_ms, atrasos_ms = [], []
+    status = Counter()
+    tarefas = []
+
+    async def enviar(corpo: str):
+        async with limite:
+            inicio = time.monotonic()
+            try:
+                resposta = await cliente.post(url, content=corpo.encode("utf-8"), headers={"Content-Type": "application/json"})
+                status[str(resposta.status_code)] += 1
+            except Exception as e:
+                status[type(e).__name__] += 1
+            latencias_ms.append((time.monotonic() - inicio) * 1000)
+
+    primeiro = None
+    duracao_original = 0.0
+    inicio = time.monotonic()
+    for instante, corpo in ler_gravacao(caminho):
+        if primeiro is None:
+            primeiro = instante
+        duracao_original = instante - primeiro
+        if velocidade:
+            alvo = duracao_original / velocidade
+            espera = alvo - (time.monotonic() - inicio)
+            if espera > 0:
+                await asyncio.sleep(espera)
+            atrasos_ms.append(max(0.0, (time.monotonic() - inicio - alvo) * 1000))
+        if sufixo_ids:
+            corpo = trocar_ids(corpo, sufixo_ids)
+        tarefas.append(asyncio.create_task(enviar(corpo)))
+
+    await asyncio.gather(*tarefas)
+    duracao = time.monotonic() - inicio
+    return {
+        "requisicoes": len(tarefas),
+        "status": dict(status),
+        "duracao_original_s": round(duracao_original, 2),
+        "duracao_s": round(duracao, 2),
+        "requisicoes_por_s": round(len(tarefas) / duracao, 1) if duracao else None,
+        "latencia_ms": percentis(latencias_ms),
+        "atraso_agenda_ms": percentis(atrasos_ms),
+    }
+
+
+async def reproduzir_em_processo(args) -> dict:
+    import httpx
+
+    import ai_service
+    import bot_server
+    from fake_gemini import ClienteGeminiFalso
+
+    processo, chegadas = subir_uazapi_falsa(args.porta_uazapi, args.uazapi_ms, 0.0)
+    ai_service.client = ClienteGeminiFalso(args.gemini_ms)
+    try:
+        async with bot_server.lifespan(bot_server.app):
+            transporte = httpx.ASGITransport(app=bot_server.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://bot") as cliente:
+                resultado = await reproduzir(cliente, "/webhook", args.gravacao, args.velocidade, args.concorrencia, args.sufixo_ids)
+
+            # Tempo até o bot terminar de processar e responder tudo o que recebeu.
+            inicio = time.monotonic()
+            while bot_server.fila_webhook.pendentes or bot_server.despachante_envios.pendentes:
+                await asyncio.sleep(0.05)
+            resultado["drenagem_s"] = round(time.monotonic() - inicio, 2)
+            estatisticas = bot_server.read_estatisticas()
+            resultado["servidor"] = {chave: estatisticas[chave] for chave in ("fila", "envios", "deduplicacao")}
+    finally:
+        chegadas.put(None)
+        processo.terminate()
+        processo.join(timeout=5)
+    return resultado
+
+
+async def reproduzir_remoto(args) -> dict:
+    import httpx
+
+    async with httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=args.concorrencia)) as cliente:
+        return await reproduzir(cliente, args.url, args.gravacao, args.velocidade, args.concorrencia, args.sufixo_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("gravacao", help="Arquivo gravado pelo servidor (.jsonl ou .jsonl.gz).")
+    parser.add_argument("--velocidade", default="1", help="1 = tempo real, N = N vezes mais rápido, max = sem espera.")
+    parser.add_argument("--url", help="URL do /webhook de um servidor rodando (sem ela, o bot sobe no próprio processo).")
+    parser.add_argument("--novos-ids", action="store_true", help="Troca os IDs das mensagens (para reproduzir de novo no mesmo banco).")
+    parser.add_argument("--concorrencia", type=int, default=200, help="Requisições simultâneas no máximo.")
+    parser.add_argument("--gemini-ms", type=float, default=300, help="Latência mediana do Gemini falso (sem --url).")
+    parser.add_argument("--uazapi-ms", type=float, default=30, help="Latência média da uazapi falsa (sem --url).")
+    parser.add_argument("--json", help="Grava o resultado neste arquivo (para comparar builds).")
+    args = parser.parse_args()
+
+    args.velocidade = 0 if args.velocidade == "max" else float(args.velocidade)
+    args.sufixo_ids = f"-replay{int(time.time())}" if args.novos_ids else ""
+
+    if args.url:
+        resultado = asyncio.run(reproduzir_remoto(args))
+    else:
+        args.porta_uazapi = porta_livre()
+        configurar_ambiente(args.porta_uazapi, envios_por_segundo=1000)
+        resultado = asyncio.run(reproduzir_em_processo(args))
+
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,420 +1,276 @@
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from contextlib import asynccontextmanager
 import logging
 import os
+import secrets
 from dotenv import load_dotenv
-from send_message import send_whatsapp_message, send_button_menu
-from utils import get_instance_status
-from datetime import datetime
 import json
-from ai_service import get_ai_response, get_dynamic_exercise 
-
-from database import init_db, get_db, Usuario, Licao
-from sqlalchemy.orm import Session
-from typing import Annotated
-from fastapi import Depends
+import time
+import metrics as metricas
+from ai_service import cache_respostas
+
+from database import init_db, engine, SessionLocal
+from webhook_queue import FilaWebhook
+from message_dedup import DeduplicadorMensagens, id_da_mensagem
+from conversation_flow import (
+    processar_mensagem, reabastecedor_pool, prefetch_exercicios, catalogo_licoes,
+    despachante_envios, monitor_status, corretor, memoria_conversas,
+)
+from webhook_recorder import GravadorWebhook
+from profiler import ProfilerWebhook
+import uazapi_client
 
 load_dotenv()
 
 logging.getLogger('werkzeug').setLevel(logging.ERROR)
 DEBUG_MODE = os.getenv("DEBUG_MODE", "False").lower() in ("true", "1", "t")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
 init_db()
 
-app = FastAPI(title="English Bot Server", debug=DEBUG_MODE)
 
 # ===============================================
-# CONSTANTES DE FLUXO E MENUS
+# PROCESSAMENTO DE MENSAGENS (fluxo em conversation_flow.py)
 # ===============================================
 
-ESTADO_MENU = "menu_principal"
-ESTADO_ESTUDANDO_LICAO = "estudando_licao"
-ESTADO_ESCOLHA_NIVEL = "escolha_nivel"
-ESTADO_AVALIACAO_INICIAL = "avaliacao_inicial"
-ESTADO_AGUARDANDO_NIVEL_DIGITADO = "aguardando_nivel_digitado"
-ESTADO_AGUARDANDO_RESPOSTA_DINAMICA = "aguardando_resposta_dinamica"
-
-
-# CONSTANTES GLOBAIS DE MENU
-OPCOES_MENU_PRINCIPAL = {
-    "1. Meu Nível e Plano de Estudos": "1",
-    "2. Iniciar Lição (Dinâmica)": "2",
-    "3. Prática de Conversação com IA (PLN)": "3",
-    "4. Status da Conexão": "4",
-    "5. Sair / Desligar": "5",
-}
-TEXTO_MENU_PRINCIPAL = "Olá! Bem-vindo ao English Bot! Escolha uma opção:"
-
-OPCOES_ESCOLHA_NIVEL = {
-    "A. Digitar meu nível": "A",
-    "B. Fazer um pequeno Teste de Nível (Em Breve)": "B",
-}
-TEXTO_ESCOLHA_NIVEL = "Ótima escolha! Para criar seu plano, como você quer definir seu nível?"
-
-OPCOES_NIVEL_DIGITADO = {
-    "INICIANTE (POUCO CONHECIMENTO)": "INICIANTE",
-    "INTERMEDIARIO (MÉDIO CONHECIMENTO)": "INTERMEDIARIO",
-    "ALTO (ALTO TEMPO)" : "ALTO",
-    "AVANÇADO (TEM UM CONHECIMENTO EXEPCIONAL)" : "AVANÇADO",
-}
-TEXTO_NIVEL_DIGITADO = "Certo. Por favor, escolha seu nível atual para gerar seu plano."
+async def processar_eventos(eventos: list):
+    """
+    Roda no worker com os eventos de um mesmo remetente, em ordem, numa única sessão.
+
+    As alterações de cada evento ficam pendentes na sessão (autoflush desligado) e são gravadas num
+    commit ao fim do evento, sem segurar o lock de escrita do SQLite durante envios e chamadas à IA.
+    Se um evento falhar, só as alterações dele são descartadas: as dos eventos anteriores, cujas
+    respostas já saíram, ficam confirmadas.
+    """
+    db = SessionLocal()
+    try:
+        for evento_dados in eventos:
+            try:
+                # Reenvio de uma mensagem já processada (ex.: após reinício): descarta antes de qualquer trabalho.
+                message_id = id_da_mensagem(evento_dados)
+                if message_id and not deduplicador.registrar_processamento(db, message_id):
+                    continue
+                inicio = time.perf_counter()
+                ramo = await processar_mensagem(evento_dados, db)
+                if ramo is not None:
+                    metricas.WEBHOOK_PROCESSAMENTO.observar(time.perf_counter() - inicio, ramo)
+            except Exception as e:
+                db.rollback()
+                metricas.ERROS.incrementar("processamento")
+                logging.error(f"🚨 Erro no processamento do webhook: {e}")
+                continue
+
+            # Um commit por mensagem: estado, ultima_interacao e ID de deduplicação juntos. Só é pulado
+            # quando o evento não alterou nada (ex.: mensagem sem texto).
+            if db.new or db.dirty or db.deleted:
+                try:
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    metricas.ERROS.incrementar("gravacao")
+                    logging.error(f"🚨 Erro ao gravar o evento {message_id}: {e}")
+    finally:
+        db.close()
+
+
+def evento_e_mensagem_recebida(evento_dados) -> bool:
+    """Validação barata feita no próprio webhook: só mensagens recebidas (fromMe == False) vão para a fila."""
+    if not isinstance(evento_dados, dict):
+        return False
+    mensagem = evento_dados.get('message') or {}
+    return evento_dados.get('EventType') == 'messages' and mensagem.get('fromMe') == False and bool(mensagem.get('sender'))
 
 
 # ===============================================
-# FUNÇÕES AUXILIARES
+# FILA DE PROCESSAMENTO E CICLO DE VIDA
 # ===============================================
 
-def enviar_licao(db: Session, remetente_jid: str, licao: Licao, texto_inicial: str):
-    
-    opcoes = [
-        f"A: {licao.opcao_a.split('. ', 1)[-1]}|A",
-        f"B: {licao.opcao_b.split('. ', 1)[-1]}|B",
-        f"C: {licao.opcao_c.split('. ', 1)[-1]}|C",
-        f"D: {licao.opcao_d.split('. ', 1)[-1]}|D",
-    ]
-    
-    mensagem_texto = (
-        f"{texto_inicial}\n\n"
-        f"*{licao.topico}*\n"
-        f"Responda: {licao.texto_pergunta}"
-    )
-    
-    send_button_menu(remetente_jid, mensagem_texto, opcoes)
-
-def enviar_menu_botoes(remetente_jid: str, texto_principal: str, opcoes_dict: dict):
-    
-    opcoes_list = [f"{texto_visivel}|{id_controle}" for texto_visivel, id_controle in opcoes_dict.items()]
-    send_button_menu(remetente_jid, texto_principal, opcoes_list)
-
-def enviar_resposta_de_texto(remetente_jid: str, text: str):
-    send_whatsapp_message(remetente_jid, text)
-
-def get_opcao_texto(letra: str, exercicio_data: dict) -> str:
-    """Extrai o texto completo da opção A, B, C ou D do JSON de exercício."""
-    letra_map = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
-    opcoes = exercicio_data.get('opcoes', [])
-    index = letra_map.get(letra.upper())
-    
-    if index is not None and len(opcoes) > index:
-        return opcoes[index]
-    return "Texto da Opção não encontrado"
-
-def enviar_reforco_ia(remetente_jid: str, user_level: str, pergunta: str, resposta_errada_texto: str, resposta_certa_texto: str):
-    
-    prompt_reforco = (
-        f"O aluno de nível {user_level} errou a pergunta: '{pergunta}'. "
-        f"A resposta que ele deu foi: '{resposta_errada_texto}'. A resposta correta era: '{resposta_certa_texto}'. "
-        "Crie uma explicação concisa e didática sobre o erro cometido e dê uma dica de estudo."
-    )
-    
-    explicacao_ia = get_ai_response(prompt_reforco)
-    
-    enviar_resposta_de_texto(remetente_jid,
-        f"❌ **Incorreto!** A resposta correta era *{resposta_certa_texto}*.\n\n"
-        f"📢 **Reforço:** {explicacao_ia}\n"
-        "Voltando ao menu principal."
-    )
-    enviar_menu_botoes(remetente_jid, TEXTO_MENU_PRINCIPAL, OPCOES_MENU_PRINCIPAL)
+# Ligado de saída com DEBUG_MODE; em produção, pelas rotas /admin/profiler.
+profiler_webhook = ProfilerWebhook(ativo=DEBUG_MODE)
+fila_webhook = FilaWebhook(profiler_webhook.envolver(processar_eventos))
+deduplicador = DeduplicadorMensagens()
+gravador_webhook = GravadorWebhook()
+
+metricas.instrumentar_banco(engine, SessionLocal)
+metricas.Medidor("fila_webhook_pendentes", "Eventos do webhook aguardando processamento.", lambda: fila_webhook.pendentes)
+metricas.Medidor("fila_envios_pendentes", "Mensagens aguardando envio para a uazapi.", lambda: despachante_envios.pendentes)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    cache_respostas.podar_expirados()
+    deduplicador.podar_expirados()
+    await gravador_webhook.iniciar()
+    await catalogo_licoes.iniciar()
+    await despachante_envios.iniciar()
+    await fila_webhook.iniciar()
+    await reabastecedor_pool.iniciar()
+    await monitor_status.iniciar()
+    yield
+    # Desligamento gracioso: para de aceitar eventos e processa o que já está na fila.
+    await fila_webhook.drenar()
+    # Depois da fila do webhook: as respostas que ela enfileirou ainda saem.
+    await despachante_envios.drenar()
+    await reabastecedor_pool.parar()
+    await prefetch_exercicios.parar()
+    await memoria_conversas.parar()
+    await catalogo_licoes.parar()
+    await monitor_status.parar()
+    await gravador_webhook.parar()
+    await uazapi_client.fechar()
+
+app = FastAPI(title="English Bot Server", debug=DEBUG_MODE, lifespan=lifespan)
 
 
 # ===============================================
 # ROTAS DO FASTAPI
 # ===============================================
 
+def verificar_admin(request: Request):
+    """Rotas /admin exigem o header X-Admin-Token igual ao ADMIN_TOKEN do .env (sem ele, ficam desligadas)."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Rotas administrativas desabilitadas (ADMIN_TOKEN ausente).")
+    if not secrets.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Token administrativo inválido.")
+
+
 @app.get("/")
 def read_root():
     return {"message": "English Bot Server está ativo!"}
 
 
+@app.get("/estatisticas")
+def read_estatisticas():
+    return {
+        "fila": fila_webhook.estatisticas(),
+        "envios": despachante_envios.estatisticas(),
+        "uazapi": uazapi_client.estatisticas_latencia(),
+        "deduplicacao": deduplicador.estatisticas(),
+        "cache_ia": cache_respostas.estatisticas(),
+        "pool_exercicios": {"gerados": reabastecedor_pool.gerados, "falhas": reabastecedor_pool.falhas},
+        "prefetch_exercicios": prefetch_exercicios.estatisticas(),
+        "catalogo_licoes": {"licoes": len(catalogo_licoes.atual), "versao": catalogo_licoes.atual.versao},
+        "status_instancia": monitor_status.estatisticas(),
+        "gravacao_webhook": gravador_webhook.estatisticas(),
+        "correcao": corretor.estatisticas(),
+        "memoria_conversa": memoria_conversas.estatisticas(),
+        "profiler": profiler_webhook.estatisticas(),
+    }
+
+
+@app.get("/metrics")
+def read_metrics():
+    """Métricas no formato de texto do Prometheus (histogramas de latência e contadores de erro)."""
+    return PlainTextResponse(metricas.renderizar(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/admin/licoes/recarregar")
+def recarregar_licoes(request: Request):
+    verificar_admin(request)
+    catalogo = catalogo_licoes.recarregar()
+    return {"status": "ok", "licoes": len(catalogo), "versao": catalogo.versao}
+
+
+@app.get("/admin/profiler")
+def listar_perfis(request: Request):
+    verificar_admin(request)
+    return {**profiler_webhook.estatisticas(), "perfis": profiler_webhook.listar()}
+
+
+@app.post("/admin/profiler/ligar")
+def ligar_profiler(request: Request, a_cada: int = None, limiar_ms: float = None):
+    verificar_admin(request)
+    profiler_webhook.ligar(a_cada, limiar_ms)
+    return profiler_webhook.estatisticas()
+
+
+@app.post("/admin/profiler/desligar")
+def desligar_profiler(request: Request):
+    verificar_admin(request)
+    profiler_webhook.desligar()
+    return profiler_webhook.estatisticas()
+
+
+@app.get("/admin/profiler/{id}")
+def relatorio_perfil(request: Request, id: int):
+    verificar_admin(request)
+    relatorio = profiler_webhook.relatorio(id)
+    if relatorio is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado.")
+    return PlainTextResponse(relatorio)
+
+
+@app.get("/admin/profiler/{id}/pstats")
+def baixar_pstats(request: Request, id: int):
+    verificar_admin(request)
+    perfil = profiler_webhook.obter(id)
+    if perfil is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado.")
+    return Response(perfil.stats, media_type="application/octet-stream",
+                    headers={"Content-Disposition": f'attachment; filename="webhook-{id}.prof"'})
+
+
+@app.get("/admin/profiler/{id}/collapsed")
+def baixar_collapsed(request: Request, id: int):
+    verificar_admin(request)
+    perfil = profiler_webhook.obter(id)
+    if perfil is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado.")
+    return PlainTextResponse(perfil.collapsed, headers={"Content-Disposition": f'attachment; filename="webhook-{id}.collapsed"'})
+
+
 @app.post('/webhook')
-async def handle_webhook(request: Request, db: Annotated[Session, Depends(get_db)]):
+async def handle_webhook(request: Request):
+    with metricas.WEBHOOK_REQUISICAO.medir():
+        return await receber_webhook(request)
+
+
+async def receber_webhook(request: Request):
+    corpo = await request.body()
+    # Gravação opcional do tráfego real (WEBHOOK_GRAVACAO_ARQUIVO), para reproduzir depois.
+    gravador_webhook.gravar(corpo)
     try:
-        data = await request.json()
-        evento_dados = data[0] if isinstance(data, list) and len(data) > 0 else data
-
-        evento_tipo = evento_dados.get('EventType')
-        mensagem = evento_dados.get('message', {})
-        
-        if evento_tipo == 'messages' and mensagem.get('fromMe') == False:
-            
-            remetente_jid = mensagem.get('sender') 
-            texto_recebido_payload = mensagem.get('text', '') or mensagem.get('content', '') or ''
-            
-            # EXTRAÇÃO DE CLIQUE LIMPA (selectedID)
-            if isinstance(texto_recebido_payload, dict):
-                texto_recebido = texto_recebido_payload.get('selectedID', '')
-                
-                # REMOÇÃO DA LÓGICA INCORRETA: o botão interativo retorna o ID de controle limpo.
-                # A lógica de limpeza de prefixo aqui era o erro.
-                # if ':' in texto_recebido:
-                #    texto_recebido = texto_recebido.split(':', 1)[1].strip()
-
-            else:
-                texto_recebido = str(texto_recebido_payload).lower().strip()
-
-            # O valor clicado (se for de botão) está agora em texto_recebido.
-            # Se for clique de opção, o valor é o texto da opção em maiúsculas (ex: "AM")
-            resposta_usuario = texto_recebido.upper() 
-            
-            # --- Gerenciamento de Usuário e Estado ---
-            usuario = db.query(Usuario).filter(Usuario.wa_jid == remetente_jid).first()
-            is_novo_usuario = False
-            if not usuario:
-                usuario = Usuario(wa_jid=remetente_jid, nome=mensagem.get('senderName', 'Usuário Novo'), nivel_ingles='Não definido', estado=ESTADO_ESCOLHA_NIVEL)
-                db.add(usuario)
-                is_novo_usuario = True
-            
-            elif usuario.nivel_ingles is None or usuario.nivel_ingles == 'Não definido':
-                 if usuario.estado == ESTADO_MENU:
-                     usuario.estado = ESTADO_ESCOLHA_NIVEL
-
-            usuario.ultima_interacao = datetime.now()
-            
-            print(f"\n[USER: {usuario.wa_jid}] Estado: {usuario.estado}, Lição: {usuario.pergunta_atual_id}, Recebeu: '{texto_recebido}'")
-
-            # ==========================================================
-            # LÓGICA DO FLUXO (State Machine)
-            # ==========================================================
-
-            # A) AÇÃO DE RESET (oi, olá, menu)
-            if texto_recebido in ["oi", "olá", "ola", "menu"]:
-                if usuario.nivel_ingles is None or usuario.nivel_ingles == 'Não definido':
-                    usuario.estado = ESTADO_ESCOLHA_NIVEL
-                    enviar_menu_botoes(remetente_jid, TEXTO_ESCOLHA_NIVEL, OPCOES_ESCOLHA_NIVEL)
-                else:
-                    usuario.estado = ESTADO_MENU
-                    enviar_menu_botoes(remetente_jid, TEXTO_MENU_PRINCIPAL, OPCOES_MENU_PRINCIPAL)
-            
-            
-            # B) ESTADO: ESTUDANDO LIÇÃO (Lógica do Quiz de Inglês) - Usada para o quiz estático (Licao)
-            elif usuario.estado == ESTADO_ESTUDANDO_LICAO:
-                
-                licao = db.query(Licao).filter(Licao.id == usuario.pergunta_atual_id).first()
-                
-                if licao and resposta_usuario in ["A", "B", "C", "D"]:
-                    letra_correta = licao.resposta_correta.upper()
-                    
-                    if resposta_usuario == letra_correta:
-                        usuario.pontuacao += 1
-                        proxima_licao = db.query(Licao).filter(Licao.id == usuario.pergunta_atual_id + 1).first()
-                        
-                        if proxima_licao:
-                            usuario.pergunta_atual_id += 1
-                            enviar_licao(db, remetente_jid, proxima_licao, "✅ **Correto!** Excelente. Próxima Lição:")
-                        else:
-                            usuario.estado = ESTADO_MENU
-                            usuario.pergunta_atual_id = 0
-                            enviar_resposta_de_texto(remetente_jid,
-                                "🎉 **Parabéns! Você completou a lição introdutória!**\n"
-                                f"Total de acertos: {usuario.pontuacao}.\n\n"
-                                f"Voltando ao menu principal."
-                            )
-                            enviar_menu_botoes(remetente_jid, TEXTO_MENU_PRINCIPAL, OPCOES_MENU_PRINCIPAL)
-                        
-                    else:
-                        usuario.estado = ESTADO_MENU
-                        usuario.pergunta_atual_id = 0
-                        usuario.pontuacao = 0
-                        
-                        enviar_resposta_de_texto(remetente_jid,
-                            f"❌ **Incorreto.** A resposta correta para '{licao.texto_pergunta}' era {letra_correta}.\n"
-                            "Estude mais e tente novamente!\n\n"
-                            f"Voltando ao menu principal."
-                        )
-                        enviar_menu_botoes(remetente_jid, TEXTO_MENU_PRINCIPAL, OPCOES_MENU_PRINCIPAL)
-                        
-                else:
-                    enviar_resposta_de_texto(remetente_jid, "Comando inválido. Por favor, clique em um dos botões (A, B, C ou D).")
-
-
-            # C) ESTADO: AGUARDANDO RESPOSTA DINÂMICA (NOVO LOOP DE CORREÇÃO)
-            elif usuario.estado == ESTADO_AGUARDANDO_RESPOSTA_DINAMICA:
-                
-                # 1. Checagem: O usuário respondeu à questão de Múltipla Escolha?
-                # resposta_usuario AGORA contém o TEXTO da opção clicada (ex: "IS", "AM")
-                if usuario.exercicio_tipo == "choice" and resposta_usuario: 
-                    
-                    # 1. Obtemos o gabarito de TEXTO salvo
-                    gabarito_texto = usuario.exercicio_correto_texto.upper() # Gabarito: "IS"
-                    resposta_aluno_texto_limpa = resposta_usuario.upper() # Resposta do clique: "AM"
-                    
-                    # 2. **COMPARAÇÃO CORRIGIDA:** Compara o TEXTO do clique com o TEXTO CORRETO salvo.
-                    if resposta_aluno_texto_limpa == gabarito_texto: 
-                        # ACERTOU
-                        usuario.total_acertos += 1
-                        usuario.total_exercicios_feitos += 1
-                        
-                        enviar_resposta_de_texto(remetente_jid, "✅ **Correto!** Gerando próximo exercício dinâmico...")
-                        
-                        # Simula o clique na Opção 2 para gerar o novo exercício (continua no próximo bloco)
-                        usuario.estado = ESTADO_MENU 
-                        resposta_usuario = "2" 
-                        
-                    else:
-                        # ERROU: Explica o erro e volta ao menu
-                        usuario.total_exercicios_feitos += 1
-                        
-                        # NOVO FLUXO: Lógica de reforço da IA
-                        dados_exercicio_original = json.loads(usuario.exercicio_dados_json)
-                        pergunta_original = dados_exercicio_original.get("pergunta")
-                        
-                        enviar_reforco_ia(remetente_jid,
-                            usuario.nivel_ingles,
-                            pergunta_original,
-                            resposta_aluno_texto_limpa,
-                            gabarito_texto
-                        )
-                        usuario.estado = ESTADO_MENU
-
-
-                # 2. Checagem: O usuário respondeu à questão ABERTA?
-                elif usuario.exercicio_tipo == "open":
-                    
-                    # IMPLEMENTAÇÃO FUTURA: AQUI IRÁ A LÓGICA DE CORREÇÃO DA RESPOSTA ABERTA PELA IA
-                    enviar_resposta_de_texto(remetente_jid, "Corrigindo sua resposta aberta com a IA... (Em breve)")
-                    usuario.estado = ESTADO_MENU
-                    enviar_menu_botoes(remetente_jid, TEXTO_MENU_PRINCIPAL, OPCOES_MENU_PRINCIPAL)
-                    
-                else:
-                    enviar_resposta_de_texto(remetente_jid, "Comando inválido. Por favor, clique em um dos botões (A, B, C ou D).")
-
-            
-            # D) ESTADO: ESCOLHA DE NÍVEL (Trata A/B)
-            elif usuario.estado == ESTADO_ESCOLHA_NIVEL:
-                
-                if resposta_usuario == "A":
-                    usuario.estado = ESTADO_AGUARDANDO_NIVEL_DIGITADO 
-                    enviar_menu_botoes(remetente_jid, TEXTO_NIVEL_DIGITADO, OPCOES_NIVEL_DIGITADO)
-
-                elif resposta_usuario == "B":
-                    usuario.estado = ESTADO_AVALIACAO_INICIAL 
-                    enviar_resposta_de_texto(remetente_jid, "A avaliação de nível por IA (Opção B) está em desenvolvimento. Por favor, tente a Opção A ou volte ao menu.")
-                    usuario.estado = ESTADO_MENU
-                    enviar_menu_botoes(remetente_jid, TEXTO_MENU_PRINCIPAL, OPCOES_MENU_PRINCIPAL)
-                
-                elif is_novo_usuario or (usuario.nivel_ingles is None or usuario.nivel_ingles == 'Não definido'):
-                    enviar_menu_botoes(remetente_jid, TEXTO_ESCOLHA_NIVEL, OPCOES_ESCOLHA_NIVEL)
-                
-                else:
-                    enviar_menu_botoes(remetente_jid, "Opção inválida. Por favor, escolha A ou B para continuar.", OPCOES_ESCOLHA_NIVEL)
-
-
-            # E) ESTADO: AGUARDANDO NÍVEL DIGITADO
-            elif usuario.estado == ESTADO_AGUARDANDO_NIVEL_DIGITADO:
-                
-                nivel_selecionado = resposta_usuario 
-                
-                if nivel_selecionado in OPCOES_NIVEL_DIGITADO.values():
-                    usuario.nivel_ingles = nivel_selecionado
-                    usuario.estado = ESTADO_MENU
-                    
-                    prompt_plano = (
-                        f"Crie um plano de estudo de inglês de 3 passos focado em um aluno de nível {nivel_selecionado}. "
-                        "O plano deve ser conciso e motivador, focado em vocabulário e gramática. Use emojis."
-                    )
-                    
-                    plano_estudo = get_ai_response(prompt_plano)
-                    
-                    enviar_resposta_de_texto(remetente_jid,
-                        f"✨ Nível salvo como: *{nivel_selecionado}*.\n\n"
-                        "🧠 **Seu Plano de Estudos Personalizado:**\n"
-                        f"{plano_estudo}\n\n"
-                        "Voltando ao menu principal."
-                    )
-                    enviar_menu_botoes(remetente_jid, TEXTO_MENU_PRINCIPAL, OPCOES_MENU_PRINCIPAL)
-
-                else:
-                    enviar_resposta_de_texto(remetente_jid, f"Nível inválido: {resposta_usuario}. Por favor, escolha uma opção dos botões.")
-                    enviar_menu_botoes(remetente_jid, TEXTO_NIVEL_DIGITADO, OPCOES_NIVEL_DIGITADO) 
-                
-
-            # F) ESTADO: OPÇÕES DO MENU (Ações de 1 a 5, IA, etc.)
-            elif usuario.estado in ["inicio", ESTADO_MENU, "finalizado", "conversando_ia", ESTADO_AVALIACAO_INICIAL]:
-                
-                if resposta_usuario in OPCOES_MENU_PRINCIPAL.values():
-                    
-                    if resposta_usuario == "1":
-                        usuario.estado = ESTADO_ESCOLHA_NIVEL
-                        enviar_menu_botoes(remetente_jid, TEXTO_ESCOLHA_NIVEL, OPCOES_ESCOLHA_NIVEL)
-
-                    elif resposta_usuario == "2":
-                        if usuario.nivel_ingles is None or usuario.nivel_ingles == 'Não definido':
-                            enviar_resposta_de_texto(remetente_jid, "🚨 Por favor, defina seu nível na Opção 1 antes de iniciar as lições.")
-                            enviar_menu_botoes(remetente_jid, TEXTO_ESCOLHA_NIVEL, OPCOES_ESCOLHA_NIVEL)
-                            usuario.estado = ESTADO_ESCOLHA_NIVEL
-                            return
-                            
-                        # --- GERAÇÃO DO EXERCÍCIO DINÂMICO (CORRIGIDO) ---
-                        usuario.estado = ESTADO_AGUARDANDO_RESPOSTA_DINAMICA
-                        user_level = usuario.nivel_ingles
-                        
-                        json_exercicio_str = get_dynamic_exercise(user_level)
-                        
-                        try:
-                            exercicio = json.loads(json_exercicio_str)
-                            
-                            usuario.exercicio_tipo = exercicio.get("tipo")
-                            
-                            # O gabarito é o TEXTO CORRETO (ex: "IS") gerado pela IA.
-                            usuario.exercicio_correto_texto = exercicio.get("correta").upper() 
-                            usuario.exercicio_dados_json = json_exercicio_str
-                            
-                            if exercicio.get("tipo") == "choice":
-                                
-                                # CRÍTICO: O ID DE CONTROLE AGORA É O TEXTO DA OPÇÃO (em maiúsculas)
-                                # Ex: O botão de "Am" retorna "AM", o de "Is" retorna "IS".
-                                opcoes_choice = {
-                                    f"A: {exercicio['opcoes'][0]}": exercicio['opcoes'][0].upper(),
-                                    f"B: {exercicio['opcoes'][1]}": exercicio['opcoes'][1].upper(),
-                                    f"C: {exercicio['opcoes'][2]}": exercicio['opcoes'][2].upper(),
-                                    f"D: {exercicio['opcoes'][3]}": exercicio['opcoes'][3].upper(),
-                                }
-                                enviar_menu_botoes(remetente_jid, f"📝 **EXERCÍCIO DINÂMICO**\n\n{exercicio['pergunta']}", opcoes_choice)
-                                
-                            elif exercicio.get("tipo") == "open":
-                                enviar_resposta_de_texto(remetente_jid, f"📝 **EXERCÍCIO ABERTO**\n\n{exercicio['pergunta']}\n\n*Por favor, digite sua resposta completa.*")
-                                
-                            else:
-                                enviar_resposta_de_texto(remetente_jid, "⚠️ A IA gerou um exercício em um formato inválido. Tente novamente.")
-
-                        except json.JSONDecodeError:
-                            enviar_resposta_de_texto(remetente_jid, f"⚠️ Erro: A IA não retornou o exercício em um formato válido. Resposta da IA: {json_exercicio_str}")
-                        
-                    elif resposta_usuario == "3":
-                        usuario.estado = "conversando_ia"
-                        enviar_resposta_de_texto(remetente_jid, "🎉 **Conversação com IA ativada!**\n\nPergunte-me qualquer coisa sobre inglês.")
-
-                    elif resposta_usuario == "4":
-                        usuario.estado = ESTADO_MENU
-                        status = get_instance_status()
-                        enviar_resposta_de_texto(remetente_jid, f"📢 STATUS DA INSTÂNCIA:\n\nSua instância está atualmente: *{status}*.")
-                        enviar_menu_botoes(remetente_jid, TEXTO_MENU_PRINCIPAL, OPCOES_MENU_PRINCIPAL)
-
-                    elif resposta_usuario == "5":
-                        usuario.estado = "finalizado"
-                        enviar_resposta_de_texto(remetente_jid, "Certo. Saindo do sistema. Para reiniciar, envie 'oi' ou 'menu'.")
-                        
-                else:
-                    if usuario.estado == "conversando_ia":
-                        print(f"🤖 ENVIANDO PERGUNTA PARA IA: '{texto_recebido}'")
-                        resposta = get_ai_response(texto_recebido)
-                        enviar_resposta_de_texto(remetente_jid, resposta)
-                    else:
-                        enviar_menu_botoes(remetente_jid, f"Não entendi '{texto_recebido}'. Por favor, escolha uma opção:", OPCOES_MENU_PRINCIPAL)
-
-
-            # --- FIM DA LÓGICA DE FLUXO ---
-
-            db.commit()
-            
-            # Repetição para gerar novo exercício após o acerto
-            if usuario.estado == ESTADO_MENU and resposta_usuario == "2":
-                await handle_webhook(request, db) # Chama a função novamente para processar o clique simulado
-                
-        return {"status": "ok"}
-    
-    except Exception as e:
-        logging.error(f"🚨 Erro no processamento do webhook: {e}")
-        return {"status": "error", "message": "Erro interno do bot"}
+        data = json.loads(corpo)
+    except ValueError:
+        metricas.ERROS.incrementar("webhook_json")
+        return JSONResponse(status_code=400, content={"status": "error", "message": "JSON inválido"})
+
+    # A uazapi pode entregar um único evento ou uma lista deles; todos são processados.
+    eventos = data if isinstance(data, list) else [data]
+
+    aceitos = []
+    ids_do_lote = []
+    for evento_dados in eventos:
+        if isinstance(evento_dados, dict) and evento_dados.get('EventType') == 'connection':
+            # A conexão da instância mudou: o monitor consulta o status agora, sem esperar o intervalo.
+            monitor_status.notificar()
+        if not evento_e_mensagem_recebida(evento_dados):
+            continue
+
+        # Reenvio da uazapi (nossa resposta demorou) ou repetição dentro do próprio lote: não processa de novo.
+        message_id = id_da_mensagem(evento_dados)
+        if message_id:
+            if message_id in ids_do_lote or deduplicador.ja_recebida(message_id):
+                continue
+            ids_do_lote.append(message_id)
+        aceitos.append(evento_dados)
+
+    if not aceitos:
+        return {"status": "ignored"}
+
+    if not fila_webhook.enfileirar_lote(aceitos):
+        logging.warning(f"⚠️ Fila de webhook cheia ({fila_webhook.profundidade}). Respondendo 429.")
+        metricas.ERROS.incrementar("webhook_fila_cheia")
+        return JSONResponse(
+            status_code=429,
+            content={"status": "busy", "message": "Fila de processamento cheia"},
+            headers={"Retry-After": "1"},
+        )
+
+    for message_id in ids_do_lote:
+        deduplicador.marcar_recebida(message_id)
+    return {"status": "ok", "eventos": len(aceitos)}
+
 
 if __name__ == '__main__':
     import uvicorn
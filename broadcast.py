@@ -0,0 +1,187 @@
+"""
+Transmissão (broadcast) de uma mensagem para os usuários da tabela `usuarios`.
+
+Os usuários são lidos em lotes com paginação por chave (`wa_jid > último` ordenado por `wa_jid`),
+filtrados por nível, estado e `ultima_interacao`, e cada lote é enviado em paralelo (até
+--concorrencia envios simultâneos) sob um limite global de --taxa mensagens por segundo.
+Ao fim de cada lote o progresso vai para `transmissoes`; se o processo cair, rodar de novo
+com o mesmo nome continua do último lote gravado (com a mesma mensagem e os mesmos filtros).
+Um lote interrompido no meio pode ser reenviado em parte.
+
+Uso:
+    python broadcast.py exercicio-2026-10-18 --mensagem "📝 Exercício do dia: ..." [--nivel INICIANTE]
+        [--estado menu_principal] [--ativos-nos-ultimos-dias 30] [--inativos-ha-dias 2]
+        [--taxa 20] [--concorrencia 8] [--lote 200] [--simular]
+
+Para testar sem a uazapi, suba o stub local (benchmarks/fake_uazapi.py) e aponte BASE_URL para ele.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+import uazapi_client
+from database import SessionLocal, Transmissao, Usuario, init_db
+from outbound_dispatcher import BaldeTokens
+from send_message import send_whatsapp_message_async
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+def consulta_destinatarios(filtros: dict, depois_de: str, tamanho_lote: int):
+    """Próximo lote de wa_jid que atende aos filtros, em ordem, a partir de `depois_de` (exclusivo)."""
+    consulta = select(Usuario.wa_jid).where(Usuario.wa_jid > depois_de)
+    if filtros.get("niveis"):
+        consulta = consulta.where(Usuario.nivel_ingles.in_(filtros["niveis"]))
+    if filtros.get("estados"):
+        consulta = consulta.where(Usuario.estado.in_(filtros["estados"]))
+    if filtros.get("ativos_desde"):
+        consulta = consulta.where(Usuario.ultima_interacao >= datetime.fromisoformat(filtros["ativos_desde"]))
+    if filtros.get("inativos_desde"):
+        consulta = consulta.where(Usuario.ultima_interacao < datetime.fromisoformat(filtros["inativos_desde"]))
+    return consulta.order_by(Usuario.wa_jid).limit(tamanho_lote)
+
+
+def ler_lotes(filtros: dict, depois_de: str, tamanho_lote: int):
+    """Gera lotes de wa_jid; cada lote usa uma sessão curta para não segurar o banco durante os envios."""
+    while True:
+        db = SessionLocal()
+        try:
+            lote = db.scalars(consulta_destinatarios(filtros, depois_de, tamanho_lote)).all()
+        finally:
+            db.close()
+        if not lote:
+            return
+        yield lote
+        depois_de = lote[-1]
+
+
+def _gravar_progresso(nome: str, ultimo_wa_jid: str, enviados: int, falhas: int, concluida: bool = False):
+    db = SessionLocal()
+    try:
+        transmissao = db.get(Transmissao, nome)
+        transmissao.ultimo_wa_jid = ultimo_wa_jid
+        transmissao.enviados += enviados
+        transmissao.falhas += falhas
+        transmissao.concluida = int(concluida)
+        transmissao.atualizado_em = datetime.now()
+        db.commit()
+    finally:
+        db.close()
+
+
+def preparar_transmissao(nome: str, mensagem: str, filtros: dict, do_inicio: bool = False) -> Transmissao:
+    """Cria a transmissão ou retoma a existente (mantendo a mensagem e os filtros gravados)."""
+    db = SessionLocal()
+    try:
+        transmissao = db.get(Transmissao, nome)
+        if transmissao is None or do_inicio:
+            if not mensagem:
+                raise ValueError("--mensagem é obrigatória para uma transmissão nova.")
+            transmissao = db.merge(Transmissao(
+                nome=nome, mensagem=mensagem, filtros_json=json.dumps(filtros, ensure_ascii=False),
+                ultimo_wa_jid="", enviados=0, falhas=0, concluida=0,
+            ))
+            db.commit()
+            db.refresh(transmissao)
+        elif not transmissao.concluida and transmissao.ultimo_wa_jid:
+            log.info("🔁 Retomando a transmissão '%s' depois de %s (mensagem e filtros gravados).", nome, transmissao.ultimo_wa_jid)
+        db.expunge(transmissao)
+        return transmissao
+    finally:
+        db.close()
+
+
+async def transmitir(nome: str, mensagem: str = None, filtros: dict = None, taxa: float = 20, concorrencia: int = 8,
+                     tamanho_lote: int = 200, do_inicio: bool = False, simular: bool = False) -> dict:
+    """Executa (ou retoma) a transmissão `nome`. Retorna um resumo com contadores e vazão."""
+    transmissao = preparar_transmissao(nome, mensagem, filtros or {}, do_inicio)
+    resumo = {"nome": nome, "enviados": 0, "falhas": 0}
+    if transmissao.concluida:
+        log.info("📝 A transmissão '%s' já foi concluída (%s enviados). Use --do-inicio para repetir.", nome, transmissao.enviados)
+        return resumo
+
+    filtros = json.loads(transmissao.filtros_json)
+    balde = BaldeTokens(taxa, max(1, int(taxa)))
+    limite = asyncio.Semaphore(concorrencia)
+
+    async def enviar(wa_jid: str) -> bool:
+        async with limite:
+            await balde.adquirir()
+            if simular:
+                return True
+            return await send_whatsapp_message_async(wa_jid, transmissao.mensagem) is not None
+
+    inicio = time.perf_counter()
+    ultimo = transmissao.ultimo_wa_jid or ""
+    try:
+        for lote in ler_lotes(filtros, ultimo, tamanho_lote):
+            resultados = await asyncio.gather(*(enviar(wa_jid) for wa_jid in lote))
+            enviados = sum(resultados)
+            falhas = len(resultados) - enviados
+            ultimo = lote[-1]
+            _gravar_progresso(nome, ultimo, enviados, falhas)
+
+            resumo["enviados"] += enviados
+            resumo["falhas"] += falhas
+            decorrido = time.perf_counter() - inicio
+            log.info("⏳ '%s': %s enviados, %s falhas (%.1f msg/s).", nome, resumo["enviados"], resumo["falhas"],
+                     (resumo["enviados"] + resumo["falhas"]) / decorrido if decorrido else 0)
+
+        _gravar_progresso(nome, ultimo, 0, 0, concluida=True)
+    finally:
+        await uazapi_client.fechar()
+
+    decorrido = time.perf_counter() - inicio
+    resumo["segundos"] = round(decorrido, 2)
+    resumo["mensagens_por_segundo"] = round((resumo["enviados"] + resumo["falhas"]) / decorrido, 1) if decorrido else 0
+    log.info("✅ Transmissão '%s' concluída: %s enviados, %s falhas em %.1fs (%s msg/s).",
+             nome, resumo["enviados"], resumo["falhas"], decorrido, resumo["mensagens_por_segundo"])
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Envia uma mensagem para os usuários, com filtros, limite de taxa e retomada.")
+    parser.add_argument("nome", help="Nome da transmissão (o mesmo nome retoma uma transmissão interrompida).")
+    parser.add_argument("--mensagem", help="Texto a enviar (obrigatório ao criar a transmissão).")
+    parser.add_argument("--nivel", action="append", help="Filtra por nivel_ingles (pode repetir).")
+    parser.add_argument("--estado", action="append", help="Filtra por estado (pode repetir).")
+    parser.add_argument("--ativos-nos-ultimos-dias", type=float, help="Só quem interagiu nos últimos N dias.")
+    parser.add_argument("--inativos-ha-dias", type=float, help="Só quem não interage há pelo menos N dias.")
+    parser.add_argument("--taxa", type=float, default=20, help="Mensagens por segundo (padrão: 20).")
+    parser.add_argument("--concorrencia", type=int, default=8, help="Envios simultâneos (padrão: 8).")
+    parser.add_argument("--lote", type=int, default=200, help="Usuários por lote/checkpoint (padrão: 200).")
+    parser.add_argument("--do-inicio", action="store_true", help="Recomeça a transmissão do zero.")
+    parser.add_argument("--simular", action="store_true", help="Percorre os usuários sem enviar nada.")
+    args = parser.parse_args()
+
+    agora = datetime.now()
+    filtros = {
+        "niveis": args.nivel,
+        "estados": args.estado,
+        "ativos_desde": (agora - timedelta(days=args.ativos_nos_ultimos_dias)).isoformat() if args.ativos_nos_ultimos_dias else None,
+        "inativos_desde": (agora - timedelta(days=args.inativos_ha_dias)).isoformat() if args.inativos_ha_dias else None,
+    }
+
+    init_db()
+    try:
+        asyncio.run(transmitir(
+            args.nome, args.mensagem, filtros, taxa=args.taxa, concorrencia=args.concorrencia,
+            tamanho_lote=args.lote, do_inicio=args.do_inicio, simular=args.simular,
+        ))
+    except ValueError as e:
+        log.error(f"🚨 {e}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # Uma linha por mensagem não ajuda numa transmissão; o progresso sai por lote.
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("send_message").setLevel(logging.WARNING)
+    main()
@@ -0,0 +1,517 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+import metrics as metricas
+from ai_service import (
+    get_ai_response_async, responder_conversa_async, get_dynamic_exercise_async, corrigir_resposta_aberta_async,
+    ia_disponivel, MENSAGEM_IA_INDISPONIVEL,
+)
+from answer_grader import CorretorRespostas
+from conversation_memory import MemoriaConversas
+from database import Usuario
+from exercise_pool import ReabastecedorPool, PrefetchExercicios, retirar_exercicio, marcar_visto, carregar_exercicio
+from lesson_catalog import CatalogoLicoes, LicaoCatalogo
+from outbound_dispatcher import DespachanteEnvios
+from send_message import registrar_menu, MenuEstatico
+from state_machine import MaquinaEstados, QUALQUER
+from status_monitor import MonitorStatus
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# ===============================================
+# CONSTANTES DE FLUXO E MENUS
+# ===============================================
+
+ESTADO_INICIO = "inicio"
+ESTADO_MENU = "menu_principal"
+ESTADO_ESTUDANDO_LICAO = "estudando_licao"
+ESTADO_ESCOLHA_NIVEL = "escolha_nivel"
+ESTADO_AVALIACAO_INICIAL = "avaliacao_inicial"
+ESTADO_AGUARDANDO_NIVEL_DIGITADO = "aguardando_nivel_digitado"
+ESTADO_AGUARDANDO_RESPOSTA_DINAMICA = "aguardando_resposta_dinamica"
+ESTADO_CONVERSANDO_IA = "conversando_ia"
+ESTADO_FINALIZADO = "finalizado"
+
+# Estados em que as opções 1 a 5 do menu principal valem.
+ESTADOS_MENU = (ESTADO_INICIO, ESTADO_MENU, ESTADO_FINALIZADO, ESTADO_CONVERSANDO_IA, ESTADO_AVALIACAO_INICIAL)
+
+NIVEL_NAO_DEFINIDO = "Não definido"
+
+# Palavras que voltam ao menu em qualquer estado. A entrada "reset" é minúscula de propósito:
+# as demais entradas são o texto em maiúsculas, então não há colisão com um botão.
+PALAVRAS_RESET = frozenset({"oi", "olá", "ola", "menu"})
+ENTRADA_RESET = "reset"
+
+
+# CONSTANTES GLOBAIS DE MENU
+OPCOES_MENU_PRINCIPAL = {
+    "1. Meu Nível e Plano de Estudos": "1",
+    "2. Iniciar Lição (Dinâmica)": "2",
+    "3. Prática de Conversação com IA (PLN)": "3",
+    "4. Status da Conexão": "4",
+    "5. Sair / Desligar": "5",
+}
+TEXTO_MENU_PRINCIPAL = "Olá! Bem-vindo ao English Bot! Escolha uma opção:"
+
+OPCOES_ESCOLHA_NIVEL = {
+    "A. Digitar meu nível": "A",
+    "B. Fazer um pequeno Teste de Nível (Em Breve)": "B",
+}
+TEXTO_ESCOLHA_NIVEL = "Ótima escolha! Para criar seu plano, como você quer definir seu nível?"
+
+OPCOES_NIVEL_DIGITADO = {
+    "INICIANTE (POUCO CONHECIMENTO)": "INICIANTE",
+    "INTERMEDIARIO (MÉDIO CONHECIMENTO)": "INTERMEDIARIO",
+    "ALTO (ALTO TEMPO)" : "ALTO",
+    "AVANÇADO (TEM UM CONHECIMENTO EXEPCIONAL)" : "AVANÇADO",
+}
+TEXTO_NIVEL_DIGITADO = "Certo. Por favor, escolha seu nível atual para gerar seu plano."
+
+# Menus fixos: renderizados e serializados uma vez, na importação.
+MENU_PRINCIPAL = registrar_menu("menu_principal", TEXTO_MENU_PRINCIPAL, OPCOES_MENU_PRINCIPAL)
+MENU_ESCOLHA_NIVEL = registrar_menu("escolha_nivel", TEXTO_ESCOLHA_NIVEL, OPCOES_ESCOLHA_NIVEL)
+MENU_NIVEL_DIGITADO = registrar_menu("nivel_digitado", TEXTO_NIVEL_DIGITADO, OPCOES_NIVEL_DIGITADO)
+MENU_ESCOLHA_NIVEL_INVALIDA = registrar_menu(
+    "escolha_nivel_invalida", "Opção inválida. Por favor, escolha A ou B para continuar.", OPCOES_ESCOLHA_NIVEL
+)
+
+
+# ===============================================
+# COMPONENTES USADOS PELO FLUXO (iniciados e parados pelo servidor)
+# ===============================================
+
+reabastecedor_pool = ReabastecedorPool()
+prefetch_exercicios = PrefetchExercicios()
+catalogo_licoes = CatalogoLicoes()
+despachante_envios = DespachanteEnvios()
+monitor_status = MonitorStatus()
+corretor = CorretorRespostas()
+memoria_conversas = MemoriaConversas()
+
+
+# ===============================================
+# FUNÇÕES AUXILIARES
+# ===============================================
+
+# Os envios só entram na fila de saída (ordem garantida por destinatário); o despachante
+# é quem fala com a uazapi, respeitando o limite de taxa.
+
+def enviar_licao(remetente_jid: str, licao: LicaoCatalogo, texto_inicial: str):
+    # Texto e botões já vêm renderizados do catálogo em memória.
+    despachante_envios.enviar_menu(remetente_jid, f"{texto_inicial}\n\n{licao.texto_mensagem}", list(licao.opcoes))
+
+def enviar_menu(remetente_jid: str, menu: MenuEstatico):
+    despachante_envios.enviar_menu_estatico(remetente_jid, menu)
+
+def enviar_menu_botoes(remetente_jid: str, texto_principal: str, opcoes_dict: dict):
+
+    opcoes_list = [f"{texto_visivel}|{id_controle}" for texto_visivel, id_controle in opcoes_dict.items()]
+    despachante_envios.enviar_menu(remetente_jid, texto_principal, opcoes_list)
+
+def enviar_resposta_de_texto(remetente_jid: str, text: str):
+    despachante_envios.enviar_texto(remetente_jid, text)
+
+def get_opcao_texto(letra: str, exercicio_data: dict) -> str:
+    """Extrai o texto completo da opção A, B, C ou D do JSON de exercício."""
+    letra_map = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
+    opcoes = exercicio_data.get('opcoes', [])
+    index = letra_map.get(letra.upper())
+
+    if index is not None and len(opcoes) > index:
+        return opcoes[index]
+    return "Texto da Opção não encontrado"
+
+def nivel_definido(usuario: Usuario) -> bool:
+    return usuario.nivel_ingles is not None and usuario.nivel_ingles != NIVEL_NAO_DEFINIDO
+
+async def enviar_reforco_ia(remetente_jid: str, user_level: str, pergunta: str, resposta_errada_texto: str, resposta_certa_texto: str):
+
+    prompt_reforco = (
+        f"O aluno de nível {user_level} errou a pergunta: '{pergunta}'. "
+        f"A resposta que ele deu foi: '{resposta_errada_texto}'. A resposta correta era: '{resposta_certa_texto}'. "
+        "Crie uma explicação concisa e didática sobre o erro cometido e dê uma dica de estudo."
+    )
+
+    explicacao_ia = await get_ai_response_async(prompt_reforco)
+
+    enviar_resposta_de_texto(remetente_jid,
+        f"❌ **Incorreto!** A resposta correta era *{resposta_certa_texto}*.\n\n"
+        f"📢 **Reforço:** {explicacao_ia}\n"
+        "Voltando ao menu principal."
+    )
+    enviar_menu(remetente_jid, MENU_PRINCIPAL)
+
+
+async def enviar_exercicio_dinamico(usuario: Usuario, remetente_jid: str, texto_inicial: str = ""):
+    """
+    Transição para ESTADO_AGUARDANDO_RESPOSTA_DINAMICA: envia o próximo exercício e já agenda o seguinte.
+
+    Ordem de busca: slot pré-carregado do aluno, pool do nível e, por último, a IA ao vivo.
+    """
+    user_level = usuario.nivel_ingles
+
+    json_exercicio_str = await prefetch_exercicios.obter(user_level, remetente_jid)
+    if json_exercicio_str is None:
+        json_exercicio_str = await asyncio.to_thread(retirar_exercicio, user_level, remetente_jid)
+    if json_exercicio_str is None:
+        json_exercicio_str = await get_dynamic_exercise_async(user_level)
+        exercicio_gerado = carregar_exercicio(json_exercicio_str)
+        if exercicio_gerado:
+            await asyncio.to_thread(marcar_visto, remetente_jid, exercicio_gerado)
+    reabastecedor_pool.notificar()
+
+    exercicio = carregar_exercicio(json_exercicio_str)
+    if exercicio is None:
+        usuario.estado = ESTADO_MENU
+        enviar_resposta_de_texto(remetente_jid, "⚠️ A IA não conseguiu gerar um exercício válido agora. Tente novamente.")
+        enviar_menu(remetente_jid, MENU_PRINCIPAL)
+        return
+
+    usuario.estado = ESTADO_AGUARDANDO_RESPOSTA_DINAMICA
+    usuario.exercicio_tipo = exercicio.get("tipo")
+    # O gabarito é o TEXTO CORRETO (ex: "IS") gerado pela IA.
+    usuario.exercicio_correto_texto = exercicio.get("correta").upper()
+    usuario.exercicio_dados_json = json_exercicio_str
+
+    prefixo = f"{texto_inicial}\n\n" if texto_inicial else ""
+    if exercicio.get("tipo") == "choice":
+        # CRÍTICO: O ID DE CONTROLE É O TEXTO DA OPÇÃO (em maiúsculas)
+        # Ex: O botão de "Am" retorna "AM", o de "Is" retorna "IS".
+        opcoes_choice = {
+            f"{letra}: {opcao}": opcao.upper()
+            for letra, opcao in zip("ABCD", exercicio['opcoes'])
+        }
+        enviar_menu_botoes(remetente_jid, f"{prefixo}📝 **EXERCÍCIO DINÂMICO**\n\n{exercicio['pergunta']}", opcoes_choice)
+    else:
+        enviar_resposta_de_texto(remetente_jid, f"{prefixo}📝 **EXERCÍCIO ABERTO**\n\n{exercicio['pergunta']}\n\n*Por favor, digite sua resposta completa.*")
+
+    # Enquanto o aluno responde, o próximo exercício já vai sendo separado.
+    prefetch_exercicios.agendar(user_level, remetente_jid)
+
+
+# ===============================================
+# MÁQUINA DE ESTADOS (State Machine)
+# ===============================================
+
+@dataclass
+class Contexto:
+    """O que os handlers recebem: o usuário (na sessão do lote) e a mensagem já normalizada."""
+    usuario: Usuario
+    remetente_jid: str
+    # Texto digitado (minúsculo) ou ID do botão clicado, como chegou.
+    texto: str
+    # O mesmo em maiúsculas: é a entrada da tabela de transições.
+    resposta: str
+    # Calculado uma vez por mensagem, antes do handler.
+    nivel_definido: bool
+
+
+maquina = MaquinaEstados()
+
+
+@maquina.antes
+def _registrar_recebimento(ctx: Contexto, estado: str, entrada: str, handler):
+    log.debug("[USER: %s] Estado: %s, Lição: %s, Recebeu: %r", ctx.remetente_jid, estado, ctx.usuario.pergunta_atual_id, ctx.texto)
+
+
+@maquina.depois
+def _medir_transicao(ctx: Contexto, estado: str, entrada: str, handler, duracao: float):
+    metricas.TRANSICOES.incrementar(estado, ctx.usuario.estado)
+    metricas.HANDLER.observar(duracao, handler.__name__)
+
+
+# A) AÇÃO DE RESET (oi, olá, menu), em qualquer estado
+
+@maquina.ao_receber(QUALQUER, ENTRADA_RESET)
+async def reiniciar(ctx: Contexto):
+    if ctx.nivel_definido:
+        ctx.usuario.estado = ESTADO_MENU
+        enviar_menu(ctx.remetente_jid, MENU_PRINCIPAL)
+    else:
+        ctx.usuario.estado = ESTADO_ESCOLHA_NIVEL
+        enviar_menu(ctx.remetente_jid, MENU_ESCOLHA_NIVEL)
+
+
+# B) ESTADO: ESTUDANDO LIÇÃO (quiz estático do catálogo)
+
+@maquina.ao_receber(ESTADO_ESTUDANDO_LICAO, "A", "B", "C", "D")
+async def responder_licao(ctx: Contexto):
+    usuario = ctx.usuario
+    catalogo = catalogo_licoes.atual
+    licao = catalogo.obter(usuario.pergunta_atual_id)
+    if licao is None:
+        await licao_comando_invalido(ctx)
+        return
+
+    letra_correta = licao.resposta_correta
+    if ctx.resposta == letra_correta:
+        usuario.pontuacao += 1
+        proxima_licao = catalogo.proxima(licao)
+
+        if proxima_licao:
+            usuario.pergunta_atual_id = proxima_licao.id
+            enviar_licao(ctx.remetente_jid, proxima_licao, "✅ **Correto!** Excelente. Próxima Lição:")
+        else:
+            usuario.estado = ESTADO_MENU
+            usuario.pergunta_atual_id = 0
+            enviar_resposta_de_texto(ctx.remetente_jid,
+                "🎉 **Parabéns! Você completou a lição introdutória!**\n"
+                f"Total de acertos: {usuario.pontuacao}.\n\n"
+                f"Voltando ao menu principal."
+            )
+            enviar_menu(ctx.remetente_jid, MENU_PRINCIPAL)
+
+    else:
+        usuario.estado = ESTADO_MENU
+        usuario.pergunta_atual_id = 0
+        usuario.pontuacao = 0
+
+        enviar_resposta_de_texto(ctx.remetente_jid,
+            f"❌ **Incorreto.** A resposta correta para '{licao.texto_pergunta}' era {letra_correta}.\n"
+            "Estude mais e tente novamente!\n\n"
+            f"Voltando ao menu principal."
+        )
+        enviar_menu(ctx.remetente_jid, MENU_PRINCIPAL)
+
+
+@maquina.ao_receber(ESTADO_ESTUDANDO_LICAO)
+async def licao_comando_invalido(ctx: Contexto):
+    enviar_resposta_de_texto(ctx.remetente_jid, "Comando inválido. Por favor, clique em um dos botões (A, B, C ou D).")
+
+
+# C) ESTADO: AGUARDANDO RESPOSTA DINÂMICA (a correção depende do tipo do exercício, não da entrada)
+
+@maquina.ao_receber(ESTADO_AGUARDANDO_RESPOSTA_DINAMICA)
+async def corrigir_exercicio_dinamico(ctx: Contexto):
+    usuario = ctx.usuario
+    if usuario.exercicio_tipo not in ("choice", "open") or (usuario.exercicio_tipo == "choice" and not ctx.resposta):
+        enviar_resposta_de_texto(ctx.remetente_jid, "Comando inválido. Por favor, clique em um dos botões (A, B, C ou D).")
+        return
+
+    exercicio = carregar_exercicio(usuario.exercicio_dados_json)
+    if exercicio is None:
+        usuario.estado = ESTADO_MENU
+        enviar_resposta_de_texto(ctx.remetente_jid, "⚠️ Não encontrei o exercício que você estava respondendo. Vamos começar outro pelo menu.")
+        enviar_menu(ctx.remetente_jid, MENU_PRINCIPAL)
+        return
+
+    # Múltipla escolha: o TEXTO da opção clicada (ex: "IS"); aberta: o que o aluno digitou.
+    resposta = ctx.resposta if usuario.exercicio_tipo == "choice" else ctx.texto
+    gabarito_texto = usuario.exercicio_correto_texto.upper()
+
+    correcao = corretor.corrigir(resposta, exercicio)
+    veredito, explicacao = correcao.veredito, None
+    if veredito is None:
+        # Só o que a correção local não decide vai para a IA.
+        avaliacao = await corrigir_resposta_aberta_async(
+            usuario.nivel_ingles, exercicio.get("pergunta"), exercicio.get("correta"), exercicio.get("aceitas", []), resposta
+        )
+        corretor.registrar_escalonamento(avaliacao["correta"] if avaliacao else None)
+        if avaliacao is None:
+            usuario.estado = ESTADO_MENU
+            enviar_resposta_de_texto(ctx.remetente_jid, f"⚠️ Não consegui corrigir sua resposta agora. A resposta esperada era *{gabarito_texto}*.")
+            enviar_menu(ctx.remetente_jid, MENU_PRINCIPAL)
+            return
+        veredito, explicacao = avaliacao["correta"], avaliacao["explicacao"]
+
+    usuario.total_exercicios_feitos += 1
+    if veredito:
+        usuario.total_acertos += 1
+        # Transição "próximo exercício": sai direto do slot pré-carregado, sem esperar a IA.
+        await enviar_exercicio_dinamico(usuario, ctx.remetente_jid, "✅ **Correto!** Próximo exercício:")
+
+    elif explicacao:
+        # A IA já corrigiu e explicou: não precisa de uma segunda chamada para o reforço.
+        enviar_resposta_de_texto(ctx.remetente_jid,
+            f"❌ **Incorreto!** A resposta correta era *{gabarito_texto}*.\n\n"
+            f"📢 **Reforço:** {explicacao}\n"
+            "Voltando ao menu principal."
+        )
+        enviar_menu(ctx.remetente_jid, MENU_PRINCIPAL)
+        usuario.estado = ESTADO_MENU
+
+    else:
+        # ERROU: explica o erro com a IA e volta ao menu
+        await enviar_reforco_ia(ctx.remetente_jid,
+            usuario.nivel_ingles,
+            exercicio.get("pergunta"),
+            resposta,
+            gabarito_texto
+        )
+        usuario.estado = ESTADO_MENU
+
+
+# D) ESTADO: ESCOLHA DE NÍVEL (A/B)
+
+@maquina.ao_receber(ESTADO_ESCOLHA_NIVEL, "A")
+async def pedir_nivel(ctx: Contexto):
+    ctx.usuario.estado = ESTADO_AGUARDANDO_NIVEL_DIGITADO
+    enviar_menu(ctx.remetente_jid, MENU_NIVEL_DIGITADO)
+
+
+@maquina.ao_receber(ESTADO_ESCOLHA_NIVEL, "B")
+async def avaliacao_em_breve(ctx: Contexto):
+    enviar_resposta_de_texto(ctx.remetente_jid, "A avaliação de nível por IA (Opção B) está em desenvolvimento. Por favor, tente a Opção A ou volte ao menu.")
+    ctx.usuario.estado = ESTADO_MENU
+    enviar_menu(ctx.remetente_jid, MENU_PRINCIPAL)
+
+
+@maquina.ao_receber(ESTADO_ESCOLHA_NIVEL)
+async def repetir_escolha_nivel(ctx: Contexto):
+    # Usuário novo (ou sem nível) recebe o menu normal; quem já tem nível errou a opção.
+    enviar_menu(ctx.remetente_jid, MENU_ESCOLHA_NIVEL_INVALIDA if ctx.nivel_definido else MENU_ESCOLHA_NIVEL)
+
+
+# E) ESTADO: AGUARDANDO NÍVEL DIGITADO
+
+@maquina.ao_receber(ESTADO_AGUARDANDO_NIVEL_DIGITADO, *OPCOES_NIVEL_DIGITADO.values())
+async def salvar_nivel(ctx: Contexto):
+    nivel_selecionado = ctx.resposta
+    ctx.usuario.nivel_ingles = nivel_selecionado
+    ctx.usuario.estado = ESTADO_MENU
+
+    prompt_plano = (
+        f"Crie um plano de estudo de inglês de 3 passos focado em um aluno de nível {nivel_selecionado}. "
+        "O plano deve ser conciso e motivador, focado em vocabulário e gramática. Use emojis."
+    )
+
+    plano_estudo = await get_ai_response_async(prompt_plano)
+
+    enviar_resposta_de_texto(ctx.remetente_jid,
+        f"✨ Nível salvo como: *{nivel_selecionado}*.\n\n"
+        "🧠 **Seu Plano de Estudos Personalizado:**\n"
+        f"{plano_estudo}\n\n"
+        "Voltando ao menu principal."
+    )
+    enviar_menu(ctx.remetente_jid, MENU_PRINCIPAL)
+
+
+@maquina.ao_receber(ESTADO_AGUARDANDO_NIVEL_DIGITADO)
+async def nivel_invalido(ctx: Contexto):
+    enviar_resposta_de_texto(ctx.remetente_jid, f"Nível inválido: {ctx.resposta}. Por favor, escolha uma opção dos botões.")
+    enviar_menu(ctx.remetente_jid, MENU_NIVEL_DIGITADO)
+
+
+# F) ESTADOS DO MENU: opções de 1 a 5
+
+@maquina.ao_receber(ESTADOS_MENU, "1")
+async def opcao_definir_nivel(ctx: Contexto):
+    ctx.usuario.estado = ESTADO_ESCOLHA_NIVEL
+    enviar_menu(ctx.remetente_jid, MENU_ESCOLHA_NIVEL)
+
+
+@maquina.ao_receber(ESTADOS_MENU, "2")
+async def opcao_exercicio_dinamico(ctx: Contexto):
+    if not ctx.nivel_definido:
+        enviar_resposta_de_texto(ctx.remetente_jid, "🚨 Por favor, defina seu nível na Opção 1 antes de iniciar as lições.")
+        enviar_menu(ctx.remetente_jid, MENU_ESCOLHA_NIVEL)
+        ctx.usuario.estado = ESTADO_ESCOLHA_NIVEL
+        return
+
+    await enviar_exercicio_dinamico(ctx.usuario, ctx.remetente_jid)
+
+
+@maquina.ao_receber(ESTADOS_MENU, "3")
+async def opcao_conversa_ia(ctx: Contexto):
+    ctx.usuario.estado = ESTADO_CONVERSANDO_IA
+    enviar_resposta_de_texto(ctx.remetente_jid, "🎉 **Conversação com IA ativada!**\n\nPergunte-me qualquer coisa sobre inglês.")
+
+
+@maquina.ao_receber(ESTADOS_MENU, "4")
+async def opcao_status(ctx: Contexto):
+    ctx.usuario.estado = ESTADO_MENU
+    # Lido do cache do monitor de status; a uazapi não é consultada a cada clique.
+    try:
+        status = await monitor_status.obter()
+    except Exception as e:
+        log.error(f"🚨 Erro ao consultar o status da instância: {e}")
+        status = None
+    idade = monitor_status.idade
+    # Falhas da consulta (conexão, token, resposta inválida) ficam nos logs; o aluno só vê que está indisponível.
+    if status is None or idade is None or monitor_status.falhou:
+        enviar_resposta_de_texto(ctx.remetente_jid, "📢 O status da instância está indisponível no momento. Tente novamente em instantes.")
+    else:
+        enviar_resposta_de_texto(ctx.remetente_jid, f"📢 STATUS DA INSTÂNCIA:\n\nSua instância está atualmente: *{status}* (verificado há {idade:.0f}s).")
+    enviar_menu(ctx.remetente_jid, MENU_PRINCIPAL)
+
+
+@maquina.ao_receber(ESTADOS_MENU, "5")
+async def opcao_sair(ctx: Contexto):
+    ctx.usuario.estado = ESTADO_FINALIZADO
+    enviar_resposta_de_texto(ctx.remetente_jid, "Certo. Saindo do sistema. Para reiniciar, envie 'oi' ou 'menu'.")
+
+
+@maquina.ao_receber(ESTADO_CONVERSANDO_IA)
+async def conversar_com_ia(ctx: Contexto):
+    if not ia_disponivel():
+        enviar_resposta_de_texto(ctx.remetente_jid, MENSAGEM_IA_INDISPONIVEL)
+        return
+    log.debug("🤖 Enviando pergunta de %s para a IA (%s caracteres).", ctx.remetente_jid, len(ctx.texto))
+    # Conversa livre não é determinística e depende do histórico: não passa pelo cache de respostas.
+    resumo, turnos = memoria_conversas.contexto(ctx.remetente_jid)
+    resposta = await responder_conversa_async(ctx.texto, resumo, turnos)
+    if resposta is None:
+        enviar_resposta_de_texto(ctx.remetente_jid, "🤖 Houve um erro na comunicação com a IA. Tente novamente mais tarde.")
+        return
+    enviar_resposta_de_texto(ctx.remetente_jid, resposta)
+    memoria_conversas.registrar(ctx.remetente_jid, ctx.texto, resposta)
+
+
+@maquina.ao_receber(tuple(estado for estado in ESTADOS_MENU if estado != ESTADO_CONVERSANDO_IA))
+async def opcao_invalida(ctx: Contexto):
+    enviar_menu_botoes(ctx.remetente_jid, f"Não entendi '{ctx.texto}'. Por favor, escolha uma opção:", OPCOES_MENU_PRINCIPAL)
+
+
+# ===============================================
+# ENTRADA DO FLUXO
+# ===============================================
+
+async def processar_mensagem(evento_dados: dict, db: Session):
+    """
+    Executa a máquina de estados para um evento de mensagem já validado pelo webhook.
+
+    Retorna o ramo que tratou a mensagem ("reset" ou o estado do usuário na chegada), usado como
+    rótulo das métricas; None se o evento não era uma mensagem recebida.
+    """
+    evento_tipo = evento_dados.get('EventType')
+    mensagem = evento_dados.get('message', {})
+
+    if evento_tipo != 'messages' or mensagem.get('fromMe') != False:
+        return None
+
+    remetente_jid = mensagem.get('sender')
+    texto_recebido_payload = mensagem.get('text', '') or mensagem.get('content', '') or ''
+
+    # Clique em botão: o payload traz o ID de controle limpo em selectedID.
+    if isinstance(texto_recebido_payload, dict):
+        texto_recebido = texto_recebido_payload.get('selectedID', '')
+    else:
+        texto_recebido = str(texto_recebido_payload).lower().strip()
+
+    # Se for clique de opção, o valor é o texto da opção em maiúsculas (ex: "AM")
+    resposta_usuario = texto_recebido.upper()
+
+    # --- Gerenciamento de Usuário e Estado ---
+    usuario = db.query(Usuario).filter(Usuario.wa_jid == remetente_jid).first()
+    if not usuario:
+        usuario = Usuario(wa_jid=remetente_jid, nome=mensagem.get('senderName', 'Usuário Novo'), nivel_ingles=NIVEL_NAO_DEFINIDO, estado=ESTADO_ESCOLHA_NIVEL)
+        # Gravado no commit do evento, junto com o ID de deduplicação.
+        db.add(usuario)
+
+    definido = nivel_definido(usuario)
+    if not definido and usuario.estado == ESTADO_MENU:
+        usuario.estado = ESTADO_ESCOLHA_NIVEL
+
+    # Vai no mesmo commit do evento, que já acontece de qualquer forma (ID de deduplicação).
+    usuario.ultima_interacao = datetime.now()
+
+    estado = usuario.estado
+    entrada = ENTRADA_RESET if texto_recebido in PALAVRAS_RESET else resposta_usuario
+    ctx = Contexto(usuario, remetente_jid, texto_recebido, resposta_usuario, definido)
+    await maquina.despachar(estado, entrada, ctx)
+    return ENTRADA_RESET if entrada == ENTRADA_RESET else estado
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+
+from ai_service import resumir_conversa_async
+from database import SessionLocal, MemoriaConversa
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# ===============================================
+# CONFIGURAÇÕES DA MEMÓRIA DA CONVERSA (Sobrescrevíveis pelo .env)
+# ===============================================
+
+# Trocas (pergunta + resposta) mantidas na íntegra por aluno; as que saem do buffer vão para o resumo.
+MEMORIA_TURNOS = int(os.getenv("MEMORIA_TURNOS", "8"))
+# Orçamento de tokens do histórico mandado à IA (resumo + trocas); as trocas mais antigas caem primeiro.
+MEMORIA_TOKENS_MAX = int(os.getenv("MEMORIA_TOKENS_MAX", "1500"))
+# Tamanho máximo do resumo das trocas antigas.
+MEMORIA_RESUMO_TOKENS = int(os.getenv("MEMORIA_RESUMO_TOKENS", "300"))
+# Quantas trocas fora do buffer juntar antes de pedir um novo resumo à IA.
+MEMORIA_RESUMIR_A_CADA = int(os.getenv("MEMORIA_RESUMIR_A_CADA", "4"))
+# Conversas mantidas em memória (LRU); as demais ficam só no SQLite.
+MEMORIA_USUARIOS_MAX = int(os.getenv("MEMORIA_USUARIOS_MAX", "1000"))
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimativa barata (~4 caracteres por token), suficiente para respeitar o orçamento."""
+    return len(texto) // 4 + 1
+
+
+def truncar_tokens(texto: str, limite: int) -> str:
+    """Mantém o final do texto (o mais recente) dentro de `limite` tokens estimados."""
+    maximo = limite * 4
+    if len(texto) <= maximo:
+        return texto
+    return "…" + texto[-maximo:].split(" ", 1)[-1]
+
+
+class Conversa:
+    def __init__(self, resumo: str = "", turnos: list = (), a_resumir: list = (), max_turnos: int = MEMORIA_TURNOS):
+        self.resumo = resumo
+        self.turnos = deque((tuple(t) for t in turnos), maxlen=max_turnos)
+        # Trocas que saíram do buffer e ainda não entraram no resumo.
+        self.a_resumir = [tuple(t) for t in a_resumir]
+
+
+class MemoriaConversas:
+    """
+    Histórico do modo conversa com a IA, por aluno.
+
+    As últimas `max_turnos` trocas ficam num buffer circular; as que saem dele são fundidas pela
+    IA num resumo em segundo plano, a cada `resumir_a_cada` trocas (se a IA falhar, o resumo é
+    truncado no lugar). `contexto` devolve o resumo e as trocas mais recentes que cabem em
+    `tokens_max`. Conversas ficam num LRU em memória, apoiado na tabela `memorias_conversa` do
+    SQLite para sobreviver a reinícios.
+    """
+
+    def __init__(self, max_turnos: int = MEMORIA_TURNOS, tokens_max: int = MEMORIA_TOKENS_MAX,
+                 resumo_tokens: int = MEMORIA_RESUMO_TOKENS, resumir_a_cada: int = MEMORIA_RESUMIR_A_CADA,
+                 max_usuarios: int = MEMORIA_USUARIOS_MAX):
+        self.max_turnos = max_turnos
+        self.tokens_max = tokens_max
+        self.resumo_tokens = resumo_tokens
+        self.resumir_a_cada = max(1, resumir_a_cada)
+        self.max_usuarios = max_usuarios
+        self._conversas = OrderedDict()
+        self._lock = threading.Lock()
+        self._tarefas = {}
+        self.resumos = 0
+        self.resumos_truncados = 0
+        self.contextos = 0
+        self.tokens_contexto = 0
+        self.tokens_contexto_max = 0
+
+    def estatisticas(self) -> dict:
+        return {
+            "conversas_memoria": len(self._conversas),
+            "resumindo": len(self._tarefas),
+            "resumos": self.resumos,
+            "resumos_truncados": self.resumos_truncados,
+            "tokens_contexto_medio": round(self.tokens_contexto / self.contextos, 1) if self.contextos else 0.0,
+            "tokens_contexto_max": self.tokens_contexto_max,
+        }
+
+    def obter(self, wa_jid: str) -> Conversa:
+        with self._lock:
+            conversa = self._conversas.get(wa_jid)
+            if conversa is not None:
+                self._conversas.move_to_end(wa_jid)
+                return conversa
+
+        conversa = self._carregar(wa_jid)
+        with self._lock:
+            # Outro worker pode ter carregado a mesma conversa enquanto isso.
+            conversa = self._conversas.setdefault(wa_jid, conversa)
+            self._conversas.move_to_end(wa_jid)
+            while len(self._conversas) > self.max_usuarios:
+                self._conversas.popitem(last=False)
+        return conversa
+
+    def contexto(self, wa_jid: str):
+        """(resumo, trocas) para a próxima chamada, dentro de `tokens_max`: as trocas mais antigas caem primeiro."""
+        conversa = self.obter(wa_jid)
+        resumo = conversa.resumo
+        usados = estimar_tokens(resumo) if resumo else 0
+        trocas = []
+        # As trocas à espera do resumo ainda não estão nele: entram como trocas enquanto couberem.
+        for pergunta, resposta in reversed([*conversa.a_resumir, *conversa.turnos]):
+            custo = estimar_tokens(pergunta) + estimar_tokens(resposta)
+            if usados + custo > self.tokens_max:
+                break
+            usados += custo
+            trocas.append((pergunta, resposta))
+        trocas.reverse()
+
+        self.contextos += 1
+        self.tokens_contexto += usados
+        self.tokens_contexto_max = max(self.tokens_contexto_max, usados)
+        return resumo, trocas
+
+    def registrar(self, wa_jid: str, pergunta: str, resposta: str):
+        """Acrescenta a troca, persiste e, se já há trocas suficientes fora do buffer, agenda o resumo."""
+        conversa = self.obter(wa_jid)
+        if len(conversa.turnos) == conversa.turnos.maxlen:
+            conversa.a_resumir.append(conversa.turnos[0])
+        conversa.turnos.append((pergunta, resposta))
+        self._persistir(wa_jid, conversa)
+
+        if len(conversa.a_resumir) >= self.resumir_a_cada and wa_jid not in self._tarefas:
+            self._tarefas[wa_jid] = asyncio.create_task(self._resumir(wa_jid, conversa), name=f"resumo-{wa_jid}")
+
+    async def parar(self):
+        # As trocas ainda não resumidas já estão no SQLite: o resumo é retomado na próxima troca.
+        tarefas = list(self._tarefas.values())
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+
+    async def _resumir(self, wa_jid: str, conversa: Conversa):
+        try:
+            # Novas trocas podem sair do buffer durante a chamada: só as deste lote são consumidas.
+            lote = list(conversa.a_resumir)
+            limite_palavras = max(1, self.resumo_tokens * 3 // 4)
+            resumo = await resumir_conversa_async(conversa.resumo, lote, limite_palavras)
+            if resumo is None:
+                self.resumos_truncados += 1
+                trocas = " ".join(f"Aluno: {pergunta} Bot: {resposta}" for pergunta, resposta in lote)
+                resumo = f"{conversa.resumo} {trocas}".strip()
+            else:
+                self.resumos += 1
+            conversa.resumo = truncar_tokens(resumo, self.resumo_tokens)
+            del conversa.a_resumir[:len(lote)]
+            self._persistir(wa_jid, conversa)
+        except Exception as e:
+            log.error(f"🚨 Erro ao resumir a conversa de {wa_jid}: {e}")
+        finally:
+            self._tarefas.pop(wa_jid, None)
+
+    def _carregar(self, wa_jid: str) -> Conversa:
+        db = SessionLocal()
+        try:
+            registro = db.get(MemoriaConversa, wa_jid)
+            if registro is None:
+                return Conversa(max_turnos=self.max_turnos)
+            turnos = json.loads(registro.turnos_json or "[]")
+            a_resumir = json.loads(registro.a_resumir_json or "[]")
+            # Se MEMORIA_TURNOS diminuiu desde a gravação, o excesso vai para o resumo.
+            excesso = max(0, len(turnos) - self.max_turnos)
+            return Conversa(registro.resumo or "", turnos[excesso:], a_resumir + turnos[:excesso], self.max_turnos)
+        except Exception as e:
+            log.error(f"🚨 Erro ao carregar a memória da conversa de {wa_jid}: {e}")
+            return Conversa(max_turnos=self.max_turnos)
+        finally:
+            db.close()
+
+    def _persistir(self, wa_jid: str, conversa: Conversa):
+        db = SessionLocal()
+        try:
+            db.merge(MemoriaConversa(
+                wa_jid=wa_jid,
+                resumo=conversa.resumo,
+                turnos_json=json.dumps(list(conversa.turnos), ensure_ascii=False),
+                a_resumir_json=json.dumps(conversa.a_resumir, ensure_ascii=False),
+                atualizado_em=datetime.now(),
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            log.error(f"🚨 Erro ao gravar a memória da conversa de {wa_jid}: {e}")
+        finally:
+            db.close()
@@ -1,17 +1,55 @@
-from sqlalchemy import create_engine, Column, String, Integer, DateTime
+from sqlalchemy import create_engine, event, text, Column, String, Integer, DateTime
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
+from dotenv import load_dotenv
 import logging
 import os
 
+# A configuração abaixo é lida na importação, que acontece antes do load_dotenv() do bot_server.
+load_dotenv()
+
 log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
 
-DATABASE_URL = "sqlite:///./bot_data.db"
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./bot_data.db")
+
+# ===============================================
+# PERFIL DE PRODUÇÃO DO SQLITE (Sobrescrevível pelo .env)
+# ===============================================
+# WAL: leitores não bloqueiam o escritor; com synchronous=NORMAL o fsync acontece só no checkpoint,
+# não a cada commit (um commit pode se perder numa queda de energia, mas o banco não corrompe).
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+
+def aplicar_pragmas(dbapi_connection, connection_record=None):
+    """Configura cada nova conexão do pool com o perfil de produção."""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        # Valor negativo = tamanho em KiB (e não em páginas).
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+def criar_engine(url: str = DATABASE_URL, perfil_producao: bool = True):
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    if perfil_producao and url.startswith("sqlite"):
+        event.listen(engine, "connect", aplicar_pragmas)
+    return engine
+
+
+engine = criar_engine()
 
 Base = declarative_base()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -19,7 +57,7 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 class Usuario(Base):
     __tablename__ = "usuarios"
 
-    wa_jid = Column(String, primary_key=True, index=True) 
+    wa_jid = Column(String, primary_key=True) 
     nome = Column(String, default="Desconhecido")
     nivel_ingles = Column(String, default="Não definido")
     total_exercicios_feitos = Column(Integer, default=0)
@@ -38,7 +76,7 @@ class Usuario(Base):
 class Licao(Base):
     __tablename__ = "licoes"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     tema = Column(String, index=True, default="introducao")
     topico = Column(String)
     texto_pergunta = Column(String)
@@ -49,10 +87,138 @@ class Licao(Base):
     resposta_correta = Column(String)
     
 
+class ExercicioPool(Base):
+    """Exercício dinâmico pré-gerado pela IA, aguardando para ser servido a um aluno do mesmo nível."""
+    __tablename__ = "exercicios_pool"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    nivel_ingles = Column(String, index=True)
+    hash_conteudo = Column(String)
+    dados_json = Column(String)
+    criado_em = Column(DateTime, default=datetime.now)
+
+
+class ExercicioVisto(Base):
+    """Registro de quais exercícios (pelo hash do conteúdo) cada aluno já recebeu."""
+    __tablename__ = "exercicios_vistos"
+
+    wa_jid = Column(String, primary_key=True)
+    hash_conteudo = Column(String, primary_key=True)
+    visto_em = Column(DateTime, default=datetime.now)
+
+
+class CacheRespostaIA(Base):
+    """Respostas da IA para prompts determinísticos, indexadas pelo hash do prompt normalizado."""
+    __tablename__ = "cache_respostas_ia"
+
+    chave = Column(String, primary_key=True)
+    resposta = Column(String)
+    criado_em = Column(DateTime, default=datetime.now)
+
+
+class MensagemProcessada(Base):
+    """IDs de mensagens do webhook já processadas, para descartar reenvios da uazapi."""
+    __tablename__ = "mensagens_processadas"
+
+    message_id = Column(String, primary_key=True)
+    recebido_em = Column(DateTime, default=datetime.now, index=True)
+
+
+class Metadado(Base):
+    """Pares chave/valor de controle (ex.: versão do conteúdo da tabela de lições)."""
+    __tablename__ = "metadados"
+
+    chave = Column(String, primary_key=True)
+    valor = Column(String)
+
+
+class ImportacaoLicoes(Base):
+    """Ponto de retomada do importador de lições: até que linha de cada arquivo já foi gravada."""
+    __tablename__ = "importacoes_licoes"
+
+    arquivo = Column(String, primary_key=True)
+    assinatura = Column(String)
+    linhas_processadas = Column(Integer, default=0)
+    concluida = Column(Integer, default=0)
+    atualizado_em = Column(DateTime, default=datetime.now)
+
+
+class Transmissao(Base):
+    """Ponto de retomada de uma transmissão (broadcast): último wa_jid já atendido e contadores."""
+    __tablename__ = "transmissoes"
+
+    nome = Column(String, primary_key=True)
+    mensagem = Column(String)
+    filtros_json = Column(String)
+    ultimo_wa_jid = Column(String, default="")
+    enviados = Column(Integer, default=0)
+    falhas = Column(Integer, default=0)
+    concluida = Column(Integer, default=0)
+    criado_em = Column(DateTime, default=datetime.now)
+    atualizado_em = Column(DateTime, default=datetime.now)
+
+
+class MemoriaConversa(Base):
+    """Histórico compacto do modo conversa com a IA: resumo das trocas antigas e as mais recentes (JSON)."""
+    __tablename__ = "memorias_conversa"
+
+    wa_jid = Column(String, primary_key=True)
+    resumo = Column(String, default="")
+    turnos_json = Column(String, default="[]")
+    a_resumir_json = Column(String, default="[]")
+    atualizado_em = Column(DateTime, default=datetime.now)
+
+
+CHAVE_VERSAO_LICOES = "licoes_versao"
+
+
+def ler_versao_licoes(db) -> str:
+    metadado = db.get(Metadado, CHAVE_VERSAO_LICOES)
+    return metadado.valor if metadado else "0"
+
+
+def marcar_licoes_alteradas(db):
+    """
+    Troca a versão das lições na sessão do chamador (vai no mesmo commit da alteração).
+    O servidor compara essa versão periodicamente e recarrega o catálogo em memória.
+    """
+    db.merge(Metadado(chave=CHAVE_VERSAO_LICOES, valor=datetime.now().isoformat()))
+
+
+# ===============================================
+# MIGRAÇÕES
+# ===============================================
+# Cada migração roda uma única vez por banco; as aplicadas ficam em `schema_migracoes`.
+# Novas migrações entram no fim da lista, com um nome novo.
+
+MIGRACOES = [
+    ("0001_remover_indices_redundantes", [
+        # Duplicavam o índice implícito das chaves primárias.
+        "DROP INDEX IF EXISTS ix_usuarios_wa_jid",
+        "DROP INDEX IF EXISTS ix_licoes_id",
+    ]),
+]
+
+
+def aplicar_migracoes(bind=None):
+    bind = bind or engine
+    with bind.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_migracoes (nome VARCHAR PRIMARY KEY, aplicada_em DATETIME)"))
+        aplicadas = {linha[0] for linha in conn.execute(text("SELECT nome FROM schema_migracoes"))}
+        for nome, comandos in MIGRACOES:
+            if nome in aplicadas:
+                continue
+            for comando in comandos:
+                conn.execute(text(comando))
+            conn.execute(text("INSERT INTO schema_migracoes (nome, aplicada_em) VALUES (:nome, :agora)"), {"nome": nome, "agora": datetime.now()})
+            log.info("✅ Migração %s aplicada.", nome)
+
+
 def init_db():
     try:
         Base.metadata.create_all(bind=engine)
-        log.info("✅ Banco de dados e tabelas 'usuarios' e 'licoes' criadas.")
+        aplicar_migracoes()
+        log.info("✅ Banco de dados e tabelas 'usuarios', 'licoes' e do pool de exercícios criadas.")
     except Exception as e:
         log.error(f"🚨 Erro ao inicializar o banco de dados: {e}")
 
@@ -0,0 +1,352 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from ai_service import get_dynamic_exercise_async, get_dynamic_exercises_batch_async, validar_exercicio
+from database import SessionLocal, ExercicioPool, ExercicioVisto
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# ===============================================
+# CONFIGURAÇÕES DO POOL (Sobrescrevíveis pelo .env)
+# ===============================================
+
+NIVEIS = ("INICIANTE", "INTERMEDIARIO", "ALTO", "AVANÇADO")
+
+# Abaixo do mínimo o reabastecedor entra em ação e gera exercícios até chegar ao alvo.
+EXERCICIOS_POOL_MINIMO = int(os.getenv("EXERCICIOS_POOL_MINIMO", "10"))
+EXERCICIOS_POOL_ALVO = int(os.getenv("EXERCICIOS_POOL_ALVO", "30"))
+EXERCICIOS_POOL_INTERVALO = float(os.getenv("EXERCICIOS_POOL_INTERVALO", "60"))
+# Quantos exercícios vistos guardar por aluno (os mais recentes); os mais antigos podem voltar a aparecer.
+EXERCICIOS_VISTOS_MAX = int(os.getenv("EXERCICIOS_VISTOS_MAX", "500"))
+# Quantos exercícios pedir à IA por chamada.
+EXERCICIOS_LOTE = int(os.getenv("EXERCICIOS_LOTE", "10"))
+# Pausa máxima (segundos) de um nível cuja geração falhou; a pausa dobra a cada falha seguida,
+# a partir de EXERCICIOS_POOL_INTERVALO.
+EXERCICIOS_POOL_BACKOFF_MAX = float(os.getenv("EXERCICIOS_POOL_BACKOFF_MAX", "900"))
+
+
+# ===============================================
+# FUNÇÕES DO POOL
+# ===============================================
+
+def hash_exercicio(exercicio: dict) -> str:
+    """Hash do conteúdo do exercício (pergunta, opções e gabarito), ignorando caixa e espaços."""
+    partes = [
+        exercicio.get("pergunta", ""),
+        *sorted(exercicio.get("opcoes") or []),
+        exercicio.get("correta", ""),
+    ]
+    normalizado = "\n".join(" ".join(str(p).lower().split()) for p in partes)
+    return hashlib.sha1(normalizado.encode("utf-8")).hexdigest()
+
+
+def carregar_exercicio(json_exercicio_str: str):
+    """Converte o JSON da IA em dict, ou None se não for um exercício utilizável."""
+    try:
+        exercicio = json.loads(json_exercicio_str)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if not isinstance(exercicio, dict) or "error" in exercicio:
+        return None
+    return validar_exercicio(exercicio)
+
+
+def contar_exercicios(db: Session, nivel: str) -> int:
+    return db.scalar(select(func.count()).select_from(ExercicioPool).where(ExercicioPool.nivel_ingles == nivel))
+
+
+def adicionar_exercicio(db: Session, nivel: str, exercicio: dict) -> bool:
+    """Adiciona o exercício ao pool do nível, ignorando duplicatas de conteúdo já presentes."""
+    hash_conteudo = hash_exercicio(exercicio)
+    existente = db.scalar(
+        select(ExercicioPool.id).where(ExercicioPool.nivel_ingles == nivel, ExercicioPool.hash_conteudo == hash_conteudo)
+    )
+    if existente:
+        return False
+    db.add(ExercicioPool(nivel_ingles=nivel, hash_conteudo=hash_conteudo, dados_json=json.dumps(exercicio, ensure_ascii=False)))
+    return True
+
+
+def _registrar_visto(db: Session, wa_jid: str, hash_conteudo: str):
+    """Adiciona o exercício aos vistos do aluno; o excesso além de EXERCICIOS_VISTOS_MAX sai em `podar_vistos`."""
+    db.add(ExercicioVisto(wa_jid=wa_jid, hash_conteudo=hash_conteudo))
+
+
+def podar_vistos(maximo: int = EXERCICIOS_VISTOS_MAX) -> int:
+    """
+    Descarta os vistos mais antigos dos alunos que passaram de `maximo`. Roda no ciclo do
+    reabastecedor, fora do caminho da mensagem; entre um ciclo e outro o histórico pode passar
+    um pouco do limite. Retorna quantas linhas foram removidas.
+    """
+    db = SessionLocal()
+    try:
+        acima_do_limite = db.scalars(
+            select(ExercicioVisto.wa_jid).group_by(ExercicioVisto.wa_jid).having(func.count() > maximo)
+        ).all()
+        removidos = 0
+        for wa_jid in acima_do_limite:
+            recentes = (
+                select(ExercicioVisto.hash_conteudo)
+                .where(ExercicioVisto.wa_jid == wa_jid)
+                .order_by(ExercicioVisto.visto_em.desc())
+                .limit(maximo)
+            )
+            removidos += db.execute(
+                delete(ExercicioVisto)
+                .where(ExercicioVisto.wa_jid == wa_jid, ExercicioVisto.hash_conteudo.not_in(recentes))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        db.commit()
+        return removidos
+    finally:
+        db.close()
+
+
+def marcar_visto(wa_jid: str, exercicio: dict):
+    """
+    Registra que o aluno recebeu o exercício (quando ele veio direto da IA ou de um slot do prefetch).
+
+    Bloqueia até o lock de escrita do SQLite: no event loop, chamar com `asyncio.to_thread`.
+    """
+    hash_conteudo = hash_exercicio(exercicio)
+    db = SessionLocal()
+    try:
+        if db.get(ExercicioVisto, (wa_jid, hash_conteudo)) is None:
+            _registrar_visto(db, wa_jid, hash_conteudo)
+            db.commit()
+    finally:
+        db.close()
+
+
+def retirar_exercicio(nivel: str, wa_jid: str, marcar: bool = True):
+    """
+    Retira do pool o exercício mais antigo do nível que o aluno ainda não viu.
+
+    Retorna a string JSON do exercício (mesmo formato de `get_dynamic_exercise`) ou None se o pool
+    não tiver nada novo para o aluno. Com `marcar=False` o exercício não entra nos vistos (o prefetch
+    marca só quando o entrega). Usa uma transação própria e curta: a sessão do webhook fica aberta
+    durante os envios e chamadas à IA, e não pode segurar o lock de escrita do SQLite. Também
+    bloqueia até esse lock: no event loop, chamar com `asyncio.to_thread`.
+    """
+    db = SessionLocal()
+    try:
+        ja_visto = select(ExercicioVisto.hash_conteudo).where(ExercicioVisto.wa_jid == wa_jid)
+        candidatos = db.execute(
+            select(ExercicioPool.id, ExercicioPool.hash_conteudo, ExercicioPool.dados_json)
+            .where(ExercicioPool.nivel_ingles == nivel, ExercicioPool.hash_conteudo.not_in(ja_visto))
+            .order_by(ExercicioPool.id)
+            .limit(5)
+        ).all()
+
+        for id_pool, hash_conteudo, dados_json in candidatos:
+            # Outro processo pode ter retirado o mesmo exercício; só vale se o DELETE removeu a linha.
+            if db.execute(delete(ExercicioPool).where(ExercicioPool.id == id_pool)).rowcount:
+                if marcar:
+                    _registrar_visto(db, wa_jid, hash_conteudo)
+                db.commit()
+                return dados_json
+        return None
+    finally:
+        db.close()
+
+
+# ===============================================
+# REABASTECEDOR EM SEGUNDO PLANO
+# ===============================================
+
+class ReabastecedorPool:
+    """
+    Tarefa de fundo que mantém cada nível com pelo menos EXERCICIOS_POOL_MINIMO exercícios,
+    completando até EXERCICIOS_POOL_ALVO. Roda a cada EXERCICIOS_POOL_INTERVALO segundos ou
+    quando `notificar()` é chamado após um exercício ser servido. A cada ciclo também poda o
+    histórico de vistos (`podar_vistos`).
+
+    Se a IA devolve um lote vazio (fora do ar, cota estourada) ou só repete exercícios, o nível
+    fica em pausa, com backoff exponencial até EXERCICIOS_POOL_BACKOFF_MAX, em vez de insistir a
+    cada ciclo ou a cada `notificar()`.
+    """
+
+    def __init__(self, minimo: int = EXERCICIOS_POOL_MINIMO, alvo: int = EXERCICIOS_POOL_ALVO, intervalo: float = EXERCICIOS_POOL_INTERVALO,
+                 backoff_max: float = EXERCICIOS_POOL_BACKOFF_MAX):
+        self.minimo = minimo
+        self.alvo = max(alvo, minimo)
+        self.intervalo = intervalo
+        self.backoff_max = backoff_max
+        self._pausas = {}
+        self._acordar = None
+        self._tarefa = None
+        self.gerados = 0
+        self.falhas = 0
+
+    def notificar(self):
+        if self._acordar is not None:
+            self._acordar.set()
+
+    async def iniciar(self):
+        self._acordar = asyncio.Event()
+        self._tarefa = asyncio.create_task(self._executar(), name="reabastecedor-pool")
+
+    async def parar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            await asyncio.gather(self._tarefa, return_exceptions=True)
+            self._tarefa = None
+
+    async def _executar(self):
+        while True:
+            try:
+                for nivel in NIVEIS:
+                    await self.reabastecer(nivel)
+            except Exception as e:
+                log.error(f"🚨 Erro no reabastecedor do pool de exercícios: {e}")
+
+            try:
+                removidos = await asyncio.to_thread(podar_vistos)
+                if removidos:
+                    log.info("🧹 %s exercícios vistos antigos descartados.", removidos)
+            except Exception as e:
+                log.error(f"🚨 Erro ao podar os exercícios vistos: {e}")
+
+            try:
+                await asyncio.wait_for(self._acordar.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            self._acordar.clear()
+
+    async def reabastecer(self, nivel: str):
+        pausa = self._pausas.get(nivel)
+        if pausa is not None and time.monotonic() < pausa[0]:
+            return
+
+        db = SessionLocal()
+        try:
+            faltando = self.alvo - contar_exercicios(db, nivel)
+            if self.alvo - faltando >= self.minimo:
+                return
+
+            log.info("🔄 Reabastecendo pool do nível %s com %s exercícios.", nivel, faltando)
+            repeticoes_seguidas = 0
+            while faltando > 0:
+                lote = await get_dynamic_exercises_batch_async(nivel, min(faltando, EXERCICIOS_LOTE))
+                if not lote:
+                    # IA fora do ar ou instável: outra chamada agora falharia igual.
+                    self.falhas += 1
+                    self._pausar(nivel)
+                    return
+                novos = sum(adicionar_exercicio(db, nivel, exercicio) for exercicio in lote)
+                db.commit()
+                self.gerados += novos
+                faltando -= novos
+
+                if novos == 0:
+                    # A IA só está repetindo exercícios já guardados.
+                    self.falhas += 1
+                    repeticoes_seguidas += 1
+                    if repeticoes_seguidas >= 3:
+                        self._pausar(nivel)
+                        return
+                    continue
+                repeticoes_seguidas = 0
+            self._pausas.pop(nivel, None)
+        finally:
+            db.close()
+
+    def _pausar(self, nivel: str):
+        _, espera = self._pausas.get(nivel, (0.0, self.intervalo / 2))
+        espera = min(self.backoff_max, espera * 2)
+        self._pausas[nivel] = (time.monotonic() + espera, espera)
+        log.warning("⚠️ Geração do pool do nível %s falhou; nova tentativa em %.0fs.", nivel, espera)
+
+
+# ===============================================
+# PRÓXIMO EXERCÍCIO PRÉ-CARREGADO POR ALUNO
+# ===============================================
+
+PREFETCH_MAX_SLOTS = int(os.getenv("PREFETCH_MAX_SLOTS", "1000"))
+
+
+class PrefetchExercicios:
+    """
+    Um "slot" por aluno com o próximo exercício já separado.
+
+    Assim que um exercício é enviado, `agendar` preenche o slot em segundo plano (do pool ou,
+    se ele estiver vazio, direto da IA) enquanto o aluno ainda pensa na resposta. No acerto,
+    `obter` entrega o exercício do slot sem nenhuma latência de IA e só então o marca como visto:
+    um slot descartado não conta no histórico do aluno. Os slots são limitados a
+    PREFETCH_MAX_SLOTS (os mais antigos são descartados).
+    """
+
+    def __init__(self, max_slots: int = PREFETCH_MAX_SLOTS):
+        self.max_slots = max_slots
+        self._slots = OrderedDict()
+        self._tarefas = {}
+        self.servidos_do_slot = 0
+        self.sem_slot = 0
+
+    def estatisticas(self) -> dict:
+        return {
+            "slots": len(self._slots),
+            "preenchendo": len(self._tarefas),
+            "servidos_do_slot": self.servidos_do_slot,
+            "sem_slot": self.sem_slot,
+        }
+
+    def agendar(self, nivel: str, wa_jid: str):
+        """Dispara o preenchimento do slot do aluno, se ainda não houver um para esse nível."""
+        if wa_jid in self._tarefas:
+            return
+        slot = self._slots.get(wa_jid)
+        if slot is not None and slot[0] == nivel:
+            return
+        self._tarefas[wa_jid] = asyncio.create_task(self._preencher(nivel, wa_jid), name=f"prefetch-{wa_jid}")
+
+    async def obter(self, nivel: str, wa_jid: str):
+        """Entrega o exercício do slot (JSON) ou None. Se o preenchimento ainda está em curso, espera por ele."""
+        tarefa = self._tarefas.get(wa_jid)
+        if tarefa is not None:
+            await asyncio.gather(tarefa, return_exceptions=True)
+
+        slot = self._slots.pop(wa_jid, None)
+        if slot is None or slot[0] != nivel:
+            self.sem_slot += 1
+            return None
+        self.servidos_do_slot += 1
+        try:
+            await asyncio.to_thread(marcar_visto, wa_jid, json.loads(slot[1]))
+        except Exception as e:
+            # O exercício sai mesmo assim; no pior caso ele pode voltar a aparecer para o aluno.
+            log.error(f"🚨 Erro ao marcar como visto o exercício pré-carregado de {wa_jid}: {e}")
+        return slot[1]
+
+    async def parar(self):
+        tarefas = list(self._tarefas.values())
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+
+    async def _preencher(self, nivel: str, wa_jid: str):
+        try:
+            json_exercicio_str = await asyncio.to_thread(retirar_exercicio, nivel, wa_jid, False)
+            if json_exercicio_str is None:
+                exercicio = carregar_exercicio(await get_dynamic_exercise_async(nivel))
+                if exercicio is None:
+                    return
+                json_exercicio_str = json.dumps(exercicio, ensure_ascii=False)
+
+            self._slots[wa_jid] = (nivel, json_exercicio_str)
+            self._slots.move_to_end(wa_jid)
+            while len(self._slots) > self.max_slots:
+                self._slots.popitem(last=False)
+        except Exception as e:
+            log.error(f"🚨 Erro ao pré-carregar exercício para {wa_jid}: {e}")
+        finally:
+            self._tarefas.pop(wa_jid, None)
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+from collections import deque
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+class ExecutorPorChave:
+    """
+    Executor assíncrono com ordenação por chave.
+
+    Itens com a mesma chave (ex.: o wa_jid do remetente) são processados estritamente na ordem
+    de chegada, um de cada vez; chaves diferentes são processadas em paralelo por até
+    `num_workers` workers. Cada chave com trabalho pendente tem sua própria fila; a fila é
+    descartada assim que esvazia, então chaves ociosas não ocupam memória.
+
+    `enfileirar` não bloqueia: retorna False quando o total de itens pendentes atingiria
+    `max_pendentes` (backpressure) ou quando o executor está parado. Um item pode ter `peso`
+    maior que 1 (ex.: um lote de eventos) e conta como `peso` itens para esse limite.
+    """
+
+    def __init__(self, processar, num_workers: int, max_pendentes: int, nome: str = "executor"):
+        self.processar = processar
+        self.num_workers = num_workers
+        self.max_pendentes = max_pendentes
+        self.nome = nome
+        self._filas = {}
+        self._prontas = None
+        self._ocioso = None
+        self._workers = []
+        self.aceitando = False
+        self.pendentes = 0
+        self.processados = 0
+        self.rejeitados = 0
+        self.erros = 0
+        self.maior_fila_observada = 0
+
+    @property
+    def profundidade(self) -> int:
+        return self.pendentes
+
+    def tamanho_fila(self, chave) -> int:
+        fila = self._filas.get(chave)
+        return len(fila) if fila else 0
+
+    def estatisticas(self) -> dict:
+        tamanhos = [len(fila) for fila in self._filas.values()]
+        return {
+            "profundidade": self.pendentes,
+            "capacidade": self.max_pendentes,
+            "workers": len(self._workers),
+            "chaves_ativas": len(self._filas),
+            "maior_fila_chave": max(tamanhos, default=0),
+            "maior_fila_chave_observada": self.maior_fila_observada,
+            "processados": self.processados,
+            "rejeitados": self.rejeitados,
+            "erros": self.erros,
+        }
+
+    async def iniciar(self):
+        """Sobe os workers no loop de eventos atual."""
+        self._prontas = asyncio.Queue()
+        self._ocioso = asyncio.Event()
+        self._ocioso.set()
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"{self.nome}-worker-{i}")
+            for i in range(self.num_workers)
+        ]
+        self.aceitando = True
+        log.info("✅ %s iniciado com %s workers (capacidade %s).", self.nome, self.num_workers, self.max_pendentes)
+
+    def enfileirar(self, chave, item, peso: int = 1) -> bool:
+        if not self.aceitando or self.pendentes + peso > self.max_pendentes:
+            self.rejeitados += peso
+            return False
+
+        fila = self._filas.get(chave)
+        if fila is None:
+            # Chave sem trabalho pendente: ganha uma fila e entra na lista de prontas.
+            fila = self._filas[chave] = deque()
+            self._prontas.put_nowait(chave)
+        fila.append((item, peso))
+
+        self.pendentes += peso
+        self.maior_fila_observada = max(self.maior_fila_observada, len(fila))
+        self._ocioso.clear()
+        return True
+
+    async def drenar(self, timeout: float):
+        """Para de aceitar itens, espera os pendentes terminarem (até `timeout`) e encerra os workers."""
+        self.aceitando = False
+        if self._ocioso is None:
+            return
+
+        try:
+            await asyncio.wait_for(self._ocioso.wait(), timeout=timeout)
+            log.info("✅ %s drenado (%s itens processados).", self.nome, self.processados)
+        except asyncio.TimeoutError:
+            log.warning("⚠️ Tempo de drenagem do %s esgotado. %s itens descartados.", self.nome, self.pendentes)
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _worker(self, numero: int):
+        while True:
+            chave = await self._prontas.get()
+            fila = self._filas[chave]
+            item, peso = fila.popleft()
+            try:
+                await self.processar(item)
+                self.processados += peso
+            except Exception as e:
+                self.erros += peso
+                log.error(f"🚨 Erro no worker {numero} do {self.nome} ao processar item de {chave}: {e}")
+            finally:
+                self.pendentes -= peso
+                if fila:
+                    # Volta para o fim da lista de prontas: mantém a ordem da chave e é justo com as outras.
+                    self._prontas.put_nowait(chave)
+                else:
+                    del self._filas[chave]
+                if self.pendentes == 0:
+                    self._ocioso.set()
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from database import SessionLocal, Licao, ler_versao_licoes
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+LICOES_VERIFICACAO_INTERVALO = float(os.getenv("LICOES_VERIFICACAO_INTERVALO", "10"))
+
+
+@dataclass(frozen=True)
+class LicaoCatalogo:
+    """Lição já pronta para envio: texto da mensagem e escolhas dos botões renderizados uma única vez."""
+    id: int
+    tema: str
+    topico: str
+    texto_pergunta: str
+    resposta_correta: str
+    texto_mensagem: str
+    opcoes: tuple
+    proximo_id: int = None
+
+
+def _texto_opcao(opcao: str) -> str:
+    # "A. Quem é você?" -> "Quem é você?"
+    return (opcao or "").split('. ', 1)[-1]
+
+
+def renderizar_licao(licao: Licao, proximo_id: int = None) -> LicaoCatalogo:
+    return LicaoCatalogo(
+        id=licao.id,
+        tema=licao.tema,
+        topico=licao.topico,
+        texto_pergunta=licao.texto_pergunta,
+        resposta_correta=(licao.resposta_correta or "").upper(),
+        texto_mensagem=f"*{licao.topico}*\nResponda: {licao.texto_pergunta}",
+        opcoes=(
+            f"A: {_texto_opcao(licao.opcao_a)}|A",
+            f"B: {_texto_opcao(licao.opcao_b)}|B",
+            f"C: {_texto_opcao(licao.opcao_c)}|C",
+            f"D: {_texto_opcao(licao.opcao_d)}|D",
+        ),
+        proximo_id=proximo_id,
+    )
+
+
+class Catalogo:
+    """Retrato imutável da tabela de lições: por id, próxima lição (em ordem de id) e índice por tema."""
+
+    def __init__(self, licoes: list, versao: str):
+        ordenadas = sorted(licoes, key=lambda licao: licao.id)
+        renderizadas = [
+            renderizar_licao(licao, ordenadas[i + 1].id if i + 1 < len(ordenadas) else None)
+            for i, licao in enumerate(ordenadas)
+        ]
+        por_tema = {}
+        for licao in renderizadas:
+            por_tema.setdefault(licao.tema, []).append(licao.id)
+
+        self.versao = versao
+        self.por_id = MappingProxyType({licao.id: licao for licao in renderizadas})
+        self.por_tema = MappingProxyType({tema: tuple(ids) for tema, ids in por_tema.items()})
+
+    def __len__(self) -> int:
+        return len(self.por_id)
+
+    def obter(self, licao_id):
+        return self.por_id.get(licao_id)
+
+    def proxima(self, licao: LicaoCatalogo):
+        return self.por_id.get(licao.proximo_id) if licao.proximo_id is not None else None
+
+    def do_tema(self, tema: str) -> list:
+        return [self.por_id[licao_id] for licao_id in self.por_tema.get(tema, ())]
+
+
+class CatalogoLicoes:
+    """
+    Mantém o `Catalogo` atual em memória. A recarga monta um catálogo novo e só então troca a
+    referência, então quem está lendo nunca vê um catálogo pela metade.
+
+    Uma tarefa de fundo compara a versão gravada em `metadados` (alterada por adicionar_licoes.py)
+    a cada LICOES_VERIFICACAO_INTERVALO segundos; `recarregar()` também pode ser chamado direto.
+    """
+
+    def __init__(self, intervalo: float = LICOES_VERIFICACAO_INTERVALO):
+        self.intervalo = intervalo
+        self.atual = Catalogo([], versao=None)
+        self._tarefa = None
+
+    def recarregar(self) -> Catalogo:
+        db = SessionLocal()
+        try:
+            versao = ler_versao_licoes(db)
+            catalogo = Catalogo(db.query(Licao).all(), versao)
+        finally:
+            db.close()
+        self.atual = catalogo
+        log.info("📚 Catálogo de lições carregado: %s lições (versão %s).", len(catalogo), versao)
+        return catalogo
+
+    def verificar_versao(self) -> bool:
+        """Recarrega se a versão no banco mudou. Retorna True se houve recarga."""
+        db = SessionLocal()
+        try:
+            versao = ler_versao_licoes(db)
+        finally:
+            db.close()
+        if versao == self.atual.versao:
+            return False
+        self.recarregar()
+        return True
+
+    async def iniciar(self):
+        self.recarregar()
+        self._tarefa = asyncio.create_task(self._executar(), name="catalogo-licoes")
+
+    async def parar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            await asyncio.gather(self._tarefa, return_exceptions=True)
+            self._tarefa = None
+
+    async def _executar(self):
+        while True:
+            await asyncio.sleep(self.intervalo)
+            try:
+                self.verificar_versao()
+            except Exception as e:
+                log.error(f"🚨 Erro ao verificar a versão do catálogo de lições: {e}")
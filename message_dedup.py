@@ -0,0 +1,103 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, MensagemProcessada
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# ===============================================
+# CONFIGURAÇÕES DA DEDUPLICAÇÃO (Sobrescrevíveis pelo .env)
+# ===============================================
+
+DEDUP_MEMORIA_MAX = int(os.getenv("DEDUP_MEMORIA_MAX", "10000"))
+DEDUP_TTL = float(os.getenv("DEDUP_TTL", str(24 * 3600)))
+# A cada quantos registros no SQLite a poda das entradas expiradas é feita.
+DEDUP_PODA_A_CADA = int(os.getenv("DEDUP_PODA_A_CADA", "500"))
+
+
+def id_da_mensagem(evento: dict):
+    """ID da mensagem no payload da uazapi ('messageid'; 'id' como alternativa)."""
+    mensagem = evento.get('message') or {}
+    return mensagem.get('messageid') or mensagem.get('id')
+
+
+class DeduplicadorMensagens:
+    """
+    Índice de IDs de mensagens já recebidas, em dois níveis:
+
+    - memória: conjunto limitado (LRU) consultado no próprio webhook, antes de enfileirar;
+    - SQLite: tabela `mensagens_processadas`, cobrindo reenvios que chegam depois de um reinício.
+      Entradas mais velhas que DEDUP_TTL são podadas.
+    """
+
+    def __init__(self, tamanho_maximo: int = DEDUP_MEMORIA_MAX, ttl: float = DEDUP_TTL):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._recentes = OrderedDict()
+        self._registros_desde_poda = 0
+        self.retentativas_absorvidas = 0
+
+    def estatisticas(self) -> dict:
+        return {
+            "ids_em_memoria": len(self._recentes),
+            "retentativas_absorvidas": self.retentativas_absorvidas,
+        }
+
+    def ja_recebida(self, message_id: str) -> bool:
+        """Consulta só a memória. Conta como retentativa absorvida quando o ID já foi visto."""
+        recebido_em = self._recentes.get(message_id)
+        if recebido_em is None:
+            return False
+        if time.time() - recebido_em > self.ttl:
+            del self._recentes[message_id]
+            return False
+        self.retentativas_absorvidas += 1
+        return True
+
+    def marcar_recebida(self, message_id: str):
+        """Registra o ID na memória. Deve ser chamado só depois que o evento foi aceito na fila."""
+        self._recentes[message_id] = time.time()
+        self._recentes.move_to_end(message_id)
+        while len(self._recentes) > self.tamanho_maximo:
+            self._recentes.popitem(last=False)
+
+    def registrar_processamento(self, db: Session, message_id: str) -> bool:
+        """
+        Registra o ID em `mensagens_processadas`. Retorna False se o ID já estava lá, ou seja, é um
+        reenvio.
+
+        A inserção fica pendente na sessão do chamador e é confirmada no mesmo commit das alterações
+        do evento: se o processamento falhar, o ID sai junto e um reenvio é processado de novo; se
+        o servidor cair depois do commit, o reenvio é descartado. Como eventos do mesmo remetente
+        são serializados, não há corrida.
+        """
+        if db.get(MensagemProcessada, message_id) is not None:
+            self.retentativas_absorvidas += 1
+            return False
+
+        db.add(MensagemProcessada(message_id=message_id, recebido_em=datetime.now()))
+
+        self._registros_desde_poda += 1
+        if self._registros_desde_poda >= DEDUP_PODA_A_CADA:
+            self._registros_desde_poda = 0
+            self.podar_expirados()
+        return True
+
+    def podar_expirados(self, db: Session = None) -> int:
+        """Remove do SQLite os IDs mais velhos que o TTL. Sem `db`, usa e confirma uma sessão própria."""
+        sessao = db or SessionLocal()
+        try:
+            limite = datetime.now() - timedelta(seconds=self.ttl)
+            removidos = sessao.query(MensagemProcessada).filter(MensagemProcessada.recebido_em < limite).delete()
+            if db is None:
+                sessao.commit()
+            return removidos
+        finally:
+            if db is None:
+                sessao.close()
@@ -0,0 +1,179 @@
+"""
+Métricas no formato de texto do Prometheus, sem dependências externas.
+
+Histogramas e contadores guardam tudo em memória, indexados pela tupla de rótulos; observar
+custa uma busca binária nos buckets e uma soma (sem locks: o servidor roda num único loop de
+eventos). O texto só é montado quando alguém lê /metrics.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+BUCKETS_PADRAO = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_BANCO = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+_registro = []
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatar_rotulos(nomes: tuple, valores: tuple, extra: str = "") -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class Contador:
+    def __init__(self, nome: str, descricao: str, rotulos: tuple = ()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = rotulos
+        self._valores = {}
+        _registro.append(self)
+
+    def incrementar(self, *valores_rotulos, quantidade: float = 1):
+        self._valores[valores_rotulos] = self._valores.get(valores_rotulos, 0) + quantidade
+
+    def valor(self, *valores_rotulos) -> float:
+        return self._valores.get(valores_rotulos, 0)
+
+    def renderizar(self) -> list:
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} counter"]
+        for valores, total in self._valores.items():
+            linhas.append(f"{self.nome}{_formatar_rotulos(self.rotulos, valores)} {total}")
+        return linhas
+
+
+class Histograma:
+    def __init__(self, nome: str, descricao: str, rotulos: tuple = (), buckets: tuple = BUCKETS_PADRAO):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = rotulos
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        _registro.append(self)
+
+    def observar(self, valor: float, *valores_rotulos):
+        serie = self._series.get(valores_rotulos)
+        if serie is None:
+            # [contagem por bucket (+Inf no fim), soma, total]
+            serie = self._series[valores_rotulos] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        serie[0][bisect_left(self.buckets, valor)] += 1
+        serie[1] += valor
+        serie[2] += 1
+
+    @contextmanager
+    def medir(self, *valores_rotulos):
+        """Observa a duração do bloco em segundos (funciona em volta de `await`)."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, *valores_rotulos)
+
+    def contagem(self, *valores_rotulos) -> int:
+        serie = self._series.get(valores_rotulos)
+        return serie[2] if serie else 0
+
+    def renderizar(self) -> list:
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} histogram"]
+        for valores, (contagens, soma, total) in self._series.items():
+            acumulado = 0
+            for limite, contagem in zip((*self.buckets, "+Inf"), contagens):
+                acumulado += contagem
+                le = 'le="%s"' % limite
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, valores, le)} {acumulado}")
+            rotulos = _formatar_rotulos(self.rotulos, valores)
+            linhas.append(f"{self.nome}_sum{rotulos} {soma}")
+            linhas.append(f"{self.nome}_count{rotulos} {total}")
+        return linhas
+
+
+class Medidor:
+    """Valor instantâneo lido no momento da coleta (ex.: profundidade de uma fila)."""
+
+    def __init__(self, nome: str, descricao: str, funcao):
+        self.nome = nome
+        self.descricao = descricao
+        self.funcao = funcao
+        _registro.append(self)
+
+    def renderizar(self) -> list:
+        return [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} gauge", f"{self.nome} {self.funcao()}"]
+
+
+def renderizar() -> str:
+    linhas = []
+    for metrica in _registro:
+        linhas.extend(metrica.renderizar())
+    return "\n".join(linhas) + "\n"
+
+
+# ===============================================
+# MÉTRICAS DO BOT
+# ===============================================
+
+WEBHOOK_REQUISICAO = Histograma(
+    "webhook_requisicao_segundos", "Tempo de resposta do POST /webhook (validação e enfileiramento).",
+)
+WEBHOOK_PROCESSAMENTO = Histograma(
+    "webhook_processamento_segundos", "Tempo de processamento de uma mensagem no worker, por ramo da máquina de estados.",
+    rotulos=("estado",),
+)
+GEMINI_CHAMADA = Histograma(
+    "gemini_chamada_segundos", "Latência das chamadas ao Gemini, por função.", rotulos=("funcao",),
+)
+UAZAPI_REQUISICAO = Histograma(
+    "uazapi_requisicao_segundos", "Latência das requisições à uazapi (com retentativas), por endpoint.", rotulos=("endpoint",),
+)
+BANCO_CONSULTA = Histograma(
+    "banco_consulta_segundos", "Tempo de execução das instruções SQL, por tipo.", rotulos=("operacao",), buckets=BUCKETS_BANCO,
+)
+BANCO_COMMIT = Histograma(
+    "banco_commit_segundos", "Tempo dos commits de sessão (flush + commit).", buckets=BUCKETS_BANCO,
+)
+HANDLER = Histograma(
+    "maquina_handler_segundos", "Tempo de cada handler da máquina de estados (sem a carga do usuário).", rotulos=("handler",),
+)
+TRANSICOES = Contador("maquina_transicoes_total", "Transições da máquina de estados.", rotulos=("de", "para"))
+CORRECOES = Contador(
+    "correcoes_total", "Correções de exercícios por decisão (local ou resultado da IA nas escalonadas).", rotulos=("decisao",),
+)
+ERROS = Contador("erros_total", "Erros por origem.", rotulos=("origem",))
+
+
+def instrumentar_banco(engine, fabrica_sessoes):
+    """Liga os eventos do SQLAlchemy que alimentam BANCO_CONSULTA e BANCO_COMMIT."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        inicio = conn.info["metricas_inicio"].pop()
+        operacao = statement.lstrip()[:6].upper()
+        if operacao not in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+            operacao = "OUTRA"
+        BANCO_CONSULTA.observar(time.perf_counter() - inicio, operacao)
+
+    @event.listens_for(engine, "handle_error")
+    def _erro(contexto):
+        pilha = contexto.connection.info.get("metricas_inicio") if contexto.connection is not None else None
+        if pilha:
+            pilha.pop()
+        ERROS.incrementar("banco")
+
+    @event.listens_for(fabrica_sessoes, "before_commit")
+    def _antes_commit(sessao):
+        sessao.info["metricas_commit"] = time.perf_counter()
+
+    @event.listens_for(fabrica_sessoes, "after_commit")
+    def _depois_commit(sessao):
+        inicio = sessao.info.pop("metricas_commit", None)
+        if inicio is not None:
+            BANCO_COMMIT.observar(time.perf_counter() - inicio)
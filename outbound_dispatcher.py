@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+
+import httpx
+
+import metrics as metricas
+import uazapi_client
+from keyed_executor import ExecutorPorChave
+from send_message import (
+    ENDPOINT_SEND_MENU, ENDPOINT_SEND_TEXT, MenuEstatico, _payload_menu, _payload_texto, _tratar_resposta,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# ===============================================
+# CONFIGURAÇÕES DO DESPACHANTE (Sobrescrevíveis pelo .env)
+# ===============================================
+
+ENVIOS_POR_SEGUNDO = float(os.getenv("ENVIOS_POR_SEGUNDO", "20"))
+ENVIOS_RAJADA = int(os.getenv("ENVIOS_RAJADA", "40"))
+ENVIOS_WORKERS = int(os.getenv("ENVIOS_WORKERS", "8"))
+ENVIOS_FILA_MAX = int(os.getenv("ENVIOS_FILA_MAX", "5000"))
+ENVIOS_DRENAGEM_TIMEOUT = float(os.getenv("ENVIOS_DRENAGEM_TIMEOUT", "30"))
+# Pausa global quando a uazapi ainda responde 429 depois das retentativas do cliente.
+ENVIOS_PAUSA_429 = float(os.getenv("ENVIOS_PAUSA_429", "2"))
+
+
+class BaldeTokens:
+    """Token bucket global: até `capacidade` envios de rajada, reabastecido a `taxa` tokens por segundo."""
+
+    def __init__(self, taxa: float, capacidade: int):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.tokens = float(capacidade)
+        self._ultimo = time.monotonic()
+        self._pausado_ate = 0.0
+        self.esperas = 0
+
+    def pausar(self, segundos: float):
+        self._pausado_ate = max(self._pausado_ate, time.monotonic() + segundos)
+        self.tokens = 0.0
+
+    async def adquirir(self):
+        esperou = False
+        while True:
+            agora = time.monotonic()
+            if agora < self._pausado_ate:
+                espera = self._pausado_ate - agora
+            else:
+                self.tokens = min(self.capacidade, self.tokens + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.esperas += int(esperou)
+                    return
+                espera = (1 - self.tokens) / self.taxa
+            esperou = True
+            await asyncio.sleep(espera)
+
+
+@dataclass
+class EnvioPendente:
+    destino: str
+    endpoint: str
+    descricao: str
+    payload: dict = None
+    corpo: bytes = None
+    enfileirado_em: float = field(default_factory=time.perf_counter)
+
+
+class DespachanteEnvios(ExecutorPorChave):
+    """
+    Fila de saída para a uazapi.
+
+    Os handlers do webhook só enfileiram (`enviar_texto`, `enviar_menu`, `enviar_menu_estatico`) e
+    seguem em frente. As mensagens de um mesmo destinatário saem na ordem em que foram enfileiradas,
+    uma de cada vez (o "Correto!" nunca chega depois do menu seguinte); destinatários diferentes
+    são atendidos em paralelo por ENVIOS_WORKERS workers, todos sob um limite global de
+    ENVIOS_POR_SEGUNDO (token bucket com rajada de ENVIOS_RAJADA).
+
+    Falhas transitórias (conexão, 429, 5xx) são repetidas pelo `uazapi_client`; se a uazapi
+    continuar respondendo 429, o balde inteiro pausa por ENVIOS_PAUSA_429 segundos.
+    """
+
+    def __init__(self, num_workers: int = ENVIOS_WORKERS, tamanho_maximo: int = ENVIOS_FILA_MAX,
+                 envios_por_segundo: float = ENVIOS_POR_SEGUNDO, rajada: int = ENVIOS_RAJADA):
+        super().__init__(self._enviar, num_workers, tamanho_maximo, nome="despachante de envios")
+        self.balde = BaldeTokens(envios_por_segundo, rajada)
+        self.enviados = 0
+        self.falhas = 0
+        self._espera_total_ms = 0.0
+        self._espera_max_ms = 0.0
+        self._envio_total_ms = 0.0
+        self._envio_max_ms = 0.0
+
+    def estatisticas(self) -> dict:
+        concluidos = self.enviados + self.falhas
+        return {
+            **super().estatisticas(),
+            "enviados": self.enviados,
+            "falhas": self.falhas,
+            "esperas_limite_taxa": self.balde.esperas,
+            "espera_media_ms": round(self._espera_total_ms / concluidos, 2) if concluidos else 0.0,
+            "espera_max_ms": round(self._espera_max_ms, 2),
+            "envio_medio_ms": round(self._envio_total_ms / concluidos, 2) if concluidos else 0.0,
+            "envio_max_ms": round(self._envio_max_ms, 2),
+        }
+
+    def enviar_texto(self, to_number_jid: str, text_content: str) -> bool:
+        return self._enfileirar(EnvioPendente(
+            to_number_jid, ENDPOINT_SEND_TEXT, "Mensagem", payload=_payload_texto(to_number_jid, text_content),
+        ))
+
+    def enviar_menu(self, to_number_jid: str, text_content: str, choices: list) -> bool:
+        return self._enfileirar(EnvioPendente(
+            to_number_jid, ENDPOINT_SEND_MENU, "Menu de botões", payload=_payload_menu(to_number_jid, text_content, choices),
+        ))
+
+    def enviar_menu_estatico(self, to_number_jid: str, menu: MenuEstatico) -> bool:
+        return self._enfileirar(EnvioPendente(
+            to_number_jid, ENDPOINT_SEND_MENU, "Menu de botões", corpo=menu.corpo(to_number_jid),
+        ))
+
+    async def drenar(self, timeout: float = ENVIOS_DRENAGEM_TIMEOUT):
+        await super().drenar(timeout)
+
+    def _enfileirar(self, envio: EnvioPendente) -> bool:
+        if not uazapi_client.INSTANCIA_TOKEN or not uazapi_client.BASE_URL:
+            log.error("ERRO: Configurações BASE_URL ou INSTANCIA_TOKEN ausentes. Verifique o arquivo .env.")
+            return False
+        if not self.enfileirar(envio.destino, envio):
+            log.error("🚨 Fila de envios cheia (%s). %s para %s descartado.", self.pendentes, envio.descricao, envio.destino)
+            metricas.ERROS.incrementar("envio_descartado")
+            return False
+        return True
+
+    async def _enviar(self, envio: EnvioPendente):
+        await self.balde.adquirir()
+        inicio = time.perf_counter()
+        espera_ms = (inicio - envio.enfileirado_em) * 1000
+        try:
+            response = await uazapi_client.requisitar_async("POST", envio.endpoint, envio.payload, corpo=envio.corpo)
+            if response.status_code == 429:
+                self.balde.pausar(ENVIOS_PAUSA_429)
+            ok = _tratar_resposta(response, envio.destino, envio.descricao) is not None
+        except (httpx.HTTPError, ValueError) as e:
+            log.error("Erro ao enviar %s: %s", envio.descricao.lower(), e)
+            ok = False
+
+        envio_ms = (time.perf_counter() - inicio) * 1000
+        self.enviados += int(ok)
+        self.falhas += int(not ok)
+        if not ok:
+            metricas.ERROS.incrementar("envio")
+        self._espera_total_ms += espera_ms
+        self._espera_max_ms = max(self._espera_max_ms, espera_ms)
+        self._envio_total_ms += envio_ms
+        self._envio_max_ms = max(self._envio_max_ms, envio_ms)
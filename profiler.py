@@ -0,0 +1,216 @@
+import cProfile
+import heapq
+import io
+import itertools
+import logging
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# ===============================================
+# CONFIGURAÇÕES DO PROFILER (Sobrescrevíveis pelo .env)
+# ===============================================
+
+# Perfila 1 a cada N lotes do webhook; com PROFILER_A_CADA=1, todos (custa caro: use com limiar).
+PROFILER_A_CADA = int(os.getenv("PROFILER_A_CADA", "50"))
+# Só guarda os perfis que demoraram pelo menos isto (0 = guarda todos os amostrados).
+PROFILER_LIMIAR_MS = float(os.getenv("PROFILER_LIMIAR_MS", "0"))
+PROFILER_TOP_K = int(os.getenv("PROFILER_TOP_K", "10"))
+# Intervalo do amostrador de pilhas que gera o formato collapsed (flamegraph).
+PROFILER_AMOSTRAGEM_MS = float(os.getenv("PROFILER_AMOSTRAGEM_MS", "2"))
+
+
+def _nome_quadro(quadro) -> str:
+    codigo = quadro.f_code
+    return f"{os.path.basename(codigo.co_filename)}:{getattr(codigo, 'co_qualname', codigo.co_name)}"
+
+
+class AmostradorPilhas:
+    """
+    Thread que lê, a cada `intervalo` segundos, a pilha de chamadas da thread observada
+    (a do loop de eventos) e conta as pilhas no formato collapsed: "a;b;c contagem".
+    """
+
+    def __init__(self, id_thread: int, intervalo: float):
+        self.id_thread = id_thread
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name="amostrador-pilhas", daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            quadro = sys._current_frames().get(self.id_thread)
+            nomes = []
+            while quadro is not None:
+                nomes.append(_nome_quadro(quadro))
+                quadro = quadro.f_back
+            if nomes:
+                self.pilhas[";".join(reversed(nomes))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{pilha} {contagem}\n" for pilha, contagem in self.pilhas.most_common())
+
+
+class PerfilWebhook:
+    def __init__(self, id: int, duracao_ms: float, eventos: int, stats: bytes, collapsed: str):
+        self.id = id
+        self.instante = time.time()
+        self.duracao_ms = duracao_ms
+        self.eventos = eventos
+        self.stats = stats
+        self.collapsed = collapsed
+
+    def resumo(self) -> dict:
+        return {"id": self.id, "instante": self.instante, "duracao_ms": round(self.duracao_ms, 2), "eventos": self.eventos}
+
+
+class ProfilerWebhook:
+    """
+    Perfila o processamento do webhook em produção, sem reiniciar o servidor.
+
+    `envolver(processar)` devolve a função usada pela fila: com o profiler ligado, 1 a cada
+    `a_cada` lotes roda sob o cProfile e com o amostrador de pilhas. Perfis com duração abaixo
+    de `limiar_ms` são descartados; dos demais ficam só os `top_k` mais lentos (heap mínimo:
+    um perfil novo substitui o mais rápido guardado).
+
+    O cProfile é por thread e o loop é um só: o perfil cobre tudo o que rodou no loop enquanto o
+    lote estava em andamento (inclusive outros workers) e só um lote é perfilado por vez.
+    """
+
+    def __init__(self, ativo: bool = False, a_cada: int = PROFILER_A_CADA, limiar_ms: float = PROFILER_LIMIAR_MS,
+                 top_k: int = PROFILER_TOP_K, intervalo_amostragem_ms: float = PROFILER_AMOSTRAGEM_MS):
+        self.ativo = ativo
+        self.a_cada = max(1, a_cada)
+        self.limiar_ms = limiar_ms
+        self.top_k = top_k
+        self.intervalo_amostragem = intervalo_amostragem_ms / 1000
+        self._perfis = []
+        self._ids = itertools.count(1)
+        self._contador = 0
+        self._em_andamento = False
+        self.perfilados = 0
+        self.descartados = 0
+
+    def ligar(self, a_cada: int = None, limiar_ms: float = None):
+        if a_cada is not None:
+            self.a_cada = max(1, a_cada)
+        if limiar_ms is not None:
+            self.limiar_ms = limiar_ms
+        self.ativo = True
+        log.info("🔬 Profiler ligado: 1 a cada %s lotes, limiar de %s ms.", self.a_cada, self.limiar_ms)
+
+    def desligar(self):
+        self.ativo = False
+        log.info("🔬 Profiler desligado (%s perfis guardados).", len(self._perfis))
+
+    def limpar(self):
+        self._perfis.clear()
+
+    def listar(self) -> list:
+        """Perfis guardados, do mais lento para o mais rápido."""
+        return [perfil.resumo() for perfil in sorted((p for _, _, p in self._perfis), key=lambda p: -p.duracao_ms)]
+
+    def obter(self, id: int) -> PerfilWebhook:
+        return next((p for _, _, p in self._perfis if p.id == id), None)
+
+    def estatisticas(self) -> dict:
+        return {
+            "ativo": self.ativo,
+            "a_cada": self.a_cada,
+            "limiar_ms": self.limiar_ms,
+            "top_k": self.top_k,
+            "perfilados": self.perfilados,
+            "descartados": self.descartados,
+            "guardados": len(self._perfis),
+        }
+
+    def envolver(self, processar):
+        async def processar_perfilado(eventos: list):
+            if not self.ativo or self._em_andamento:
+                return await processar(eventos)
+            self._contador += 1
+            if self._contador % self.a_cada:
+                return await processar(eventos)
+            return await self._perfilar(processar, eventos)
+
+        return processar_perfilado
+
+    async def _perfilar(self, processar, eventos: list):
+        self._em_andamento = True
+        perfil = cProfile.Profile()
+        amostrador = AmostradorPilhas(threading.get_ident(), self.intervalo_amostragem)
+        try:
+            perfil.enable()
+        except ValueError:
+            # Outro profiler já está ativo nesta thread (ex.: um depurador).
+            self._em_andamento = False
+            return await processar(eventos)
+        amostrador.iniciar()
+        inicio = time.perf_counter()
+        try:
+            return await processar(eventos)
+        finally:
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            perfil.disable()
+            amostrador.parar()
+            self._em_andamento = False
+            self._guardar(perfil, amostrador, duracao_ms, len(eventos))
+
+    def _guardar(self, perfil: cProfile.Profile, amostrador: AmostradorPilhas, duracao_ms: float, eventos: int):
+        self.perfilados += 1
+        if duracao_ms < self.limiar_ms:
+            self.descartados += 1
+            return
+        if len(self._perfis) >= self.top_k and duracao_ms <= self._perfis[0][0]:
+            self.descartados += 1
+            return
+
+        perfil.create_stats()
+        # Mesmo formato do pstats.Stats.dump_stats: abre com pstats, snakeviz, gprof2dot...
+        registro = PerfilWebhook(next(self._ids), duracao_ms, eventos, marshal.dumps(perfil.stats), amostrador.collapsed())
+        item = (duracao_ms, registro.id, registro)
+        if len(self._perfis) >= self.top_k:
+            heapq.heapreplace(self._perfis, item)
+            self.descartados += 1
+        else:
+            heapq.heappush(self._perfis, item)
+        log.info("🔬 Perfil %s guardado: lote de %s eventos em %.1f ms.", registro.id, eventos, duracao_ms)
+
+    def relatorio(self, id: int, limite: int = 30) -> str:
+        """Texto do pstats (ordenado por tempo acumulado), para olhar sem baixar o arquivo."""
+        perfil = self.obter(id)
+        if perfil is None:
+            return None
+        saida = io.StringIO()
+        stats = pstats.Stats(_StatsCarregadas(perfil.stats), stream=saida)
+        stats.sort_stats("cumulative").print_stats(limite)
+        return saida.getvalue()
+
+
+class _StatsCarregadas:
+    """Adaptador para o pstats.Stats ler o dicionário marshal guardado em memória."""
+
+    def __init__(self, dados: bytes):
+        self.stats = marshal.loads(dados)
+
+    def create_stats(self):
+        pass
@@ -1,6 +1,10 @@
-import requests
 import json
+import requests
+import httpx
 import logging
+import os
+from dataclasses import dataclass
+import uazapi_client
 from utils import BASE_URL, INSTANCIA_TOKEN 
 
 log = logging.getLogger(__name__)
@@ -8,37 +12,91 @@ log.setLevel(logging.INFO)
 
 ENDPOINT_SEND_TEXT = "/send/text"
 ENDPOINT_SEND_MENU = "/send/menu"
+# Atraso (ms) que a uazapi aplica antes de entregar cada mensagem.
+UAZAPI_DELAY_TEXTO_MS = int(os.getenv("UAZAPI_DELAY_TEXTO_MS", "1000"))
+UAZAPI_DELAY_MENU_MS = int(os.getenv("UAZAPI_DELAY_MENU_MS", "500"))
+RODAPE_MENU = "Clique para responder. Sua escolha não aparecerá como texto digitado."
 
 
-def send_whatsapp_message(to_number_jid: str, text_content: str):
-    if not INSTANCIA_TOKEN or not BASE_URL:
-        log.error("ERRO: Configurações BASE_URL ou INSTANCIA_TOKEN ausentes. Verifique o arquivo .env.")
-        return None
-        
-    url_completa = BASE_URL + ENDPOINT_SEND_TEXT
-    
-    payload = {
+def _payload_texto(to_number_jid: str, text_content: str) -> dict:
+    return {
         "number": to_number_jid,
         "text": text_content,
         "readchat": True,
-        "delay": 1000
+        "delay": UAZAPI_DELAY_TEXTO_MS
     }
 
-    headers = {
-        "token": INSTANCIA_TOKEN,
-        "Content-Type": "application/json" 
+
+def _payload_menu(to_number_jid: str, text_content: str, choices: list) -> dict:
+    return {
+        "number": to_number_jid,
+        "type": "button",
+        "text": text_content,
+        "choices": choices,
+        "footerText": RODAPE_MENU,
+        "readchat": True,
+        "delay": UAZAPI_DELAY_MENU_MS
     }
 
-    try:
-        response = requests.post(url_completa, headers=headers, json=payload)
-        
-        if response.status_code == 200:
-            log.info("Mensagem enviada com sucesso para %s", to_number_jid)
+
+# ===============================================
+# MENUS ESTÁTICOS PRÉ-SERIALIZADOS
+# ===============================================
+
+@dataclass(frozen=True)
+class MenuEstatico:
+    """
+    Menu de texto e botões fixos, renderizado e serializado em JSON uma única vez.
+
+    A cada envio só o campo `number` é encaixado no início do corpo já pronto, sem montar
+    a lista de opções, o dict do payload nem passar pelo `json.dumps` de novo.
+    """
+    nome: str
+    texto: str
+    choices: tuple
+    _restante: bytes
+
+    def corpo(self, to_number_jid: str) -> bytes:
+        return b'{"number":' + json.dumps(to_number_jid).encode("utf-8") + b"," + self._restante
+
+
+MENUS_ESTATICOS = {}
+
+
+def registrar_menu(nome: str, texto: str, opcoes: dict) -> MenuEstatico:
+    """Registra um menu fixo (`{"texto visível": "id de controle"}`) e devolve a versão pré-serializada."""
+    choices = tuple(f"{texto_visivel}|{id_controle}" for texto_visivel, id_controle in opcoes.items())
+    payload = _payload_menu(None, texto, list(choices))
+    del payload["number"]
+    serializado = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    menu = MenuEstatico(nome=nome, texto=texto, choices=choices, _restante=serializado[1:])
+    MENUS_ESTATICOS[nome] = menu
+    return menu
+
+
+def _tratar_resposta(response, to_number_jid: str, descricao: str):
+    if response.status_code == 200:
+        log.info("%s enviado com sucesso para %s", descricao, to_number_jid)
+        try:
             return response.json()
-        else:
-            log.error("Falha ao enviar mensagem. Status: %s. Detalhes: %s", 
-                      response.status_code, response.text)
-            return None
+        except ValueError:
+            # A mensagem foi aceita (200); só o corpo veio vazio ou fora do JSON.
+            log.warning("Resposta 200 sem JSON ao enviar %s para %s: %r", descricao.lower(), to_number_jid, response.text[:200])
+            return {}
+
+    log.error("Falha ao enviar %s. Status: %s. Detalhes: %s", 
+              descricao.lower(), response.status_code, response.text)
+    return None
+
+
+def send_whatsapp_message(to_number_jid: str, text_content: str):
+    if not INSTANCIA_TOKEN or not BASE_URL:
+        log.error("ERRO: Configurações BASE_URL ou INSTANCIA_TOKEN ausentes. Verifique o arquivo .env.")
+        return None
+
+    try:
+        response = uazapi_client.requisitar("POST", ENDPOINT_SEND_TEXT, _payload_texto(to_number_jid, text_content))
+        return _tratar_resposta(response, to_number_jid, "Mensagem")
 
     except requests.exceptions.RequestException as e:
         log.error("Erro de conexão ao enviar mensagem: %s", e)
@@ -50,39 +108,75 @@ def send_button_menu(to_number_jid: str, text_content: str, choices: list):
     if not INSTANCIA_TOKEN or not BASE_URL:
         log.error("ERRO: Configurações ausentes no .env para envio de menu.")
         return None
-        
-    url_completa = BASE_URL + ENDPOINT_SEND_MENU
-    
-    payload = {
-        "number": to_number_jid,
-        "type": "button",
-        "text": text_content,
-        "choices": choices,
-        "footerText": "Clique para responder. Sua escolha não aparecerá como texto digitado.",
-        "readchat": True,
-        "delay": 500
-    }
 
-    headers = {
-        "token": INSTANCIA_TOKEN,
-        "Content-Type": "application/json" 
-    }
+    try:
+        response = uazapi_client.requisitar("POST", ENDPOINT_SEND_MENU, _payload_menu(to_number_jid, text_content, choices))
+        return _tratar_resposta(response, to_number_jid, "Menu de botões")
+
+    except requests.exceptions.RequestException as e:
+        log.error("Erro de conexão ao enviar menu: %s", e)
+        return None
+
+
+def send_static_menu(to_number_jid: str, menu: MenuEstatico):
+    if not INSTANCIA_TOKEN or not BASE_URL:
+        log.error("ERRO: Configurações ausentes no .env para envio de menu.")
+        return None
 
     try:
-        response = requests.post(url_completa, headers=headers, json=payload)
-        
-        if response.status_code == 200:
-            log.info("Menu de botões enviado com sucesso para %s", to_number_jid)
-            return response.json()
-        else:
-            log.error("Falha ao enviar menu. Status: %s. Detalhes: %s", 
-                      response.status_code, response.text)
-            return None
+        response = uazapi_client.requisitar("POST", ENDPOINT_SEND_MENU, corpo=menu.corpo(to_number_jid))
+        return _tratar_resposta(response, to_number_jid, "Menu de botões")
 
     except requests.exceptions.RequestException as e:
         log.error("Erro de conexão ao enviar menu: %s", e)
         return None
 
 
+# ===============================================
+# VARIANTES ASSÍNCRONAS (usadas no caminho do webhook)
+# ===============================================
+
+async def send_whatsapp_message_async(to_number_jid: str, text_content: str):
+    if not INSTANCIA_TOKEN or not BASE_URL:
+        log.error("ERRO: Configurações BASE_URL ou INSTANCIA_TOKEN ausentes. Verifique o arquivo .env.")
+        return None
+
+    try:
+        response = await uazapi_client.requisitar_async("POST", ENDPOINT_SEND_TEXT, _payload_texto(to_number_jid, text_content))
+        return _tratar_resposta(response, to_number_jid, "Mensagem")
+
+    except httpx.HTTPError as e:
+        log.error("Erro de conexão ao enviar mensagem: %s", e)
+        return None
+
+
+async def send_button_menu_async(to_number_jid: str, text_content: str, choices: list):
+    if not INSTANCIA_TOKEN or not BASE_URL:
+        log.error("ERRO: Configurações ausentes no .env para envio de menu.")
+        return None
+
+    try:
+        response = await uazapi_client.requisitar_async("POST", ENDPOINT_SEND_MENU, _payload_menu(to_number_jid, text_content, choices))
+        return _tratar_resposta(response, to_number_jid, "Menu de botões")
+
+    except httpx.HTTPError as e:
+        log.error("Erro de conexão ao enviar menu: %s", e)
+        return None
+
+
+async def send_static_menu_async(to_number_jid: str, menu: MenuEstatico):
+    if not INSTANCIA_TOKEN or not BASE_URL:
+        log.error("ERRO: Configurações ausentes no .env para envio de menu.")
+        return None
+
+    try:
+        response = await uazapi_client.requisitar_async("POST", ENDPOINT_SEND_MENU, corpo=menu.corpo(to_number_jid))
+        return _tratar_resposta(response, to_number_jid, "Menu de botões")
+
+    except httpx.HTTPError as e:
+        log.error("Erro de conexão ao enviar menu: %s", e)
+        return None
+
+
 if __name__ == '__main__':
-    print("Módulo de envio carregado com sucesso.")
\ No newline at end of file
+    print("Módulo de envio carregado com sucesso.")
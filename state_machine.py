@@ -0,0 +1,73 @@
+import time
+
+# Curinga: vale para qualquer estado (ou qualquer entrada) na tabela de transições.
+QUALQUER = "*"
+
+
+class MaquinaEstados:
+    """
+    Máquina de estados dirigida por tabela.
+
+    Cada handler é registrado para pares (estado, entrada) com `ao_receber`; o despacho é uma
+    busca em dicionário, na ordem: (estado, entrada), (QUALQUER, entrada), (estado, QUALQUER),
+    (QUALQUER, QUALQUER). Sem handler, a mensagem é ignorada.
+
+    Hooks `antes(ctx, estado, entrada, handler)` e `depois(ctx, estado, entrada, handler, duracao)`
+    rodam em volta de cada handler (log, métricas); se o handler levanta exceção, os hooks de
+    `depois` não rodam e a exceção segue para quem chamou. O contexto é opaco para a máquina:
+    handlers e hooks recebem o que o chamador passou em `despachar`.
+    """
+
+    def __init__(self):
+        self._tabela = {}
+        self._antes = []
+        self._depois = []
+
+    def ao_receber(self, estados, *entradas):
+        """Decorador: registra o handler para cada estado x entrada (sem entradas, para QUALQUER)."""
+        estados = (estados,) if isinstance(estados, str) else tuple(estados)
+
+        def registrar(handler):
+            for estado in estados:
+                for entrada in entradas or (QUALQUER,):
+                    if (estado, entrada) in self._tabela:
+                        raise ValueError(f"Transição ({estado!r}, {entrada!r}) registrada duas vezes.")
+                    self._tabela[(estado, entrada)] = handler
+            return handler
+
+        return registrar
+
+    def antes(self, hook):
+        self._antes.append(hook)
+        return hook
+
+    def depois(self, hook):
+        self._depois.append(hook)
+        return hook
+
+    def resolver(self, estado: str, entrada: str):
+        tabela = self._tabela
+        return (
+            tabela.get((estado, entrada))
+            or tabela.get((QUALQUER, entrada))
+            or tabela.get((estado, QUALQUER))
+            or tabela.get((QUALQUER, QUALQUER))
+        )
+
+    async def despachar(self, estado: str, entrada: str, ctx):
+        """Executa o handler de (estado, entrada) com `ctx` e retorna o handler usado (ou None)."""
+        handler = self.resolver(estado, entrada)
+        if handler is None:
+            return None
+        for hook in self._antes:
+            hook(ctx, estado, entrada, handler)
+        inicio = time.perf_counter()
+        await handler(ctx)
+        duracao = time.perf_counter() - inicio
+        for hook in self._depois:
+            hook(ctx, estado, entrada, handler, duracao)
+        return handler
+
+    def transicoes(self) -> dict:
+        """Tabela registrada, {(estado, entrada): nome do handler}, para conferência e documentação."""
+        return {chave: handler.__name__ for chave, handler in self._tabela.items()}
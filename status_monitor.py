@@ -0,0 +1,184 @@
+"""
+Monitor do status da instância na uazapi.
+
+Uma única tarefa no servidor consulta /instance/status em intervalo adaptativo (rápido enquanto
+a instância está em 'connecting', lento quando está 'connected') e guarda o último status em
+memória. A opção "4" do menu lê esse cache em vez de chamar a uazapi a cada clique.
+
+Também pode rodar sozinho, no lugar do antigo monitorar_status.py, até a instância conectar:
+    python status_monitor.py
+"""
+import asyncio
+import inspect
+import logging
+import os
+import time
+from datetime import datetime
+
+import uazapi_client
+from utils import FalhaStatus, get_instance_info_async
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# ===============================================
+# CONFIGURAÇÕES DO MONITOR (Sobrescrevíveis pelo .env, em segundos)
+# ===============================================
+
+STATUS_INTERVALO_CONECTANDO = float(os.getenv("STATUS_INTERVALO_CONECTANDO", "3"))
+STATUS_INTERVALO_CONECTADO = float(os.getenv("STATUS_INTERVALO_CONECTADO", "60"))
+# Desconectada ou erro ao consultar (token inválido, uazapi fora do ar).
+STATUS_INTERVALO_OUTROS = float(os.getenv("STATUS_INTERVALO_OUTROS", "15"))
+
+STATUS_CONECTADO = "CONNECTED"
+STATUS_CONECTANDO = "CONNECTING"
+
+
+class MonitorStatus:
+    """
+    Guarda o último status da instância (`status`, `atualizado_em`) e o atualiza em segundo plano.
+    Se a última consulta falhou, `status` é uma `FalhaStatus` (e `falhou` é True).
+
+    Quem precisa reagir a mudanças registra um callback com `ao_mudar(callback)`; ele é chamado
+    com `(anterior, novo)` sempre que o status muda (pode ser função comum ou coroutine).
+    `notificar()` antecipa a próxima consulta (ex.: ao receber um evento 'connection' no webhook).
+    """
+
+    def __init__(self, intervalo_conectando: float = STATUS_INTERVALO_CONECTANDO,
+                 intervalo_conectado: float = STATUS_INTERVALO_CONECTADO,
+                 intervalo_outros: float = STATUS_INTERVALO_OUTROS):
+        self.intervalo_conectando = intervalo_conectando
+        self.intervalo_conectado = intervalo_conectado
+        self.intervalo_outros = intervalo_outros
+        self.status = None
+        self.atualizado_em = None
+        self._verificado_monotonic = None
+        self._ouvintes = []
+        self._acordar = None
+        self._tarefa = None
+        self.consultas = 0
+        self.mudancas = 0
+
+    @property
+    def idade(self):
+        """Segundos desde a última consulta, ou None se ainda não houve nenhuma."""
+        if self._verificado_monotonic is None:
+            return None
+        return time.monotonic() - self._verificado_monotonic
+
+    @property
+    def falhou(self) -> bool:
+        """True se a última consulta não obteve um status da instância."""
+        return isinstance(self.status, FalhaStatus)
+
+    def estatisticas(self) -> dict:
+        idade = self.idade
+        return {
+            "status": self.status,
+            "falhou": self.falhou,
+            "atualizado_em": self.atualizado_em.isoformat() if self.atualizado_em else None,
+            "idade_s": round(idade, 1) if idade is not None else None,
+            "proxima_em_s": self.intervalo_atual(),
+            "consultas": self.consultas,
+            "mudancas": self.mudancas,
+        }
+
+    def intervalo_atual(self) -> float:
+        if self.status == STATUS_CONECTADO:
+            return self.intervalo_conectado
+        if self.status == STATUS_CONECTANDO:
+            return self.intervalo_conectando
+        return self.intervalo_outros
+
+    def ao_mudar(self, callback):
+        self._ouvintes.append(callback)
+
+    def notificar(self):
+        if self._acordar is not None:
+            self._acordar.set()
+
+    async def obter(self) -> str:
+        """Último status conhecido; só consulta a uazapi se ainda não houver nenhum em cache."""
+        if self.status is None:
+            await self.atualizar()
+        return self.status
+
+    async def atualizar(self) -> str:
+        status, instancia = await get_instance_info_async()
+        self.consultas += 1
+        anterior = self.status
+        self.status = status
+        self.atualizado_em = datetime.now()
+        self._verificado_monotonic = time.monotonic()
+
+        if status != anterior:
+            self.mudancas += 1
+            self._registrar_mudanca(anterior, status, instancia)
+            await self._avisar_ouvintes(anterior, status)
+        return status
+
+    async def iniciar(self):
+        self._acordar = asyncio.Event()
+        self._tarefa = asyncio.create_task(self._executar(), name="monitor-status")
+
+    async def parar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            await asyncio.gather(self._tarefa, return_exceptions=True)
+            self._tarefa = None
+
+    async def _executar(self):
+        while True:
+            try:
+                await self.atualizar()
+            except Exception as e:
+                log.error(f"🚨 Erro ao consultar o status da instância: {e}")
+
+            try:
+                await asyncio.wait_for(self._acordar.wait(), timeout=self.intervalo_atual())
+            except asyncio.TimeoutError:
+                pass
+            self._acordar.clear()
+
+    async def _avisar_ouvintes(self, anterior, novo):
+        for callback in self._ouvintes:
+            try:
+                resultado = callback(anterior, novo)
+                if inspect.isawaitable(resultado):
+                    await resultado
+            except Exception as e:
+                log.error(f"🚨 Erro no ouvinte de mudança de status: {e}")
+
+    @staticmethod
+    def _registrar_mudanca(anterior, status, instancia: dict):
+        if status == STATUS_CONECTADO:
+            log.info("🥳 Instância CONECTADA (antes: %s). Pronta para enviar e receber mensagens.", anterior)
+        elif status == STATUS_CONECTANDO:
+            log.info("⏳ Instância aguardando conexão (antes: %s).", anterior)
+            if instancia.get("paircode"):
+                log.info("Pareamento: use o código %s no seu WhatsApp para conectar.", instancia["paircode"])
+            if instancia.get("qrcode"):
+                log.info("QR Code disponível. Escaneie-o no seu celular.")
+        else:
+            log.warning("⚠️ Status da instância mudou de %s para %s. Pode ser necessário reconectar.", anterior, status)
+
+
+async def _aguardar_conexao():
+    monitor = MonitorStatus()
+    conectado = asyncio.Event()
+    monitor.ao_mudar(lambda anterior, novo: novo == STATUS_CONECTADO and conectado.set())
+    await monitor.iniciar()
+    try:
+        await conectado.wait()
+    finally:
+        await monitor.parar()
+        await uazapi_client.fechar()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    print("Iniciando monitoramento. Pressione Ctrl+C para sair.")
+    try:
+        asyncio.run(_aguardar_conexao())
+    except KeyboardInterrupt:
+        pass
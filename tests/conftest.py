@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Banco descartável: precisa estar no ambiente antes do primeiro `import database`.
+_pasta = tempfile.mkdtemp(prefix="english-bot-testes-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_pasta, 'testes.db')}"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
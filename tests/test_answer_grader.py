@@ -0,0 +1,24 @@
+from answer_grader import Correcao, corrigir_localmente
+
+
+def test_empate_entre_duas_respostas_certas_e_certo():
+    exercicio = {"tipo": "open", "correta": "theatre", "aceitas": ["theater"]}
+    assert corrigir_localmente("theatr", exercicio) == Correcao(True, "aproximada")
+
+
+def test_aceitas_nao_deixa_a_correcao_mais_rigida():
+    sem_aceitas = {"tipo": "open", "correta": "theatre"}
+    com_aceitas = {"tipo": "open", "correta": "theatre", "aceitas": ["theater"]}
+    assert corrigir_localmente("theatr", sem_aceitas).veredito is True
+    assert corrigir_localmente("theatr", com_aceitas).veredito is True
+
+
+def test_empate_entre_certa_e_opcao_errada_nao_conta_como_acerto():
+    exercicio = {"tipo": "choice", "opcoes": ["listen", "listed", "lists", "list"], "correta": "listen"}
+    # "listeb" está a uma letra de "listen" (certa) e de "listed" (errada).
+    assert corrigir_localmente("listeb", exercicio) == Correcao(False, "fora_das_opcoes")
+
+
+def test_typo_perto_so_da_opcao_certa_e_certo():
+    exercicio = {"tipo": "choice", "opcoes": ["listen", "listed", "lists", "list"], "correta": "listen"}
+    assert corrigir_localmente("lisetn", exercicio) == Correcao(True, "aproximada")
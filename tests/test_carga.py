@@ -0,0 +1,16 @@
+import os
+import subprocess
+import sys
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+
+
+def test_carga_dentro_dos_limites_relativos():
+    # Processo separado: o bench_carga configura o ambiente (banco, uazapi falsa) antes de importar o bot.
+    # Carga reduzida (~5s); os limites são relativos às latências simuladas, então valem em qualquer máquina.
+    resultado = subprocess.run(
+        [sys.executable, os.path.join(BENCHMARKS, "bench_carga.py"), "--usuarios", "20", "--gemini-ms", "100",
+         "--limites", os.path.join(BENCHMARKS, "limites_carga.json")],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert resultado.returncode == 0, resultado.stdout + resultado.stderr
@@ -0,0 +1,64 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+import exercise_pool
+from database import SessionLocal, ExercicioPool, ExercicioVisto, init_db
+
+EXERCICIO = {"tipo": "choice", "pergunta": "She ___ a teacher.", "opcoes": ["am", "is", "are", "be"], "correta": "is"}
+
+
+@pytest.fixture(autouse=True)
+def banco():
+    init_db()
+    yield
+    with SessionLocal() as db:
+        db.query(ExercicioPool).delete()
+        db.query(ExercicioVisto).delete()
+        db.commit()
+
+
+def vistos(wa_jid: str) -> list:
+    with SessionLocal() as db:
+        return sorted(db.scalars(select(ExercicioVisto.hash_conteudo).where(ExercicioVisto.wa_jid == wa_jid)))
+
+
+def adicionar_ao_pool(nivel: str, exercicio: dict):
+    with SessionLocal() as db:
+        exercise_pool.adicionar_exercicio(db, nivel, exercicio)
+        db.commit()
+
+
+def test_podar_vistos_mantem_os_mais_recentes():
+    agora = datetime.now()
+    with SessionLocal() as db:
+        db.add_all(ExercicioVisto(wa_jid="a", hash_conteudo=f"h{i}", visto_em=agora + timedelta(seconds=i)) for i in range(5))
+        db.add_all(ExercicioVisto(wa_jid="b", hash_conteudo=f"h{i}", visto_em=agora) for i in range(2))
+        db.commit()
+
+    assert exercise_pool.podar_vistos(maximo=3) == 2
+    assert vistos("a") == ["h2", "h3", "h4"]
+    assert vistos("b") == ["h0", "h1"]
+
+
+def test_retirar_sem_marcar_nao_entra_nos_vistos():
+    adicionar_ao_pool("INICIANTE", EXERCICIO)
+    assert json.loads(exercise_pool.retirar_exercicio("INICIANTE", "a", marcar=False)) == EXERCICIO
+    assert vistos("a") == []
+
+
+def test_prefetch_marca_visto_so_ao_entregar():
+    adicionar_ao_pool("INICIANTE", EXERCICIO)
+    prefetch = exercise_pool.PrefetchExercicios()
+
+    async def cenario():
+        prefetch.agendar("INICIANTE", "a")
+        await asyncio.gather(*prefetch._tarefas.values())
+        assert vistos("a") == []
+        return await prefetch.obter("INICIANTE", "a")
+
+    assert json.loads(asyncio.run(cenario())) == EXERCICIO
+    assert vistos("a") == [exercise_pool.hash_exercicio(EXERCICIO)]
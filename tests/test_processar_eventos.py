@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+import bot_server
+import conversation_flow as fluxo
+from database import SessionLocal, Usuario, MensagemProcessada
+
+JID = "5500000000001@s.whatsapp.net"
+
+
+class DespachanteFalso:
+    def __init__(self):
+        self.enviados = []
+
+    def enviar_texto(self, destino, texto):
+        self.enviados.append((destino, texto))
+
+    def enviar_menu(self, destino, texto, opcoes):
+        self.enviados.append((destino, texto))
+
+    def enviar_menu_estatico(self, destino, menu):
+        self.enviados.append((destino, menu.texto))
+
+
+def evento(texto: str, message_id: str) -> dict:
+    return {
+        "EventType": "messages",
+        "message": {"fromMe": False, "sender": JID, "senderName": "Teste", "text": texto, "messageid": message_id},
+    }
+
+
+@pytest.fixture
+def despachante(monkeypatch):
+    despachante = DespachanteFalso()
+    monkeypatch.setattr(fluxo, "despachante_envios", despachante)
+    return despachante
+
+
+@pytest.fixture
+def usuario_finalizado():
+    db = SessionLocal()
+    db.merge(Usuario(wa_jid=JID, nome="Teste", nivel_ingles="INICIANTE", estado=fluxo.ESTADO_FINALIZADO))
+    db.commit()
+    db.close()
+    yield
+    db = SessionLocal()
+    db.query(Usuario).filter(Usuario.wa_jid == JID).delete()
+    db.query(MensagemProcessada).delete()
+    db.commit()
+    db.close()
+
+
+def test_evento_que_falha_nao_desfaz_os_anteriores_do_lote(monkeypatch, despachante, usuario_finalizado):
+    processar_original = bot_server.processar_mensagem
+
+    async def processar_ou_falhar(evento_dados, db):
+        if evento_dados["message"]["text"] == "explode":
+            db.get(Usuario, JID).estado = fluxo.ESTADO_CONVERSANDO_IA
+            raise RuntimeError("falha simulada")
+        return await processar_original(evento_dados, db)
+
+    monkeypatch.setattr(bot_server, "processar_mensagem", processar_ou_falhar)
+
+    asyncio.run(bot_server.processar_eventos([evento("oi", "lote-1"), evento("explode", "lote-2")]))
+
+    db = SessionLocal()
+    try:
+        # "oi" reinicia para o menu e a resposta saiu: a mudança de estado tem de ficar gravada.
+        assert despachante.enviados
+        assert db.get(Usuario, JID).estado == fluxo.ESTADO_MENU
+        # O ID do primeiro evento é gravado com ele; o do que falhou sai junto e um reenvio é processado.
+        assert db.get(MensagemProcessada, "lote-1") is not None
+        assert db.get(MensagemProcessada, "lote-2") is None
+    finally:
+        db.close()
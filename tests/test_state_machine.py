@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+
+import conversation_flow as fluxo
+from database import Usuario
+from state_machine import MaquinaEstados, QUALQUER
+
+JID = "5500000000002@s.whatsapp.net"
+
+
+class DespachanteFalso:
+    def __init__(self):
+        self.enviados = []
+
+    def enviar_texto(self, destino, texto):
+        self.enviados.append(texto)
+
+    def enviar_menu(self, destino, texto, opcoes):
+        self.enviados.append(texto)
+
+    def enviar_menu_estatico(self, destino, menu):
+        self.enviados.append(menu.texto)
+
+
+@pytest.fixture(autouse=True)
+def despachante(monkeypatch):
+    despachante = DespachanteFalso()
+    monkeypatch.setattr(fluxo, "despachante_envios", despachante)
+    return despachante
+
+
+def entrada_de(texto: str) -> str:
+    # Mesma normalização de processar_mensagem.
+    return fluxo.ENTRADA_RESET if texto in fluxo.PALAVRAS_RESET else texto.upper()
+
+
+def despachar(estado: str, nivel: str, texto: str):
+    usuario = Usuario(wa_jid=JID, nivel_ingles=nivel, estado=estado, pergunta_atual_id=0, pontuacao=0)
+    ctx = fluxo.Contexto(usuario, JID, texto, texto.upper(), fluxo.nivel_definido(usuario))
+    handler = asyncio.run(fluxo.maquina.despachar(estado, entrada_de(texto), ctx))
+    return handler, usuario
+
+
+# ===============================================
+# TABELA GENÉRICA (MaquinaEstados)
+# ===============================================
+
+def maquina_de_teste() -> MaquinaEstados:
+    maquina = MaquinaEstados()
+    for estado, entrada, nome in [
+        ("a", "X", "exato"),
+        (QUALQUER, "X", "entrada_em_qualquer_estado"),
+        (QUALQUER, "Y", "entrada_em_qualquer_estado_y"),
+        ("a", QUALQUER, "fallback_do_estado"),
+        (QUALQUER, QUALQUER, "fallback_global"),
+    ]:
+        async def handler(ctx):
+            pass
+        handler.__name__ = nome
+        maquina.ao_receber(estado, entrada)(handler)
+    return maquina
+
+
+@pytest.mark.parametrize("estado, entrada, esperado", [
+    ("a", "X", "exato"),
+    ("b", "X", "entrada_em_qualquer_estado"),
+    ("a", "Y", "entrada_em_qualquer_estado_y"),
+    ("a", "Z", "fallback_do_estado"),
+    ("b", "Z", "fallback_global"),
+])
+def test_ordem_de_busca(estado, entrada, esperado):
+    assert maquina_de_teste().resolver(estado, entrada).__name__ == esperado
+
+
+def test_sem_handler_a_mensagem_e_ignorada():
+    maquina = MaquinaEstados()
+    assert maquina.resolver("a", "X") is None
+    assert asyncio.run(maquina.despachar("a", "X", ctx=None)) is None
+
+
+def test_registro_duplicado_e_recusado():
+    maquina = maquina_de_teste()
+    with pytest.raises(ValueError):
+        maquina.ao_receber("a", "X")(lambda ctx: None)
+
+
+def test_hooks_rodam_em_volta_do_handler():
+    maquina = MaquinaEstados()
+    chamadas = []
+
+    @maquina.ao_receber("a", "X")
+    async def handler(ctx):
+        chamadas.append("handler")
+
+    maquina.antes(lambda ctx, estado, entrada, h: chamadas.append(("antes", estado, entrada, h.__name__)))
+    maquina.depois(lambda ctx, estado, entrada, h, duracao: chamadas.append(("depois", duracao >= 0)))
+
+    asyncio.run(maquina.despachar("a", "X", ctx=None))
+    assert chamadas == [("antes", "a", "X", "handler"), "handler", ("depois", True)]
+
+
+# ===============================================
+# FLUXO DA CONVERSA (sem HTTP, banco nem uazapi)
+# ===============================================
+
+# (estado inicial, nível, texto recebido, handler, estado esperado depois)
+CASOS = [
+    # Palavras de reset valem em qualquer estado, antes das entradas e fallbacks do estado.
+    (fluxo.ESTADO_MENU, "INICIANTE", "oi", "reiniciar", fluxo.ESTADO_MENU),
+    (fluxo.ESTADO_ESTUDANDO_LICAO, "INICIANTE", "menu", "reiniciar", fluxo.ESTADO_MENU),
+    (fluxo.ESTADO_CONVERSANDO_IA, "INICIANTE", "menu", "reiniciar", fluxo.ESTADO_MENU),
+    (fluxo.ESTADO_AGUARDANDO_RESPOSTA_DINAMICA, "INICIANTE", "olá", "reiniciar", fluxo.ESTADO_MENU),
+    (fluxo.ESTADO_FINALIZADO, "INICIANTE", "oi", "reiniciar", fluxo.ESTADO_MENU),
+    (fluxo.ESTADO_MENU, fluxo.NIVEL_NAO_DEFINIDO, "menu", "reiniciar", fluxo.ESTADO_ESCOLHA_NIVEL),
+    # Opções do menu principal.
+    (fluxo.ESTADO_MENU, "INICIANTE", "1", "opcao_definir_nivel", fluxo.ESTADO_ESCOLHA_NIVEL),
+    (fluxo.ESTADO_MENU, "INICIANTE", "3", "opcao_conversa_ia", fluxo.ESTADO_CONVERSANDO_IA),
+    (fluxo.ESTADO_MENU, "INICIANTE", "5", "opcao_sair", fluxo.ESTADO_FINALIZADO),
+    (fluxo.ESTADO_FINALIZADO, "INICIANTE", "1", "opcao_definir_nivel", fluxo.ESTADO_ESCOLHA_NIVEL),
+    (fluxo.ESTADO_CONVERSANDO_IA, "INICIANTE", "5", "opcao_sair", fluxo.ESTADO_FINALIZADO),
+    # Entradas específicas de cada estado.
+    (fluxo.ESTADO_ESCOLHA_NIVEL, fluxo.NIVEL_NAO_DEFINIDO, "a", "pedir_nivel", fluxo.ESTADO_AGUARDANDO_NIVEL_DIGITADO),
+    # Fallback do estado (estado, QUALQUER).
+    (fluxo.ESTADO_MENU, "INICIANTE", "qualquer coisa", "opcao_invalida", fluxo.ESTADO_MENU),
+    (fluxo.ESTADO_ESCOLHA_NIVEL, fluxo.NIVEL_NAO_DEFINIDO, "x", "repetir_escolha_nivel", fluxo.ESTADO_ESCOLHA_NIVEL),
+    (fluxo.ESTADO_AGUARDANDO_NIVEL_DIGITADO, fluxo.NIVEL_NAO_DEFINIDO, "xyz", "nivel_invalido", fluxo.ESTADO_AGUARDANDO_NIVEL_DIGITADO),
+    (fluxo.ESTADO_ESTUDANDO_LICAO, "INICIANTE", "z", "licao_comando_invalido", fluxo.ESTADO_ESTUDANDO_LICAO),
+]
+
+
+@pytest.mark.parametrize("estado, nivel, texto, handler_esperado, estado_esperado", CASOS)
+def test_transicoes(despachante, estado, nivel, texto, handler_esperado, estado_esperado):
+    handler, usuario = despachar(estado, nivel, texto)
+    assert handler.__name__ == handler_esperado
+    assert usuario.estado == estado_esperado
+    assert despachante.enviados
+
+
+@pytest.mark.parametrize("estado, texto, handler_esperado", [
+    # Handlers que chamam a IA, o pool ou a uazapi: só a resolução na tabela.
+    (fluxo.ESTADO_MENU, "2", "opcao_exercicio_dinamico"),
+    (fluxo.ESTADO_MENU, "4", "opcao_status"),
+    (fluxo.ESTADO_CONVERSANDO_IA, "how are you?", "conversar_com_ia"),
+    (fluxo.ESTADO_CONVERSANDO_IA, "3", "opcao_conversa_ia"),
+    (fluxo.ESTADO_AGUARDANDO_RESPOSTA_DINAMICA, "is", "corrigir_exercicio_dinamico"),
+    (fluxo.ESTADO_ESTUDANDO_LICAO, "a", "responder_licao"),
+])
+def test_resolucao_dos_handlers_com_dependencias(estado, texto, handler_esperado):
+    assert fluxo.maquina.resolver(estado, entrada_de(texto)).__name__ == handler_esperado
+
+
+def test_estado_desconhecido_nao_tem_handler():
+    assert fluxo.maquina.resolver("estado_que_nao_existe", "1") is None
+
+
+def test_conversa_sem_ia_avisa_que_o_servico_esta_indisponivel(despachante, monkeypatch):
+    monkeypatch.setattr(fluxo, "ia_disponivel", lambda: False)
+    handler, usuario = despachar(fluxo.ESTADO_CONVERSANDO_IA, "INICIANTE", "how are you?")
+    assert handler.__name__ == "conversar_com_ia"
+    assert despachante.enviados == [fluxo.MENSAGEM_IA_INDISPONIVEL]
+    assert usuario.estado == fluxo.ESTADO_CONVERSANDO_IA
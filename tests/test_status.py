@@ -0,0 +1,108 @@
+import asyncio
+
+import httpx
+import pytest
+
+import conversation_flow as fluxo
+import uazapi_client
+import utils
+from database import Usuario
+from status_monitor import MonitorStatus
+from utils import FalhaStatus, get_instance_info_async
+
+JID = "5500000000003@s.whatsapp.net"
+INDISPONIVEL = "📢 O status da instância está indisponível no momento. Tente novamente em instantes."
+
+
+@pytest.fixture
+def uazapi(monkeypatch):
+    """Instala uma uazapi falsa; o teste define a resposta com `uazapi.responder = função(request)`."""
+    class UazapiFalsa:
+        responder = None
+
+    falsa = UazapiFalsa()
+    monkeypatch.setattr(utils, "INSTANCIA_TOKEN", "token-teste")
+    monkeypatch.setattr(utils, "BASE_URL", "http://uazapi.teste")
+    monkeypatch.setattr(uazapi_client, "BASE_URL", "http://uazapi.teste")
+    monkeypatch.setattr(uazapi_client, "UAZAPI_MAX_TENTATIVAS", 1)
+    monkeypatch.setattr(uazapi_client, "_async_client",
+                        httpx.AsyncClient(transport=httpx.MockTransport(lambda request: falsa.responder(request))))
+    return falsa
+
+
+def consultar():
+    return asyncio.run(get_instance_info_async())
+
+
+def test_status_conectado(uazapi):
+    uazapi.responder = lambda request: httpx.Response(200, json={"instance": {"status": "connected", "paircode": ""}})
+    status, instancia = consultar()
+    assert status == "CONNECTED" and not isinstance(status, FalhaStatus)
+    assert instancia["status"] == "connected"
+
+
+def erro_de_conexao(request):
+    raise httpx.ConnectError("recusada", request=request)
+
+
+@pytest.mark.parametrize("responder, prefixo", [
+    (erro_de_conexao, "CONNECTION ERROR"),
+    (lambda request: httpx.Response(401, json={"error": "token"}), "API ERROR"),
+    (lambda request: httpx.Response(200, text="<html>Bad Gateway</html>"), utils.STATUS_RESPOSTA_INVALIDA),
+    (lambda request: httpx.Response(200, json=["não", "é", "dict"]), "STATUS NOT FOUND"),
+    (lambda request: httpx.Response(200, json={"instance": "texto"}), "STATUS NOT FOUND"),
+    (lambda request: httpx.Response(200, json={"instance": {}}), "STATUS NOT FOUND"),
+])
+def test_falhas_da_consulta(uazapi, responder, prefixo):
+    uazapi.responder = responder
+    status, instancia = consultar()
+    assert isinstance(status, FalhaStatus)
+    assert status.startswith(prefixo)
+    assert instancia == {}
+
+
+def test_sem_token(monkeypatch):
+    monkeypatch.setattr(utils, "INSTANCIA_TOKEN", None)
+    status, instancia = consultar()
+    assert isinstance(status, FalhaStatus) and instancia == {}
+
+
+class DespachanteFalso:
+    def __init__(self):
+        self.enviados = []
+
+    def enviar_texto(self, destino, texto):
+        self.enviados.append(texto)
+
+    def enviar_menu(self, destino, texto, opcoes):
+        self.enviados.append(texto)
+
+    def enviar_menu_estatico(self, destino, menu):
+        self.enviados.append(menu.texto)
+
+
+def opcao_status(monkeypatch) -> str:
+    """Executa a opção "4" do menu com um monitor novo e devolve o primeiro texto enviado ao aluno."""
+    despachante = DespachanteFalso()
+    monkeypatch.setattr(fluxo, "despachante_envios", despachante)
+    monkeypatch.setattr(fluxo, "monitor_status", MonitorStatus())
+    usuario = Usuario(wa_jid=JID, nivel_ingles="INICIANTE", estado=fluxo.ESTADO_MENU, pergunta_atual_id=0)
+    ctx = fluxo.Contexto(usuario, JID, "4", "4", True)
+    asyncio.run(fluxo.maquina.despachar(fluxo.ESTADO_MENU, "4", ctx))
+    return despachante.enviados[0]
+
+
+@pytest.mark.parametrize("responder", [
+    erro_de_conexao,
+    lambda request: httpx.Response(500, text="erro"),
+    lambda request: httpx.Response(200, text="não é json"),
+    lambda request: httpx.Response(200, json=[]),
+])
+def test_opcao_status_nao_mostra_falhas_ao_aluno(uazapi, monkeypatch, responder):
+    uazapi.responder = responder
+    assert opcao_status(monkeypatch) == INDISPONIVEL
+
+
+def test_opcao_status_mostra_o_status(uazapi, monkeypatch):
+    uazapi.responder = lambda request: httpx.Response(200, json={"instance": {"status": "connected"}})
+    assert "*CONNECTED*" in opcao_status(monkeypatch)
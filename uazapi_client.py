@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+import metrics as metricas
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# ===============================================
+# 1. CONFIGURAÇÕES DO CLIENTE uazapi (Centralizadas no .env)
+# ===============================================
+
+BASE_URL = os.getenv("BASE_URL")
+INSTANCIA_TOKEN = os.getenv("INSTANCIA_TOKEN")
+
+UAZAPI_CONNECT_TIMEOUT = float(os.getenv("UAZAPI_CONNECT_TIMEOUT", "5"))
+UAZAPI_READ_TIMEOUT = float(os.getenv("UAZAPI_READ_TIMEOUT", "15"))
+UAZAPI_POOL_SIZE = int(os.getenv("UAZAPI_POOL_SIZE", "20"))
+UAZAPI_MAX_TENTATIVAS = int(os.getenv("UAZAPI_MAX_TENTATIVAS", "3"))
+UAZAPI_BACKOFF_BASE = float(os.getenv("UAZAPI_BACKOFF_BASE", "0.25"))
+UAZAPI_BACKOFF_MAX = float(os.getenv("UAZAPI_BACKOFF_MAX", "4"))
+
+# Respostas que valem nova tentativa (limite de taxa e indisponibilidade temporária).
+STATUS_REPETIVEIS = {429, 502, 503, 504}
+# Em envios (POST), 502/504 do gateway podem chegar com a mensagem já entregue: repetir duplicaria
+# a mensagem para o aluno. Só 429 e 503 garantem que a uazapi não processou o pedido.
+STATUS_REPETIVEIS_ENVIO = {429, 503}
+METODOS_IDEMPOTENTES = {"GET", "HEAD"}
+
+
+# ===============================================
+# 2. CONTADORES DE LATÊNCIA POR ENDPOINT
+# ===============================================
+
+_latencias = {}
+_latencias_lock = threading.Lock()
+
+
+def _registrar_latencia(endpoint: str, duracao: float, erro: bool, tentativas: int):
+    with _latencias_lock:
+        dados = _latencias.setdefault(endpoint, {"chamadas": 0, "erros": 0, "retentativas": 0, "total_ms": 0.0, "max_ms": 0.0})
+        duracao_ms = duracao * 1000
+        dados["chamadas"] += 1
+        dados["erros"] += int(erro)
+        dados["retentativas"] += tentativas - 1
+        dados["total_ms"] += duracao_ms
+        dados["max_ms"] = max(dados["max_ms"], duracao_ms)
+        metricas.UAZAPI_REQUISICAO.observar(duracao, endpoint)
+        if erro:
+            metricas.ERROS.incrementar("uazapi")
+
+
+def estatisticas_latencia() -> dict:
+    """Retorna, por endpoint, chamadas, erros, retentativas e latência média/máxima em ms."""
+    with _latencias_lock:
+        return {
+            endpoint: {
+                **dados,
+                "media_ms": round(dados["total_ms"] / dados["chamadas"], 2) if dados["chamadas"] else 0.0,
+            }
+            for endpoint, dados in _latencias.items()
+        }
+
+
+def _espera_backoff(tentativa: int) -> float:
+    # "Full jitter": espera aleatória entre 0 e o teto exponencial da tentativa.
+    return random.uniform(0, min(UAZAPI_BACKOFF_MAX, UAZAPI_BACKOFF_BASE * (2 ** tentativa)))
+
+
+def _status_repetiveis(metodo: str) -> set:
+    return STATUS_REPETIVEIS if metodo.upper() in METODOS_IDEMPOTENTES else STATUS_REPETIVEIS_ENVIO
+
+
+def _headers() -> dict:
+    return {
+        "token": INSTANCIA_TOKEN or "",
+        "Content-Type": "application/json"
+    }
+
+
+# ===============================================
+# 3. CLIENTE SÍNCRONO (requests.Session com pool keep-alive)
+# ===============================================
+
+_sessao = None
+_sessao_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    global _sessao
+    with _sessao_lock:
+        if _sessao is None:
+            sessao = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=UAZAPI_POOL_SIZE, pool_maxsize=UAZAPI_POOL_SIZE)
+            sessao.mount("https://", adaptador)
+            sessao.mount("http://", adaptador)
+            sessao.headers.update(_headers())
+            _sessao = sessao
+        return _sessao
+
+
+def requisitar(metodo: str, endpoint: str, payload: dict = None, corpo: bytes = None) -> requests.Response:
+    """
+    Faz uma requisição à uazapi reaproveitando conexões do pool.
+
+    O corpo é `payload` serializado como JSON ou, se informado, `corpo` já serializado (bytes).
+
+    Erros de conexão (inclusive conexão keep-alive que o servidor já fechou) e respostas
+    transitórias são repetidos até UAZAPI_MAX_TENTATIVAS vezes com backoff exponencial e jitter:
+    429/502/503/504 em GET, só 429/503 nos envios (STATUS_REPETIVEIS_ENVIO). Timeouts de leitura
+    não são repetidos, pois o envio pode já ter acontecido. Exceções finais são
+    `requests.exceptions.RequestException`.
+    """
+    repetiveis = _status_repetiveis(metodo)
+    inicio = time.perf_counter()
+    tentativa = 0
+    erro = True
+    try:
+        while True:
+            tentativa += 1
+            try:
+                response = get_session().request(
+                    metodo, BASE_URL + endpoint, json=payload, data=corpo,
+                    timeout=(UAZAPI_CONNECT_TIMEOUT, UAZAPI_READ_TIMEOUT),
+                )
+            except requests.exceptions.ConnectionError:
+                if tentativa >= UAZAPI_MAX_TENTATIVAS:
+                    raise
+            else:
+                if response.status_code not in repetiveis or tentativa >= UAZAPI_MAX_TENTATIVAS:
+                    erro = response.status_code >= 400
+                    return response
+            time.sleep(_espera_backoff(tentativa))
+    finally:
+        _registrar_latencia(endpoint, time.perf_counter() - inicio, erro, tentativa)
+
+
+# ===============================================
+# 4. CLIENTE ASSÍNCRONO (httpx.AsyncClient com pool keep-alive)
+# ===============================================
+
+_async_client = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            headers=_headers(),
+            timeout=httpx.Timeout(UAZAPI_READ_TIMEOUT, connect=UAZAPI_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=UAZAPI_POOL_SIZE, max_keepalive_connections=UAZAPI_POOL_SIZE),
+        )
+    return _async_client
+
+
+async def requisitar_async(metodo: str, endpoint: str, payload: dict = None, corpo: bytes = None) -> httpx.Response:
+    """Versão assíncrona de `requisitar`. Exceções finais são `httpx.HTTPError`."""
+    repetiveis = _status_repetiveis(metodo)
+    inicio = time.perf_counter()
+    tentativa = 0
+    erro = True
+    try:
+        while True:
+            tentativa += 1
+            try:
+                response = await get_async_client().request(metodo, BASE_URL + endpoint, json=payload, content=corpo)
+            # RemoteProtocolError: conexão do pool fechada pelo servidor sem resposta (keep-alive vencido),
+            # o equivalente ao ConnectionError do cliente síncrono.
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError):
+                if tentativa >= UAZAPI_MAX_TENTATIVAS:
+                    raise
+            else:
+                if response.status_code not in repetiveis or tentativa >= UAZAPI_MAX_TENTATIVAS:
+                    erro = response.status_code >= 400
+                    return response
+            await asyncio.sleep(_espera_backoff(tentativa))
+    finally:
+        _registrar_latencia(endpoint, time.perf_counter() - inicio, erro, tentativa)
+
+
+async def fechar():
+    """Fecha os pools de conexão (chamado no desligamento do servidor)."""
+    global _async_client, _sessao
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    with _sessao_lock:
+        if _sessao is not None:
+            _sessao.close()
+            _sessao = None
@@ -1,8 +1,9 @@
 import requests
-import json
+import httpx
 import logging
 from dotenv import load_dotenv
 import os
+import uazapi_client
 
 # Carrega as variáveis do arquivo .env
 load_dotenv()
@@ -14,8 +15,9 @@ log.setLevel(logging.INFO)
 # 1. CONFIGURAÇÕES GERAIS (Centralizadas no .env)
 # ===============================================
 
-BASE_URL = os.getenv("BASE_URL")
-INSTANCIA_TOKEN = os.getenv("INSTANCIA_TOKEN")
+# BASE_URL e INSTANCIA_TOKEN são lidos pelo cliente compartilhado da uazapi
+BASE_URL = uazapi_client.BASE_URL
+INSTANCIA_TOKEN = uazapi_client.INSTANCIA_TOKEN
 NGROK_URL = os.getenv("NGROK_URL")
 
 
@@ -23,6 +25,18 @@ NGROK_URL = os.getenv("NGROK_URL")
 # 2. FUNÇÃO: VERIFICAR STATUS DA INSTÂNCIA
 # ===============================================
 
+# Prefixo do status quando a uazapi responde algo que não é JSON (ex.: página de erro de um proxy).
+STATUS_RESPOSTA_INVALIDA = "INVALID RESPONSE"
+
+
+class FalhaStatus(str):
+    """
+    Status devolvido quando a consulta falhou (sem token, erro de conexão, erro HTTP, resposta
+    inválida ou sem o campo de status). O texto serve para logs e /estatisticas; não é um estado
+    da instância e não deve ser mostrado ao aluno.
+    """
+
+
 def get_instance_status() -> str:
     """
     Faz uma requisição GET para /instance/status e retorna o estado da conexão.
@@ -30,28 +44,59 @@ def get_instance_status() -> str:
     :return: Uma string contendo o status ('connected', 'disconnected', 'ERROR', etc.).
     """
     if not INSTANCIA_TOKEN or not BASE_URL:
-        return "ERROR: Token ou Base URL ausentes no .env."
-
-    url_completa = BASE_URL + "/instance/status"
-    
-    headers = {
-        "token": INSTANCIA_TOKEN
-    }
+        return FalhaStatus("ERROR: Token ou Base URL ausentes no .env.")
 
     try:
-        response = requests.get(url_completa, headers=headers)
-        
-        if response.status_code == 200:
-            dados = response.json()
-            # Acessa o status dentro da estrutura da resposta da uazapiGO
-            status_atual = dados.get("instance", {}).get("status")
-            return status_atual.upper() if status_atual else "STATUS NOT FOUND"
-        
-        else:
-            return f"API ERROR: HTTP {response.status_code} - Verifique o token."
+        response = uazapi_client.requisitar("GET", "/instance/status")
+        return _interpretar_status(response.status_code, response)
 
     except requests.exceptions.RequestException as e:
-        return f"CONNECTION ERROR: {e}"
+        return FalhaStatus(f"CONNECTION ERROR: {e}")
+    except ValueError as e:
+        return FalhaStatus(f"{STATUS_RESPOSTA_INVALIDA}: {e}")
+
+
+async def get_instance_status_async() -> str:
+    """Versão assíncrona de `get_instance_status`, para uso dentro do loop de eventos do servidor."""
+    status, _ = await get_instance_info_async()
+    return status
+
+
+async def get_instance_info_async() -> tuple:
+    """
+    Como `get_instance_status_async`, mas também retorna o dict `instance` da resposta
+    (com `paircode`/`qrcode` enquanto a instância está em 'connecting'). Em erro, o status é uma
+    `FalhaStatus` e o dict vem vazio.
+    """
+    if not INSTANCIA_TOKEN or not BASE_URL:
+        return FalhaStatus("ERROR: Token ou Base URL ausentes no .env."), {}
+
+    try:
+        response = await uazapi_client.requisitar_async("GET", "/instance/status")
+        instancia = _ler_instancia(response) if response.status_code == 200 else {}
+        return _interpretar_status(response.status_code, response), instancia
+
+    except httpx.HTTPError as e:
+        return FalhaStatus(f"CONNECTION ERROR: {e}"), {}
+    except ValueError as e:
+        return FalhaStatus(f"{STATUS_RESPOSTA_INVALIDA}: {e}"), {}
+
+
+def _ler_instancia(response) -> dict:
+    """Dict `instance` da resposta da uazapiGO; vazio se o JSON não tiver esse formato (ex.: lista ou texto)."""
+    dados = response.json()
+    instancia = dados.get("instance") if isinstance(dados, dict) else None
+    return instancia if isinstance(instancia, dict) else {}
+
+
+def _interpretar_status(status_code: int, response) -> str:
+    if status_code == 200:
+        status_atual = _ler_instancia(response).get("status")
+        if isinstance(status_atual, str) and status_atual:
+            return status_atual.upper()
+        return FalhaStatus("STATUS NOT FOUND")
+
+    return FalhaStatus(f"API ERROR: HTTP {status_code} - Verifique o token.")
 
 
 # ===============================================
@@ -80,16 +125,11 @@ def configure_webhook(webhook_url: str) -> bool:
         "excludeMessages": ["wasSentByApi"] 
     }
 
-    headers = {
-        "token": INSTANCIA_TOKEN,
-        "Content-Type": "application/json" 
-    }
-
     print(f"Tentando configurar Webhook no endpoint: {url_completa}")
     print(f"Com o URL: {webhook_url}")
 
     try:
-        response = requests.post(url_completa, headers=headers, json=payload)
+        response = uazapi_client.requisitar("POST", "/webhook", payload)
 
         if response.status_code == 200:
             log.info("✅ Webhook configurado com sucesso! Status Code: 200")
@@ -0,0 +1,65 @@
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from keyed_executor import ExecutorPorChave
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# ===============================================
+# CONFIGURAÇÕES DA FILA (Sobrescrevíveis pelo .env)
+# ===============================================
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_FILA_MAX = int(os.getenv("WEBHOOK_FILA_MAX", "1000"))
+WEBHOOK_DRENAGEM_TIMEOUT = float(os.getenv("WEBHOOK_DRENAGEM_TIMEOUT", "30"))
+
+
+def chave_do_evento(evento: dict) -> str:
+    """Eventos são serializados pelo remetente (wa_jid)."""
+    return (evento.get('message') or {}).get('sender')
+
+
+class FilaWebhook(ExecutorPorChave):
+    """
+    Fila em memória, limitada, que desacopla o recebimento do webhook do processamento.
+
+    O endpoint apenas enfileira os eventos e responde; os workers executam `processar(eventos)`
+    com a lista de eventos de um mesmo remetente. Mensagens do mesmo usuário são processadas
+    em ordem, uma por vez (evita que dois cliques seguidos leiam o mesmo `Usuario` e o último
+    commit vença); usuários diferentes rodam em paralelo. Quando a fila está cheia, `enfileirar` retorna False para que o endpoint
+    responda 429 (backpressure); a capacidade é contada em eventos, não em lotes.
+    """
+
+    def __init__(self, processar, num_workers: int = WEBHOOK_WORKERS, tamanho_maximo: int = WEBHOOK_FILA_MAX):
+        super().__init__(processar, num_workers, tamanho_maximo, nome="fila de webhook")
+
+    @property
+    def tamanho_maximo(self) -> int:
+        return self.max_pendentes
+
+    def enfileirar(self, evento: dict) -> bool:
+        return self.enfileirar_lote([evento])
+
+    def enfileirar_lote(self, eventos: list) -> bool:
+        """
+        Agrupa os eventos por remetente (mantendo a ordem de chegada) e enfileira um lote por
+        remetente. É tudo ou nada: se o lote inteiro não couber, nada é enfileirado.
+        """
+        if not self.aceitando or self.pendentes + len(eventos) > self.max_pendentes:
+            self.rejeitados += len(eventos)
+            return False
+
+        grupos = {}
+        for evento in eventos:
+            grupos.setdefault(chave_do_evento(evento), []).append(evento)
+        for chave, grupo in grupos.items():
+            super().enfileirar(chave, grupo, peso=len(grupo))
+        return True
+
+    async def drenar(self, timeout: float = WEBHOOK_DRENAGEM_TIMEOUT):
+        await super().drenar(timeout)
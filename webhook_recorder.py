@@ -0,0 +1,89 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# ===============================================
+# CONFIGURAÇÕES DA GRAVAÇÃO (Sobrescrevíveis pelo .env)
+# ===============================================
+
+# Sem arquivo, nada é gravado. Terminando em .gz, a gravação é comprimida.
+WEBHOOK_GRAVACAO_ARQUIVO = os.getenv("WEBHOOK_GRAVACAO_ARQUIVO")
+WEBHOOK_GRAVACAO_FLUSH = float(os.getenv("WEBHOOK_GRAVACAO_FLUSH", "1"))
+
+
+def ler_gravacao(caminho: str):
+    """Gera (instante_unix, corpo_bruto) de cada requisição gravada, na ordem de chegada."""
+    abrir = gzip.open if caminho.endswith(".gz") else open
+    with abrir(caminho, "rt", encoding="utf-8") as arquivo:
+        for linha in arquivo:
+            if linha.strip():
+                registro = json.loads(linha)
+                yield registro["t"], registro["corpo"]
+
+
+class GravadorWebhook:
+    """
+    Grava o corpo bruto de cada POST /webhook, com o instante de chegada, num arquivo só de
+    acréscimo (uma linha JSON por requisição: {"t": instante_unix, "corpo": "..."}).
+
+    A escrita vai para o buffer do arquivo, no próprio handler; uma tarefa de fundo faz o flush a
+    cada WEBHOOK_GRAVACAO_FLUSH segundos e `parar()` fecha o arquivo. A gravação tem números e
+    mensagens reais dos alunos: trate o arquivo como dado pessoal.
+    """
+
+    def __init__(self, caminho: str = WEBHOOK_GRAVACAO_ARQUIVO, intervalo_flush: float = WEBHOOK_GRAVACAO_FLUSH):
+        self.caminho = caminho
+        self.intervalo_flush = intervalo_flush
+        self._arquivo = None
+        self._tarefa = None
+        self.gravadas = 0
+
+    @property
+    def ativo(self) -> bool:
+        return self._arquivo is not None
+
+    def estatisticas(self) -> dict:
+        return {"ativo": self.ativo, "arquivo": self.caminho, "gravadas": self.gravadas}
+
+    def gravar(self, corpo: bytes):
+        if self._arquivo is None:
+            return
+        registro = {"t": round(time.time(), 6), "corpo": corpo.decode("utf-8", errors="replace")}
+        self._arquivo.write(json.dumps(registro, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.gravadas += 1
+
+    async def iniciar(self):
+        if not self.caminho:
+            return
+        abrir = gzip.open if self.caminho.endswith(".gz") else open
+        self._arquivo = abrir(self.caminho, "at", encoding="utf-8")
+        self._tarefa = asyncio.create_task(self._executar(), name="gravador-webhook")
+        log.info("🎙️ Gravando as requisições do webhook em %s.", self.caminho)
+
+    async def parar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            await asyncio.gather(self._tarefa, return_exceptions=True)
+            self._tarefa = None
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+            log.info("🎙️ Gravação do webhook encerrada (%s requisições).", self.gravadas)
+
+    async def _executar(self):
+        while True:
+            await asyncio.sleep(self.intervalo_flush)
+            try:
+                self._arquivo.flush()
+            except Exception as e:
+                log.error(f"🚨 Erro ao gravar as requisições do webhook: {e}")